@@ -44,7 +44,9 @@ router.post(
         knownLength: file.size,
       });
 
-      const upstream = await axios.post(`${OGUZ_TELEMATIK_BASE}/telematik/process`, form, {
+      // ?async=1 → Python-Service antwortet sofort mit Job-ID (202), Ergebnis über /jobs/:jobId
+      const query = req.query.async === '1' ? '?async=1' : '';
+      const upstream = await axios.post(`${OGUZ_TELEMATIK_BASE}/telematik/process${query}`, form, {
         headers: form.getHeaders(),
         // großzügiges Timeout für XLSX-Verarbeitung
         timeout: 60_000,
@@ -60,11 +62,28 @@ router.post(
   }
 );
 
-// GET /oguz/results/:filename → Datei streamen
-router.get('/results/:filename', async (req: Request, res: Response) => {
+// GET /oguz/jobs/:jobId?wait=<s> → Job-Status (Long-Polling, max. 30 s im Python-Service)
+router.get('/jobs/:jobId', async (req: Request, res: Response) => {
   try {
-    const { filename } = req.params;
-    const upstream = await axios.get(`${OGUZ_TELEMATIK_BASE}/results/${encodeURIComponent(filename)}`, {
+    const { jobId } = req.params;
+    const wait = typeof req.query.wait === 'string' ? req.query.wait : '0';
+    const upstream = await axios.get(`${OGUZ_TELEMATIK_BASE}/jobs/${encodeURIComponent(jobId)}`, {
+      params: { wait },
+      timeout: 45_000,
+      validateStatus: () => true,
+    });
+    res.status(upstream.status).json(upstream.data);
+  } catch (err) {
+    res.status(500).json({ status: 'error', message: toErrorMessage(err) });
+  }
+});
+
+// GET /oguz/results/:filename bzw. /oguz/results/:jobId/:filename (Job-Modus) → Datei streamen
+router.get(['/results/:filename', '/results/:jobId/:filename'], async (req: Request, res: Response) => {
+  try {
+    const { jobId, filename } = req.params;
+    const pfad = [jobId, filename].filter(Boolean).map((t) => encodeURIComponent(t as string)).join('/');
+    const upstream = await axios.get(`${OGUZ_TELEMATIK_BASE}/results/${pfad}`, {
       responseType: 'stream',
       timeout: 60_000,
       validateStatus: () => true,
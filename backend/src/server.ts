@@ -42,6 +42,7 @@ if (fs.existsSync(distDir)) {
       url.startsWith('/logs') ||
       url.startsWith('/oguz/telematik') ||
       url.startsWith('/oguz/results') ||
+      url.startsWith('/oguz/jobs') ||
       url.startsWith('/oguz/health')
     ) {
       res.status(404).json({ ok: false, message: 'Not Found' });
@@ -1,4 +1,24 @@
-import { useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
+
+// Job-Modus: der Server antwortet sofort mit einer Job-ID, das Ergebnis wird per Long-Polling abgeholt.
+// Höchstens JOB_FRIST_MS lang: ein Job, der hängen bleibt (z. B. weil der Worker mit dem Pool neu gestartet
+// wurde), endet mit einer Meldung statt die Seite für immer zu blockieren
+const JOB_FRIST_MS = 15 * 60 * 1000
+
+async function waitForJob(jobId: string, signal: AbortSignal) {
+  const frist = Date.now() + JOB_FRIST_MS
+  while (Date.now() < frist) {
+    const res = await fetch(`/py/jobs/${encodeURIComponent(jobId)}?wait=25`, { credentials: 'include', signal })
+    const j = await res.json().catch(() => null)
+    if (!res.ok || !j) {
+      throw new Error(j?.message || 'Job-Status konnte nicht abgerufen werden')
+    }
+    if (j.status !== 'pending' && j.status !== 'running') {
+      return j
+    }
+  }
+  throw new Error('Der Mietabgleich ist nicht rechtzeitig fertig geworden. Bitte später erneut versuchen.')
+}
 
 export default function Kontobuchung() {
   const [excelMieter, setExcelMieter] = useState<File | null>(null)
@@ -7,29 +27,38 @@ export default function Kontobuchung() {
   const [busy, setBusy] = useState(false)
   const mieterId = 'file-mieter'
   const kontoId = 'file-konto'
+  // Verlässt man die Seite, brechen Upload und Polling ab
+  const abbruch = useRef<AbortController | null>(null)
+  useEffect(() => () => abbruch.current?.abort(), [])
 
   async function onRun(): Promise<void> {
     if (!excelMieter || !excelKonto) {
       setMessage('Bitte Mieter-Excel und Kontoauszug-Excel auswählen.')
       return
     }
+    const controller = new AbortController()
+    abbruch.current = controller
     setBusy(true)
     setMessage(null)
     try {
       const form = new FormData()
       form.append('excel', excelMieter)
       form.append('konto', excelKonto)
-      const res = await fetch('/py/process', {
+      const res = await fetch('/py/process?async=1', {
         method: 'POST',
         body: form,
         credentials: 'include',
+        signal: controller.signal,
       })
       if (res.status === 302 || (res as unknown as { redirected?: boolean }).redirected) {
         setMessage('Bitte zuerst im Python-Backend anmelden. Weiterleitung…')
         window.location.href = '/py/login'
         return
       }
-      const j = await res.json().catch(() => null)
+      let j = await res.json().catch(() => null)
+      if (res.ok && j?.status === 'accepted' && j.jobId) {
+        j = await waitForJob(j.jobId, controller.signal)
+      }
       if (!res.ok || !j || j.status !== 'ok') {
         throw new Error(j?.message || 'Verarbeitung fehlgeschlagen')
       }
@@ -37,10 +66,11 @@ export default function Kontobuchung() {
       window.open(url, '_blank', 'noopener,noreferrer')
       setMessage('Mietabgleich abgeschlossen. Download wird gestartet.')
     } catch (e: unknown) {
+      if (controller.signal.aborted) return
       const msg = e instanceof Error ? e.message : 'Unbekannter Fehler'
       setMessage(msg)
     } finally {
-      setBusy(false)
+      if (!controller.signal.aborted) setBusy(false)
     }
   }
 
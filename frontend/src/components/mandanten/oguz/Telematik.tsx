@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 
 function formatDateYMD(): string {
   const d = new Date()
@@ -8,34 +8,63 @@ function formatDateYMD(): string {
   return `${y}${m}${day}`
 }
 
+// Job-Modus: der Server antwortet sofort mit einer Job-ID, das Ergebnis wird per Long-Polling abgeholt.
+// Höchstens JOB_FRIST_MS lang: ein Job, der hängen bleibt (z. B. weil der Worker mit dem Pool neu gestartet
+// wurde), endet mit einer Meldung statt die Seite für immer zu blockieren
+const JOB_FRIST_MS = 15 * 60 * 1000
+
+async function waitForJob(jobId: string, signal: AbortSignal): Promise<any> {
+  const frist = Date.now() + JOB_FRIST_MS
+  while (Date.now() < frist) {
+    const res = await fetch(`/oguz/jobs/${encodeURIComponent(jobId)}?wait=25`, { credentials: 'include', signal })
+    const j = await res.json().catch(() => null)
+    if (!res.ok || !j) {
+      throw new Error(j?.message || 'Job-Status konnte nicht abgerufen werden')
+    }
+    if (j.status !== 'pending' && j.status !== 'running') {
+      return j
+    }
+  }
+  throw new Error('Die Verarbeitung ist nicht rechtzeitig fertig geworden. Bitte später erneut versuchen.')
+}
+
 export default function Telematik() {
   const [file, setFile] = useState<File | null>(null)
   const [busy, setBusy] = useState(false)
   const [message, setMessage] = useState<string | null>(null)
   const [clipboardPreview, setClipboardPreview] = useState<string>('')
   const fileId = 'file-telematik'
+  // Verlässt man die Seite, brechen Upload und Polling ab
+  const abbruch = useRef<AbortController | null>(null)
+  useEffect(() => () => abbruch.current?.abort(), [])
 
   async function onProcess(): Promise<void> {
     if (!file) {
       setMessage('Bitte zuerst eine Excel-Datei auswählen (.xlsx).')
       return
     }
+    const controller = new AbortController()
+    abbruch.current = controller
     setBusy(true)
     setMessage(null)
     try {
       const form = new FormData()
       form.append('excel', file)
-      const res = await fetch('/oguz/telematik/process', {
+      const res = await fetch('/oguz/telematik/process?async=1', {
         method: 'POST',
         body: form,
         credentials: 'include',
+        signal: controller.signal,
       })
       if (res.status === 302 || (res as any).redirected) {
         // Sollte nicht mehr passieren (Auth entfernt), fallback
         window.location.href = '/py/login'
         return
       }
-      const j = await res.json().catch(() => null)
+      let j = await res.json().catch(() => null)
+      if (res.ok && j?.status === 'accepted' && j.jobId) {
+        j = await waitForJob(j.jobId, controller.signal)
+      }
       if (!res.ok || !j || j.status !== 'ok') {
         throw new Error(j?.message || 'Verarbeitung fehlgeschlagen')
       }
@@ -50,9 +79,10 @@ export default function Telematik() {
       setClipboardPreview(j.clipboardPreview || '')
       setMessage(`Datei verarbeitet und heruntergeladen: ${url.split('/').pop()}`)
     } catch (err: any) {
+      if (controller.signal.aborted) return
       setMessage(err?.message ?? 'Unbekannter Fehler bei der Verarbeitung')
     } finally {
-      setBusy(false)
+      if (!controller.signal.aborted) setBusy(false)
     }
   }
 
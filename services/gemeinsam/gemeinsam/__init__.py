@@ -0,0 +1,5 @@
+"""Gemeinsame Bausteine der Python-Services unter services/.
+
+Jeder Service installiert das Paket über seine requirements.txt (`-e ../gemeinsam`) und importiert
+die Module als `from gemeinsam import messung` usw.
+"""
@@ -0,0 +1,77 @@
+"""Schreiben auf die Platte im Hintergrund.
+
+Die Anfragen arbeiten im Speicher; Ergebnisse, Cache-Einträge und (optional) Uploads werden erst
+nach der Antwort von einem eigenen Thread geschrieben. Bis dahin liefert ausstehend() den Inhalt
+aus dem Speicher, damit ein sofortiger Download nicht ins Leere läuft.
+
+ausstehend() kennt nur die Aufträge des eigenen Prozesses. Laufen mehrere Worker (gunicorn), kann
+der Download bei einem anderen Worker landen als die Verarbeitung; warte_auf() gibt dem Schreiben
+des anderen Prozesses dafür bis zu ABLAGE_WARTEN_S Sekunden Zeit. Das geht nur gut, solange der Pfad
+noch nicht von einem früheren Ergebnis belegt ist; Ergebnisse bekommen deshalb mit eigener_ordner()
+einen eigenen Ordner, wie die Jobs.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Ein einziger Schreib-Thread: Aufträge für denselben Pfad werden in Eingangsreihenfolge geschrieben
+_schreiber = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ablage")
+_offen: dict[str, bytes] = {}
+_sperre = threading.Lock()
+# Nur mit mehreren Worker-Prozessen nötig; server.konfiguration() setzt dann einen Standardwert
+WARTEN_S = float(os.environ.get("ABLAGE_WARTEN_S", "0"))
+
+
+def _ausfuehren(fn, *args):
+    try:
+        fn(*args)
+    except Exception:
+        traceback.print_exc()
+
+
+def im_hintergrund(fn, *args) -> None:
+    _schreiber.submit(_ausfuehren, fn, *args)
+
+
+def _schreibe(pfad: str, daten: bytes) -> None:
+    try:
+        os.makedirs(os.path.dirname(pfad), exist_ok=True)
+        tmp = f"{pfad}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(daten)
+        os.replace(tmp, pfad)
+    finally:
+        with _sperre:
+            # Nur austragen, wenn nicht inzwischen ein neuerer Stand für denselben Pfad wartet
+            if _offen.get(pfad) is daten:
+                del _offen[pfad]
+
+
+def schreibe_spaeter(pfad: str, daten: bytes) -> None:
+    with _sperre:
+        _offen[pfad] = daten
+    im_hintergrund(_schreibe, pfad, daten)
+
+
+def ausstehend(pfad: str) -> bytes | None:
+    """Inhalt einer noch nicht geschriebenen Datei, sonst None."""
+    with _sperre:
+        return _offen.get(pfad)
+
+
+def eigener_ordner(name: str) -> str:
+    """<uuid>/name: relativer Pfad für ein Ergebnis, das kein anderes überschreibt oder verdeckt."""
+    return f"{uuid.uuid4().hex}/{name}"
+
+
+def warte_auf(pfad: str) -> bool:
+    """True, sobald die Datei existiert; wartet höchstens WARTEN_S Sekunden."""
+    frist = time.monotonic() + WARTEN_S
+    while not os.path.exists(pfad):
+        if time.monotonic() >= frist:
+            return False
+        time.sleep(0.05)
+    return True
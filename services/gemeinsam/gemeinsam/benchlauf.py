@@ -0,0 +1,148 @@
+"""Benchmark-Läufe über Größenreihen mit gespeichertem Vergleichsstand (Baseline).
+
+Ein Szenario erzeugt seine Eingabe synthetisch (synth.py) und verarbeitet sie wie der Service.
+Jede Größe läuft in einem frischen Prozess; gemessen werden die beste Laufzeit aus mehreren
+Wiederholungen, der Spitzen-RSS des Prozesses und die Größe der Ausgabe. --baseline-speichern
+legt das Ergebnis als Vergleichsstand ab, spätere Läufe vergleichen dagegen und enden mit
+Exit-Code 1, wenn Laufzeit oder Speicher über der Toleranz liegen oder sich die Ausgabegröße ändert.
+
+Die Baseline gilt nur für den Rechner, auf dem sie aufgenommen wurde.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Ausgabegrößen dürfen nur minimal schwanken (Datum im Dateinamen/Kopf, Zip-Zeitstempel)
+AUSGABE_TOLERANZ = 0.01
+
+
+class Szenario(NamedTuple):
+    name: str
+    groessen: tuple[int, ...]
+    # Beide auf Modulebene, damit sie im frischen Prozess (spawn) auffindbar sind
+    erzeuge: Callable  # Größe → Eingabe
+    verarbeite: Callable  # Eingabe → Ausgabe (bytes)
+
+
+def _rss_mb() -> float | None:
+    if resource is None:
+        return None
+    spitze = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return spitze / (1024 * 1024) if sys.platform == "darwin" else spitze / 1024  # macOS: Bytes, Linux: KiB
+
+
+def _einzellauf(verarbeite, eingabe, wiederholungen: int) -> dict:
+    # Läuft im frischen Prozess; rss_start ist der Stand nach Import und Übergabe der Eingabe
+    rss_start = _rss_mb()
+    zeiten = []
+    for _ in range(wiederholungen):
+        t0 = time.perf_counter()
+        ausgabe = verarbeite(eingabe)
+        zeiten.append(time.perf_counter() - t0)
+    return {"zeit_s": min(zeiten), "rss_mb": _rss_mb(), "rss_start_mb": rss_start, "ausgabe_bytes": len(ausgabe)}
+
+
+def miss(szenarien, wiederholungen: int = 3, groessen=None):
+    """Liefert (Szenario, Größe, Messung) je Lauf; die Eingabe wird außerhalb der Messung erzeugt."""
+    ctx = multiprocessing.get_context("spawn")
+    for sz in szenarien:
+        for n in groessen or sz.groessen:
+            eingabe = sz.erzeuge(n)
+            with ctx.Pool(1) as pool:
+                messung = pool.apply(_einzellauf, (sz.verarbeite, eingabe, wiederholungen))
+            messung["eingabe_bytes"] = len(eingabe) if isinstance(eingabe, bytes) else sum(map(len, eingabe))
+            yield sz.name, n, messung
+
+
+def _abweichung(wert, basis) -> float | None:
+    if wert is None or not basis:
+        return None
+    return wert / basis - 1
+
+
+def vergleiche(messung: dict, basis: dict | None, toleranz: float) -> list[str]:
+    """Liste der Überschreitungen einer Messung gegenüber ihrem Baseline-Eintrag."""
+    if not basis:
+        return []
+    probleme = []
+    for feld, grenze in (("zeit_s", toleranz), ("rss_mb", toleranz), ("ausgabe_bytes", AUSGABE_TOLERANZ)):
+        d = _abweichung(messung.get(feld), basis.get(feld))
+        if d is not None and (d > grenze or (feld == "ausgabe_bytes" and d < -grenze)):
+            probleme.append(f"{feld} {d:+.0%}")
+    return probleme
+
+
+def _fmt(wert, basis, format_: str) -> str:
+    if wert is None:
+        return "-"
+    text = format(wert, format_)
+    d = _abweichung(wert, basis)
+    return text if d is None else f"{text} ({d:+.0%})"
+
+
+def main(szenarien, baseline_pfad: str, argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark-Suite über synthetische Eingaben")
+    parser.add_argument("--szenario", action="append", help="nur dieses Szenario (mehrfach möglich)")
+    parser.add_argument("--groessen", help="Größen statt der Standardreihe, z. B. 1000,5000")
+    parser.add_argument("--wiederholungen", type=int, default=3)
+    parser.add_argument("--baseline", default=baseline_pfad, help="Baseline-Datei (Standard: %(default)s)")
+    parser.add_argument("--baseline-speichern", action="store_true", help="Ergebnis als neue Baseline ablegen")
+    parser.add_argument("--toleranz", type=float, default=0.25, help="erlaubter Zuwachs für Zeit und RSS (Anteil)")
+    parser.add_argument("--json", help="Ergebnis zusätzlich als JSON in diese Datei schreiben")
+    args = parser.parse_args(argv)
+
+    auswahl = [sz for sz in szenarien if not args.szenario or sz.name in args.szenario]
+    groessen = [int(g) for g in args.groessen.split(",")] if args.groessen else None
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["ergebnisse"]
+    except FileNotFoundError:
+        baseline = {}
+
+    print(f"{'Szenario':<20} {'Größe':>8} {'Zeit [s]':>16} {'Max-RSS [MB]':>16} {'Ausgabe [KB]':>16}  Abweichung")
+    ergebnisse = {}
+    regressionen = 0
+    for name, n, messung in miss(auswahl, args.wiederholungen, groessen):
+        basis = baseline.get(name, {}).get(str(n), {})
+        ergebnisse.setdefault(name, {})[str(n)] = messung
+        probleme = vergleiche(messung, basis, args.toleranz)
+        regressionen += bool(probleme)
+        kb = messung["ausgabe_bytes"] / 1024
+        kb_basis = basis["ausgabe_bytes"] / 1024 if basis.get("ausgabe_bytes") else None
+        print(f"{name:<20} {n:>8} {_fmt(messung['zeit_s'], basis.get('zeit_s'), '.3f'):>16} "
+              f"{_fmt(messung['rss_mb'], basis.get('rss_mb'), '.1f'):>16} {_fmt(kb, kb_basis, '.0f'):>16}  "
+              f"{', '.join(probleme) or ('ok' if basis else 'keine Baseline')}")
+
+    stand = {
+        "zeitpunkt": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "rechner": platform.node(),
+        "cpus": os.cpu_count(),
+        "wiederholungen": args.wiederholungen,
+        "ergebnisse": ergebnisse,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(stand, f, ensure_ascii=False, indent=1)
+    if args.baseline_speichern:
+        # Vorhandene Einträge anderer Szenarien/Größen bleiben stehen
+        for name, je_groesse in ergebnisse.items():
+            baseline.setdefault(name, {}).update(je_groesse)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({**stand, "ergebnisse": baseline}, f, ensure_ascii=False, indent=1)
+        print(f"Baseline gespeichert: {args.baseline}")
+        return 0
+    if regressionen:
+        print(f"{regressionen} Messung(en) über der Toleranz")
+    return 1 if regressionen else 0
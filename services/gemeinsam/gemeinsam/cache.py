@@ -0,0 +1,136 @@
+"""Ergebnis-Cache nach Inhalt.
+
+Der Schlüssel ist ein SHA-256 über die Eingabedateien, die relevanten Optionen und den Codestand
+(Hash der Quelltexte). Ein Treffer liefert das gespeicherte Ergebnis ohne erneute Verarbeitung.
+Einträge liegen als results/<schlüssel>/ neben den übrigen Ergebnissen; raeume_auf() hält den
+ganzen results/-Ordner nach Alter und Größe klein.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# Frische Einträge (laufende Jobs, gerade erzeugte Dateien) werden nie gelöscht
+_SCHONFRIST_S = 600
+_RAEUM_INTERVALL_S = 60
+
+
+def code_stand(*dateien) -> str:
+    h = hashlib.sha256()
+    for pfad in dateien:
+        with open(pfad, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _groesse(pfad: str) -> int:
+    if not os.path.isdir(pfad):
+        return os.path.getsize(pfad)
+    summe = 0
+    for wurzel, _, dateien in os.walk(pfad):
+        for name in dateien:
+            try:
+                summe += os.path.getsize(os.path.join(wurzel, name))
+            except FileNotFoundError:
+                pass
+    return summe
+
+
+def _entferne(pfad: str) -> None:
+    if os.path.isdir(pfad):
+        shutil.rmtree(pfad, ignore_errors=True)
+    else:
+        try:
+            os.remove(pfad)
+        except FileNotFoundError:
+            pass
+
+
+class ErgebnisCache:
+    def __init__(self, verzeichnis: str, code_version: str, max_bytes: int, max_alter_s: float, aktiv: bool = True):
+        self.verzeichnis = verzeichnis
+        self.code_version = code_version
+        self.max_bytes = max_bytes
+        self.max_alter_s = max_alter_s
+        self.aktiv = aktiv
+        self._letzte_raeumung = 0.0
+
+    def schluessel(self, *teile) -> str:
+        """Teile sind Bytes (Dateiinhalte) oder Texte (Optionen, Datum); die Reihenfolge zählt."""
+        h = hashlib.sha256(self.code_version.encode("utf-8"))
+        for teil in teile:
+            b = teil if isinstance(teil, bytes) else str(teil).encode("utf-8")
+            h.update(len(b).to_bytes(8, "little"))
+            h.update(b)
+        return h.hexdigest()
+
+    def hole(self, schluessel: str) -> dict | None:
+        """Metadaten des Eintrags ("datei", "antwort", "pfad") oder None."""
+        if not self.aktiv:
+            return None
+        eintrag = os.path.join(self.verzeichnis, schluessel)
+        try:
+            with open(os.path.join(eintrag, "cache.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        pfad = os.path.join(eintrag, meta["datei"])
+        if not os.path.exists(pfad):
+            return None
+        os.utime(eintrag)  # zuletzt benutzt, für die Räumung nach Größe
+        return {**meta, "pfad": pfad}
+
+    def lege_ab(self, schluessel: str, datei_pfad: str, antwort: dict | None = None) -> str | None:
+        """Kopiert das Ergebnis in den Cache (keine Hardlinks: openpyxl überschreibt Dateien an Ort und Stelle)."""
+        return self._lege_ab(schluessel, os.path.basename(datei_pfad), antwort, lambda ziel: shutil.copyfile(datei_pfad, ziel))
+
+    def lege_ab_daten(self, schluessel: str, name: str, daten: bytes, antwort: dict | None = None) -> str | None:
+        """Wie lege_ab(), für Ergebnisse, die nur im Speicher vorliegen."""
+        def schreibe(ziel):
+            with open(ziel, "wb") as f:
+                f.write(daten)
+        return self._lege_ab(schluessel, name, antwort, schreibe)
+
+    def _lege_ab(self, schluessel, name, antwort, schreibe) -> str | None:
+        if not self.aktiv:
+            return None
+        eintrag = os.path.join(self.verzeichnis, schluessel)
+        tmp = f"{eintrag}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        schreibe(os.path.join(tmp, name))
+        with open(os.path.join(tmp, "cache.json"), "w", encoding="utf-8") as f:
+            json.dump({"datei": name, "antwort": antwort or {}, "erstellt": time.time()}, f, ensure_ascii=False)
+        try:
+            os.rename(tmp, eintrag)
+        except OSError:
+            # Gleicher Inhalt wurde parallel schon abgelegt
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.raeume_auf()
+        return os.path.join(eintrag, name)
+
+    def raeume_auf(self, erzwingen: bool = False) -> int:
+        """Löscht im Ergebnisordner alles über dem Höchstalter, danach die ältesten Einträge,
+        bis die Gesamtgröße unter max_bytes liegt. Gibt die Zahl der gelöschten Einträge zurück."""
+        jetzt = time.time()
+        if not erzwingen and jetzt - self._letzte_raeumung < _RAEUM_INTERVALL_S:
+            return 0
+        self._letzte_raeumung = jetzt
+        eintraege = []
+        for e in os.scandir(self.verzeichnis):
+            try:
+                eintraege.append((e.stat().st_mtime, e.path, _groesse(e.path)))
+            except FileNotFoundError:
+                continue
+        eintraege.sort()
+        gesamt = sum(g for _, _, g in eintraege)
+        geloescht = 0
+        for mtime, pfad, groesse in eintraege:
+            alter = jetzt - mtime
+            if alter < _SCHONFRIST_S:
+                break
+            if alter > self.max_alter_s or gesamt > self.max_bytes:
+                _entferne(pfad)
+                gesamt -= groesse
+                geloescht += 1
+        return geloescht
@@ -0,0 +1,141 @@
+"""Hintergrund-Jobs für lange Excel-Verarbeitungen.
+
+Ein POST legt einen Job an und kehrt sofort mit der Job-ID zurück; die eigentliche Arbeit läuft
+in einem begrenzten Prozesspool. Der Zustand liegt als job.json im Ergebnisordner des Jobs, damit
+ihn jeder Webprozess lesen kann. Ein fertiger Job enthält dieselbe Antwort wie der synchrone Aufruf
+("status": "ok" bzw. "error"), ergänzt um die Job-ID und die gemessenen Schritte ("zeiten").
+"""
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import messung
+
+WARTEND = "pending"
+LAEUFT = "running"
+
+# Obergrenze für Long-Polling, deutlich unter dem 60-s-Timeout des Node-Proxys
+MAX_WARTEZEIT_S = 30.0
+_ABFRAGE_INTERVALL_S = 0.2
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _schreibe_zustand(job_dir: str, zustand: dict) -> None:
+    tmp = os.path.join(job_dir, "job.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(zustand, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(job_dir, "job.json"))
+
+
+def _lese_zustand(job_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(job_dir, "job.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _job_ausfuehren(job_id: str, job_dir: str, fn, args) -> list:
+    # Läuft im Pool-Prozess; fn bekommt den Job-Ordner für seine Ergebnisdatei.
+    # Die Messwerte gehen als Rückgabe an den Webprozess, dessen /metrics sie ausgibt
+    _schreibe_zustand(job_dir, {"status": LAEUFT, "jobId": job_id})
+    with messung.sammle() as gesammelt:
+        try:
+            antwort = fn(job_dir, *args)
+        except Exception as e:
+            antwort = {"status": "error", "message": str(e), "trace": traceback.format_exc()}
+    zeiten = [[name, round(dauer, 4)] for name, dauer in messung.schritte(gesammelt)]
+    _schreibe_zustand(job_dir, {**antwort, "jobId": job_id, "zeiten": zeiten})
+    return gesammelt
+
+
+class JobPool:
+    def __init__(self, basis_dir: str, max_worker: int):
+        self.basis_dir = basis_dir
+        self.max_worker = max_worker
+        self._executor = None
+        self._sperre = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._sperre:
+            if self._executor is None:
+                # spawn statt fork: der Webserver ist mehrfädig, ein fork könnte gehaltene Locks mitkopieren
+                self._executor = ProcessPoolExecutor(max_workers=self.max_worker,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _verwerfe(self, pool: ProcessPoolExecutor) -> None:
+        with self._sperre:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _abschicken(self, *args):
+        pool = self._pool()
+        try:
+            return pool.submit(_job_ausfuehren, *args)
+        except BrokenProcessPool:
+            # Ein abgestürzter Pool-Prozess (z. B. Speichermangel) macht den ganzen Pool unbrauchbar: neu anlegen
+            # und einmal wiederholen
+            self._verwerfe(pool)
+            return self._pool().submit(_job_ausfuehren, *args)
+
+    def job_dir(self, job_id: str) -> str | None:
+        if not _JOB_ID.match(job_id or ""):
+            return None
+        return os.path.join(self.basis_dir, job_id)
+
+    def neuer_job(self) -> tuple[str, str]:
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.basis_dir, job_id)
+        os.makedirs(job_dir)
+        _schreibe_zustand(job_dir, {"status": WARTEND, "jobId": job_id})
+        return job_id, job_dir
+
+    def starte(self, job_id: str, fn, *args, bei_ende=None) -> None:
+        """fn(job_dir, *args) muss auf Modulebene liegen und ein JSON-fähiges Antwort-dict liefern.
+
+        bei_ende() läuft, sobald der Job fertig ist oder sich nicht einreihen ließ (Freigabe des Zulassungsplatzes).
+        Lässt sich der Job nicht einreihen, steht der Fehler in job.json und die Exception geht an den Aufrufer.
+        """
+        job_dir = os.path.join(self.basis_dir, job_id)
+        try:
+            future = self._abschicken(job_id, job_dir, fn, args)
+        except Exception as e:
+            _schreibe_zustand(job_dir, {"status": "error", "message": str(e), "jobId": job_id})
+            if bei_ende is not None:
+                bei_ende()
+            raise
+
+        def _fertig(f):
+            # Exception nur, wenn der Pool-Prozess selbst ausfällt; Fehler in fn schreibt _job_ausfuehren
+            try:
+                if f.exception() is not None:
+                    _schreibe_zustand(job_dir, {"status": "error", "message": str(f.exception()), "jobId": job_id})
+                else:
+                    messung.uebernehme(f.result())
+            finally:
+                if bei_ende is not None:
+                    bei_ende()
+
+        future.add_done_callback(_fertig)
+
+    def zustand(self, job_id: str, warten: float = 0.0) -> dict | None:
+        """Aktueller Zustand; mit warten > 0 wird bis dahin auf das Ende des Jobs gewartet (Long-Polling)."""
+        job_dir = self.job_dir(job_id)
+        if job_dir is None:
+            return None
+        frist = time.monotonic() + min(max(warten, 0.0), MAX_WARTEZEIT_S)
+        while True:
+            z = _lese_zustand(job_dir)
+            if z is None or z.get("status") not in (WARTEND, LAEUFT) or time.monotonic() >= frist:
+                return z
+            time.sleep(_ABFRAGE_INTERVALL_S)
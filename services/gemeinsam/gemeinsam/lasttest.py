@@ -0,0 +1,233 @@
+"""Lasttest über HTTP gegen einen lokal gestarteten Service.
+
+Schickt synthetische Uploads mit 1, 4, 16 … parallelen Clients an den Service und misst je Stufe
+Latenz (p50/p95/p99, Histogramm), Durchsatz und Fehlerquote. Ohne --url startet der Lauf den
+Service selbst (flask run auf einem freien Port von 127.0.0.1, Ergebnis-Cache aus; mit --worker N
+stattdessen gunicorn mit N Workern) und beendet ihn danach; es wird nur localhost
+angesprochen. Nur Standardbibliothek, damit der Treiber auch ohne
+weitere Pakete läuft.
+
+Die Uploads liefert das Lastprofil des Services (bench_*.py last).
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, NamedTuple
+from urllib.parse import urlsplit
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Anfrage(NamedTuple):
+    pfad: str
+    dateien: dict  # Feldname → (Dateiname, Inhalt)
+    felder: dict | None = None  # weitere Formularfelder
+
+
+class Lastprofil(NamedTuple):
+    groesse: int  # Standardgröße der Uploads (Bedeutung wie im Benchmark-Szenario)
+    erzeuge: Callable  # (Größe, Variante) → Anfrage
+
+
+def multipart(anfrage: Anfrage) -> tuple[bytes, str]:
+    grenze = uuid.uuid4().hex
+    teile = []
+    for name, wert in (anfrage.felder or {}).items():
+        teile.append(f'--{grenze}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{wert}\r\n'.encode())
+    for name, (dateiname, inhalt) in anfrage.dateien.items():
+        teile.append(
+            f'--{grenze}\r\nContent-Disposition: form-data; name="{name}"; filename="{dateiname}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + inhalt + b"\r\n"
+        )
+    teile.append(f"--{grenze}--\r\n".encode())
+    return b"".join(teile), f"multipart/form-data; boundary={grenze}"
+
+
+def _freier_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def starte_service(verzeichnis: str, umgebung: dict, frist_s: float = 60.0, worker: int = 0):
+    """flask run (bzw. gunicorn mit worker Prozessen) im Service-Verzeichnis; liefert (Prozess, Basis-URL, Logdatei)."""
+    port = _freier_port()
+    log = tempfile.NamedTemporaryFile(prefix="lasttest_", suffix=".log", delete=False)
+    if worker:
+        befehl = [sys.executable, "-m", "gunicorn", "app:app"]
+        umgebung = {**umgebung, "HOST": "127.0.0.1", "PORT": str(port), "WORKER": str(worker)}
+    else:
+        befehl = [sys.executable, "-m", "flask", "--app", "app", "run", "--host", "127.0.0.1", "--port", str(port)]
+    prozess = subprocess.Popen(befehl, cwd=verzeichnis, env={**os.environ, **umgebung}, stdout=log,
+                               stderr=subprocess.STDOUT)
+    log.close()  # der Service schreibt über seinen eigenen Dateideskriptor weiter
+    url = f"http://127.0.0.1:{port}"
+    ende = time.monotonic() + frist_s
+    while time.monotonic() < ende:
+        if prozess.poll() is not None:
+            break
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return prozess, url, log.name
+        except OSError:
+            time.sleep(0.2)
+    prozess.kill()
+    with open(log.name, encoding="utf-8", errors="replace") as f:
+        raise RuntimeError(f"Service startet nicht ({url}):\n{f.read()[-2000:]}")
+
+
+def _sende(url: str, koerper: bytes, content_type: str, timeout: float) -> tuple[int, float | None]:
+    """(HTTP-Status, Server-Zeit "gesamt" aus Server-Timing in s); Status 0 bei Verbindungsfehler."""
+    teile = urlsplit(url)
+    verbindung = http.client.HTTPConnection(teile.hostname, teile.port, timeout=timeout)
+    try:
+        verbindung.request("POST", teile.path + (f"?{teile.query}" if teile.query else ""), body=koerper,
+                           headers={"Content-Type": content_type})
+        antwort = verbindung.getresponse()
+        antwort.read()
+        server = None
+        for eintrag in (antwort.getheader("Server-Timing") or "").split(","):
+            name, _, dauer = eintrag.strip().partition(";dur=")
+            if name == "gesamt" and dauer:
+                server = float(dauer) / 1000
+        return antwort.status, server
+    except (OSError, http.client.HTTPException):
+        return 0, None
+    finally:
+        verbindung.close()
+
+
+def stufe(url: str, koerper: list, clients: int, anfragen: int, timeout: float) -> dict:
+    """anfragen Uploads mit clients parallelen Verbindungen; die Uploads werden reihum verwendet."""
+    ergebnisse = []
+    naechste = iter(range(anfragen))
+    sperre = threading.Lock()
+
+    def client():
+        while True:
+            with sperre:
+                i = next(naechste, None)
+            if i is None:
+                return
+            daten, content_type = koerper[i % len(koerper)]
+            t0 = time.perf_counter()
+            status, server = _sende(url, daten, content_type, timeout)
+            dauer = time.perf_counter() - t0
+            with sperre:
+                ergebnisse.append((dauer, status, server))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    gesamt = time.perf_counter() - t0
+    return auswerten(ergebnisse, clients, gesamt)
+
+
+def _perzentil(sortiert: list, p: float) -> float | None:
+    # Nearest-Rank
+    if not sortiert:
+        return None
+    return sortiert[max(0, math.ceil(p / 100 * len(sortiert)) - 1)]
+
+
+def auswerten(ergebnisse: list, clients: int, gesamt_s: float) -> dict:
+    ok = sorted(d for d, status, _ in ergebnisse if 200 <= status < 300)
+    server = sorted(s for d, status, s in ergebnisse if 200 <= status < 300 and s is not None)
+    histogramm = [0] * (len(BUCKETS) + 1)
+    for d in ok:
+        histogramm[next((i for i, grenze in enumerate(BUCKETS) if d <= grenze), len(BUCKETS))] += 1
+    fehler = {}
+    for _, status, _ in ergebnisse:
+        if not 200 <= status < 300:
+            fehler[str(status or "Verbindung")] = fehler.get(str(status or "Verbindung"), 0) + 1
+    return {
+        "clients": clients,
+        "anfragen": len(ergebnisse),
+        "fehlerquote": (len(ergebnisse) - len(ok)) / len(ergebnisse) if ergebnisse else 0.0,
+        "fehler": fehler,
+        "durchsatz_rps": len(ok) / gesamt_s if gesamt_s else 0.0,
+        "p50_s": _perzentil(ok, 50),
+        "p95_s": _perzentil(ok, 95),
+        "p99_s": _perzentil(ok, 99),
+        "max_s": ok[-1] if ok else None,
+        "server_p50_s": _perzentil(server, 50),
+        "histogramm": histogramm,
+    }
+
+
+def _s(wert) -> str:
+    return "-" if wert is None else f"{wert:.3f}"
+
+
+def drucke(ergebnis: dict) -> None:
+    print(f"{ergebnis['clients']:>7} {ergebnis['anfragen']:>8} {ergebnis['fehlerquote']:>7.1%} "
+          f"{ergebnis['durchsatz_rps']:>8.2f} {_s(ergebnis['p50_s']):>8} {_s(ergebnis['p95_s']):>8} "
+          f"{_s(ergebnis['p99_s']):>8} {_s(ergebnis['max_s']):>8} {_s(ergebnis['server_p50_s']):>10}")
+    grenzen = [f"≤{g:g}s" for g in BUCKETS] + [f">{BUCKETS[-1]:g}s"]
+    spitze = max(ergebnis["histogramm"]) or 1
+    for grenze, n in zip(grenzen, ergebnis["histogramm"]):
+        if n:
+            print(f"{'':>16}{grenze:>8} {n:>5} {'#' * max(1, round(40 * n / spitze))}")
+    if ergebnis["fehler"]:
+        print(f"{'':>16}Fehler: {', '.join(f'{k}: {v}' for k, v in sorted(ergebnis['fehler'].items()))}")
+
+
+def main(profil: Lastprofil, verzeichnis: str, argv=None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP-Lasttest gegen den lokal gestarteten Service")
+    parser.add_argument("--url", help="laufenden Service verwenden statt selbst zu starten, z. B. http://127.0.0.1:5005")
+    parser.add_argument("--clients", default="1,4,16", help="parallele Clients je Stufe (Standard: %(default)s)")
+    parser.add_argument("--anfragen", type=int, help="Anfragen je Stufe (Standard: 4 je Client, mindestens 8)")
+    parser.add_argument("--groesse", type=int, default=profil.groesse, help="Größe der Uploads (Standard: %(default)s)")
+    parser.add_argument("--varianten", type=int, default=4, help="verschiedene Uploads, reihum gesendet")
+    parser.add_argument("--worker", type=int, default=0, help="Service über gunicorn mit so vielen Worker-Prozessen starten")
+    parser.add_argument("--mit-cache", action="store_true", help="Ergebnis-Cache des gestarteten Service nicht abschalten")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Sekunden je Anfrage")
+    parser.add_argument("--json", help="Ergebnis zusätzlich als JSON in diese Datei schreiben")
+    args = parser.parse_args(argv)
+
+    anfragen = [profil.erzeuge(args.groesse, v) for v in range(args.varianten)]
+    koerper = [multipart(a) for a in anfragen]
+    print(f"{len(koerper)} Uploads à {sum(len(k) for k, _ in koerper) / len(koerper) / 1024:.0f} KB, "
+          f"Pfad {anfragen[0].pfad}")
+
+    prozess = log = None
+    basis = args.url
+    if basis is None:
+        umgebung = {} if args.mit_cache else {"RESULT_CACHE": "0"}
+        prozess, basis, log = starte_service(verzeichnis, umgebung, worker=args.worker)
+        print(f"Service gestartet: {basis} (Log: {log})")
+    url = basis.rstrip("/") + anfragen[0].pfad
+    stufen = []
+    try:
+        # Aufwärmen: Importe, erster Zugriff auf Regeln/Caches
+        _sende(url, *koerper[0], args.timeout)
+        print(f"{'Clients':>7} {'Anfragen':>8} {'Fehler':>7} {'Anfr./s':>8} {'p50 [s]':>8} {'p95 [s]':>8} "
+              f"{'p99 [s]':>8} {'max [s]':>8} {'Server p50':>10}")
+        for clients in (int(c) for c in args.clients.split(",")):
+            ergebnis = stufe(url, koerper, clients, args.anfragen or max(8, 4 * clients), args.timeout)
+            drucke(ergebnis)
+            stufen.append(ergebnis)
+    finally:
+        if prozess is not None:
+            prozess.terminate()
+            try:
+                prozess.wait(10)
+            except subprocess.TimeoutExpired:
+                prozess.kill()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "groesse": args.groesse, "stufen": stufen}, f, ensure_ascii=False, indent=1)
+    return 1 if any(s["fehlerquote"] for s in stufen) else 0
@@ -0,0 +1,347 @@
+"""Zeitmessung je Verarbeitungsschritt und Metriken im Prometheus-Format.
+
+messe("schritt") bzw. Stoppuhr.runde("schritt") messen einen Schritt, zaehle_zeilen() und
+eingabe_groesse() halten Zeilenzahlen und Dateigrößen fest. Alles landet in Histogrammen des
+Prozesses, die GET /metrics im Textformat von Prometheus ausgibt. Innerhalb einer Anfrage werden
+die Schritte zusätzlich gesammelt und als Server-Timing-Header mitgeschickt.
+
+Jobs im Prozesspool sammeln ihre Werte mit sammle(); der Webprozess übernimmt sie mit uebernehme().
+Daneben gibt es Momentanwerte (Gauges): die Dauer der Startphasen (setze(), siehe server.py) und den
+Speicher je Worker, der bei jedem Abruf von /metrics neu gelesen wird; weitere Momentanwerte frischt
+eine mit bei_abruf() angemeldete Funktion auf. Zähler (zaehle()) wachsen nur.
+
+Mit mehreren Worker-Prozessen (gunicorn, server.py) legt jeder Worker seinen Stand nach jeder Anfrage
+in einem gemeinsamen Verzeichnis ab (teile_ueber()). /metrics fasst dann alle Worker zusammen,
+egal welcher antwortet: Histogramme und Zähler werden summiert, auch die beendeter Worker, damit sie
+nicht zurückspringen; Startdauer und Speicher stehen je lebendem Worker mit dem Label worker (PID).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+STUFE = "stufe_dauer_sekunden"
+ANFRAGE = "anfrage_dauer_sekunden"
+ZEILEN = "verarbeitete_zeilen"
+EINGABE = "eingabe_bytes"
+START = "start_dauer_sekunden"
+SPEICHER = "prozess_speicher_bytes"
+ZULASSUNG = "zulassung_anfragen"
+ABGELEHNT = "abgelehnte_anfragen_total"
+
+_SEKUNDEN = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_MENGEN = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Metrik → (Beschreibung, Bucket-Grenzen, Label)
+_METRIKEN = {
+    STUFE: ("Dauer je Verarbeitungsschritt", _SEKUNDEN, "stufe"),
+    ANFRAGE: ("Dauer je Anfrage", _SEKUNDEN, "route"),
+    ZEILEN: ("Zeilen je Verarbeitung", _MENGEN, "tabelle"),
+    EINGABE: ("Größe der hochgeladenen Dateien", _MENGEN, "datei"),
+}
+
+# Momentanwert → (Beschreibung, Label)
+_STAENDE = {
+    START: ("Dauer der Startphasen je Worker", "phase"),
+    SPEICHER: ("Speicher je Worker (rss, pss, privat)", "art"),
+    ZULASSUNG: ("Verarbeitungen, die gerade laufen bzw. auf einen Platz warten (alle Worker)", "zustand"),
+}
+# Diese Momentanwerte gelten je Prozess und tragen zusätzlich das Label worker
+_JE_PROZESS = {START, SPEICHER}
+# Zähler → (Beschreibung, Label)
+_ZAEHLER = {
+    ABGELEHNT: ("Abgewiesene Uploads (voll, wartezeit, groesse, zeilen)", "grund"),
+}
+
+_sperre = threading.Lock()
+# (Metrik, Labelwert) → [Anzahl je Bucket (nicht kumuliert, letzter = +Inf), Summe]
+_histogramme: dict[tuple[str, str], list] = {}
+# (Momentanwert bzw. Zähler, Labelwert) → Wert
+_staende: dict[tuple[str, str], float] = {}
+_zaehler: dict[tuple[str, str], float] = {}
+# Funktionen, die vor jeder Ausgabe von /metrics Momentanwerte setzen
+_bei_abruf: list = []
+# Liste der aktuellen Anfrage bzw. des Jobs: (Metrik, Labelwert, Wert)
+_gesammelt = contextvars.ContextVar("messung_gesammelt", default=None)
+# Verzeichnis für den Stand je Worker (<pid>.json); None = nur dieser Prozess
+_verzeichnis: str | None = None
+
+
+def _beobachte(metrik: str, label: str, wert: float) -> None:
+    grenzen = _METRIKEN[metrik][1]
+    with _sperre:
+        h = _histogramme.get((metrik, label))
+        if h is None:
+            h = _histogramme[(metrik, label)] = [[0] * (len(grenzen) + 1), 0.0]
+        h[0][bisect_left(grenzen, wert)] += 1
+        h[1] += wert
+
+
+def erfasse(metrik: str, label: str, wert: float) -> None:
+    _beobachte(metrik, label, wert)
+    liste = _gesammelt.get()
+    if liste is not None:
+        liste.append((metrik, label, wert))
+
+
+@contextmanager
+def messe(stufe: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        erfasse(STUFE, stufe, time.perf_counter() - t0)
+
+
+class Stoppuhr:
+    """Für lange, lineare Abläufe: runde() misst die Zeit seit dem Start bzw. der letzten Runde."""
+
+    def __init__(self):
+        self._t = time.perf_counter()
+
+    def runde(self, stufe: str) -> None:
+        jetzt = time.perf_counter()
+        erfasse(STUFE, stufe, jetzt - self._t)
+        self._t = jetzt
+
+
+def zaehle_zeilen(tabelle: str, anzahl: int) -> None:
+    erfasse(ZEILEN, tabelle, anzahl)
+
+
+def eingabe_groesse(datei: str, anzahl_bytes: int) -> None:
+    erfasse(EINGABE, datei, anzahl_bytes)
+
+
+@contextmanager
+def sammle():
+    """Alle Werte innerhalb des Blocks zusätzlich in einer Liste sammeln (für Header bzw. Job-Ergebnis)."""
+    liste = []
+    token = _gesammelt.set(liste)
+    try:
+        yield liste
+    finally:
+        _gesammelt.reset(token)
+
+
+def uebernehme(gesammelt) -> None:
+    """Werte aus einem anderen Prozess (Job) in die Histogramme dieses Prozesses übernehmen."""
+    for metrik, label, wert in gesammelt or ():
+        if metrik in _METRIKEN:
+            _beobachte(metrik, label, wert)
+    sichere_stand()
+
+
+def setze(metrik: str, label: str, wert: float) -> None:
+    with _sperre:
+        _staende[(metrik, label)] = wert
+
+
+def zaehle(metrik: str, label: str, anzahl: float = 1) -> None:
+    with _sperre:
+        _zaehler[(metrik, label)] = _zaehler.get((metrik, label), 0) + anzahl
+
+
+def bei_abruf(fn) -> None:
+    _bei_abruf.append(fn)
+
+
+def lebt(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # os.kill(pid, 0) würde den Prozess unter Windows beenden
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def teile_ueber(verzeichnis: str) -> None:
+    """Stand aller Worker in diesem Verzeichnis zusammenführen; im Hauptprozess vor dem fork aufrufen.
+
+    Alte Stände (voriger Start) werden entfernt.
+    """
+    global _verzeichnis
+    os.makedirs(verzeichnis, exist_ok=True)
+    for name in os.listdir(verzeichnis):
+        if name.endswith(".json"):
+            os.remove(os.path.join(verzeichnis, name))
+    _verzeichnis = verzeichnis
+
+
+def _stand() -> dict:
+    with _sperre:
+        return {
+            "histogramme": [[m, label, list(h[0]), h[1]] for (m, label), h in _histogramme.items()],
+            "zaehler": [[m, label, wert] for (m, label), wert in _zaehler.items()],
+            "staende": [[m, label, wert] for (m, label), wert in _staende.items()],
+        }
+
+
+def sichere_stand(stand: dict | None = None) -> None:
+    """Stand dieses Prozesses für die anderen Worker ablegen (nur mit teile_ueber())."""
+    if _verzeichnis is None:
+        return
+    stand = _stand() if stand is None else stand
+    ziel = os.path.join(_verzeichnis, f"{os.getpid()}.json")
+    tmp = f"{ziel}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stand, f)
+        os.replace(tmp, ziel)
+    except OSError:
+        pass  # /metrics zeigt dann den vorigen Stand dieses Prozesses
+
+
+def _alle_staende(eigen: dict) -> dict[int, dict]:
+    staende = {os.getpid(): eigen}
+    if _verzeichnis is None:
+        return staende
+    try:
+        namen = os.listdir(_verzeichnis)
+    except OSError:
+        return staende
+    for name in namen:
+        pid = name[:-len(".json")]
+        if not name.endswith(".json") or not pid.isdigit() or int(pid) in staende:
+            continue
+        try:
+            with open(os.path.join(_verzeichnis, name), encoding="utf-8") as f:
+                staende[int(pid)] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return staende
+
+
+def speicher(pid: int | None = None) -> dict[str, int] | None:
+    """RSS, PSS und privater Speicher eines Prozesses in Bytes; None ohne /proc (nur Linux).
+
+    PSS teilt gemeinsam genutzte Seiten auf alle Prozesse auf, die sie nutzen; die Summe über
+    Hauptprozess und Worker ist daher der tatsächliche Verbrauch.
+    """
+    felder = {"Rss": "rss", "Pss": "pss", "Private_Clean": "privat", "Private_Dirty": "privat"}
+    werte = {"rss": 0, "pss": 0, "privat": 0}
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup", encoding="ascii") as f:
+            for zeile in f:
+                name, _, rest = zeile.partition(":")
+                if name in felder:
+                    werte[felder[name]] += int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return werte
+
+
+def schritte(gesammelt) -> list[tuple[str, float]]:
+    return [(label, wert) for metrik, label, wert in gesammelt if metrik == STUFE]
+
+
+def server_timing(schritte_) -> str:
+    # dur in Millisekunden; ein Schritt darf mehrfach vorkommen
+    return ", ".join(f"{name};dur={dauer * 1000:.1f}" for name, dauer in schritte_)
+
+
+def _zahl(wert: float) -> str:
+    return str(int(wert)) if float(wert).is_integer() else repr(float(wert))
+
+
+def _label(wert: str) -> str:
+    return wert.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    for fn in _bei_abruf:
+        fn()
+    eigen = _stand()
+    sichere_stand(eigen)
+    pid_eigen = os.getpid()
+
+    histogramme: dict[tuple[str, str], list] = {}
+    zaehler: dict[tuple[str, str], float] = {}
+    # (Momentanwert, worker, Labelwert) → Wert; worker None für Werte, die für den ganzen Service gelten
+    staende: dict[tuple[str, str | None, str], float] = {}
+    for pid, stand in _alle_staende(eigen).items():
+        for metrik, label, anzahl, summe in stand["histogramme"]:
+            h = histogramme.setdefault((metrik, label), [[0] * len(anzahl), 0.0])
+            h[0] = [a + b for a, b in zip(h[0], anzahl)]
+            h[1] += summe
+        for metrik, label, wert in stand["zaehler"]:
+            zaehler[(metrik, label)] = zaehler.get((metrik, label), 0) + wert
+        if pid != pid_eigen and not lebt(pid):
+            continue
+        for metrik, label, wert in stand["staende"]:
+            if metrik in _JE_PROZESS:
+                staende[(metrik, str(pid), label)] = wert
+            elif pid == pid_eigen:
+                staende[(metrik, None, label)] = wert
+        for art, wert in (speicher(None if pid == pid_eigen else pid) or {}).items():
+            staende[(SPEICHER, str(pid), art)] = wert
+
+    zeilen = []
+    for metrik, (hilfe, grenzen, label) in _METRIKEN.items():
+        zeilen.append(f"# HELP {metrik} {hilfe}")
+        zeilen.append(f"# TYPE {metrik} histogram")
+        for (m, wert), (anzahl, summe) in sorted(histogramme.items()):
+            if m != metrik:
+                continue
+            lbl = f'{label}="{_label(wert)}"'
+            kumuliert = 0
+            for grenze, n in zip(grenzen, anzahl):
+                kumuliert += n
+                zeilen.append(f'{metrik}_bucket{{{lbl},le="{_zahl(grenze)}"}} {kumuliert}')
+            kumuliert += anzahl[-1]
+            zeilen.append(f'{metrik}_bucket{{{lbl},le="+Inf"}} {kumuliert}')
+            zeilen.append(f"{metrik}_sum{{{lbl}}} {_zahl(summe)}")
+            zeilen.append(f"{metrik}_count{{{lbl}}} {kumuliert}")
+    for metrik, (hilfe, label) in _STAENDE.items():
+        zeilen.append(f"# HELP {metrik} {hilfe}")
+        zeilen.append(f"# TYPE {metrik} gauge")
+        for (m, worker, wert), zahl in sorted(staende.items(), key=lambda e: (e[0][0], e[0][1] or "", e[0][2])):
+            if m == metrik:
+                vorn = "" if worker is None else f'worker="{worker}",'
+                zeilen.append(f'{metrik}{{{vorn}{label}="{_label(wert)}"}} {_zahl(zahl)}')
+    for metrik, (hilfe, label) in _ZAEHLER.items():
+        zeilen.append(f"# HELP {metrik} {hilfe}")
+        zeilen.append(f"# TYPE {metrik} counter")
+        for (m, wert), zahl in sorted(zaehler.items()):
+            if m == metrik:
+                zeilen.append(f'{metrik}{{{label}="{_label(wert)}"}} {_zahl(zahl)}')
+    return "\n".join(zeilen) + "\n"
+
+
+def richte_ein(app) -> None:
+    """Server-Timing für jede Anfrage und die Route /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _messung_start():
+        g.messung = (time.perf_counter(), [])
+        g.messung_token = _gesammelt.set(g.messung[1])
+
+    @app.after_request
+    def _messung_header(antwort):
+        if "messung" not in g:
+            return antwort
+        t0, gesammelt = g.messung
+        gesamt = time.perf_counter() - t0
+        _beobachte(ANFRAGE, request.url_rule.rule if request.url_rule else "unbekannt", gesamt)
+        # Ein schon gesetzter Header (z. B. Schritte eines Jobs) bleibt vorne stehen
+        teile = [antwort.headers.get("Server-Timing"), server_timing(schritte(gesammelt) + [("gesamt", gesamt)])]
+        antwort.headers["Server-Timing"] = ", ".join(t for t in teile if t)
+        sichere_stand()
+        return antwort
+
+    @app.teardown_request
+    def _messung_ende(_fehler=None):
+        token = g.pop("messung_token", None)
+        if token is not None:
+            _gesammelt.reset(token)
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(prometheus_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
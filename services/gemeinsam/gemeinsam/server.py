@@ -0,0 +1,137 @@
+"""Produktionsstart mit gunicorn, gemeinsam für alle Services.
+
+Jeder Service hat eine gunicorn.conf.py, die konfiguration() mit seinem Port und seinen Vorlade-Modulen
+aufruft; gunicorn liest sie beim Start im Service-Verzeichnis:
+
+    gunicorn app:app                       # Worker = CPUs × WORKER_JE_CPU
+    python -m gemeinsam.startmessung       # Kaltstart und Speicher je Worker, mit und ohne Vorladen
+
+Der Hauptprozess lädt die schweren Pakete (VORLADEN_MODULE des Service) und mit preload_app die App,
+when_ready() nimmt danach alles aus der Garbage Collection (gc.freeze), und erst dann forkt gunicorn
+die Worker. Die Worker teilen sich die importierten Module per Copy-on-Write, statt sie jeder für sich
+zu laden. Jeder Worker ist mehrfädig (gthread). Neustart abgestürzter Worker, Signale und das Auslaufen
+laufender Anfragen (graceful_timeout = STOPP_FRIST_S) übernimmt gunicorn.
+
+Einstellungen über die Umgebung: WORKER (feste Anzahl), WORKER_JE_CPU (Standard 1), THREADS (je Worker,
+Standard 8), HOST, PORT, VORLADEN=0 (jeder Worker importiert selbst, nur zum Vergleich), STOPP_FRIST_S,
+METRIK_VERZEICHNIS (Stand je Worker für /metrics, Standard: ein temporäres Verzeichnis). /metrics fasst
+alle Worker zusammen (messung.teile_ueber). Getrennt je Worker bleiben der Job-Prozesspool (JOB_WORKER
+Prozesse je Worker) und die noch nicht geschriebenen Ergebnisse in ablage.py; ein Download, der bei
+einem anderen Worker landet, wartet bis zu ABLAGE_WARTEN_S Sekunden auf die Datei.
+
+gunicorn braucht os.fork (Linux/macOS); unter Windows bleibt python app.py.
+"""
+import gc
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from . import messung
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+# Feste Anzahl Worker (WORKER) oder je CPU (WORKER_JE_CPU); jeder Worker hat zusätzlich THREADS Threads
+WORKER = int(os.environ.get("WORKER", "0"))
+WORKER_JE_CPU = float(os.environ.get("WORKER_JE_CPU", "1"))
+THREADS = int(os.environ.get("THREADS", "8"))
+# VORLADEN=0: Worker importieren die App erst nach dem fork (Vergleichswert für die Startmessung)
+VORLADEN = os.environ.get("VORLADEN", "1") != "0"
+# So lange dürfen laufende Anfragen beim Beenden noch fertig werden
+STOPP_FRIST_S = int(os.environ.get("STOPP_FRIST_S", "30"))
+METRIK_VERZEICHNIS = os.environ.get("METRIK_VERZEICHNIS", "")
+# Hierhin schreiben Hauptprozess (haupt.json) und Worker (<pid>.json) ihre Startzeiten (für startmessung.py)
+START_BERICHT = os.environ.get("START_BERICHT", "")
+
+
+def _cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # berücksichtigt CPU-Grenzen von Containern
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_anzahl() -> int:
+    return WORKER if WORKER > 0 else max(1, round(_cpus() * WORKER_JE_CPU))
+
+
+def _lade(module) -> float:
+    t0 = time.perf_counter()
+    for name in module:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    return time.perf_counter() - t0
+
+
+def _schreibe_bericht(name: str, inhalt: dict) -> None:
+    if not START_BERICHT:
+        return
+    ziel = os.path.join(START_BERICHT, name)
+    with open(ziel + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(inhalt, f)
+    os.replace(ziel + ".tmp", ziel)
+
+
+def konfiguration(standard_port: int, vorladen_module=()) -> dict:
+    """Einstellungen und Hooks für die gunicorn.conf.py eines Service.
+
+    Läuft im Hauptprozess, bevor gunicorn die App lädt: importiert die Vorlade-Module und richtet das
+    gemeinsame Metrik-Verzeichnis ein.
+    """
+    port = int(os.environ.get("PORT", str(standard_port)))
+    phasen = {}
+    if VORLADEN:
+        phasen["vorladen"] = _lade(vorladen_module)
+    t_app = time.perf_counter()
+
+    verzeichnis = METRIK_VERZEICHNIS or tempfile.mkdtemp(prefix="metriken_")
+    messung.teile_ueber(verzeichnis)
+    if worker_anzahl() > 1:
+        os.environ.setdefault("ABLAGE_WARTEN_S", "5")
+
+    def when_ready(server):
+        # Die App ist geladen (preload_app), die Worker sind noch nicht geforkt
+        if VORLADEN:
+            phasen["app"] = time.perf_counter() - t_app
+        for phase, dauer in phasen.items():
+            messung.setze(messung.START, phase, dauer)
+        # Alles bisher Angelegte aus der Garbage Collection nehmen: sonst schreibt sie beim ersten
+        # Durchlauf in jedes Objekt und hebt das Teilen der Seiten auf
+        gc.collect()
+        gc.freeze()
+        server.log.info("Vorgeladen: %s", ", ".join(f"{p} {d:.2f} s" for p, d in phasen.items()) or "nichts")
+        _schreibe_bericht("haupt.json", {"pid": os.getpid(), "phasen": phasen})
+
+    def pre_fork(server, worker):
+        worker.t_fork = time.perf_counter()
+
+    def post_fork(server, worker):
+        if not VORLADEN:
+            _lade(vorladen_module)
+
+    def post_worker_init(worker):
+        dauer = time.perf_counter() - worker.t_fork
+        messung.setze(messung.START, "worker", dauer)
+        messung.sichere_stand()
+        _schreibe_bericht(f"{os.getpid()}.json", {"pid": os.getpid(), "worker_s": dauer})
+
+    def on_exit(server):
+        if not METRIK_VERZEICHNIS:
+            shutil.rmtree(verzeichnis, ignore_errors=True)
+
+    return {
+        "bind": f"[{HOST}]:{port}" if ":" in HOST else f"{HOST}:{port}",
+        "workers": worker_anzahl(),
+        "worker_class": "gthread",
+        "threads": THREADS,
+        "preload_app": VORLADEN,
+        "graceful_timeout": STOPP_FRIST_S,
+        "when_ready": when_ready,
+        "pre_fork": pre_fork,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "on_exit": on_exit,
+    }
@@ -0,0 +1,123 @@
+"""Kaltstart und Speicher je Worker unter gunicorn, mit und ohne Vorladen (siehe server.py).
+
+Im Service-Verzeichnis aufrufen (dort liegen app.py und gunicorn.conf.py):
+
+    python -m gemeinsam.startmessung [--worker N] [--json datei]
+
+Startet den Service je Variante einmal auf einem freien Port von localhost, wartet, bis alle Worker
+bereit sind, misst die erste Anfrage (/metrics) und den Speicher (PSS, privat) von Hauptprozess und
+Workern zum selben Zeitpunkt und beendet ihn wieder. Nur Linux (PSS aus /proc).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from . import messung, server
+
+
+def _mb(wert) -> str:
+    return "-" if wert is None else f"{wert / 1024 / 1024:.0f}"
+
+
+def _freier_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _berichte(verzeichnis: str) -> tuple[dict | None, list[dict]]:
+    haupt, worker = None, []
+    for name in os.listdir(verzeichnis):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(verzeichnis, name), encoding="utf-8") as f:
+            inhalt = json.load(f)
+        if name == "haupt.json":
+            haupt = inhalt
+        else:
+            worker.append(inhalt)
+    return haupt, worker
+
+
+def _starte_und_miss(worker: int, vorladen: bool, frist_s: float = 180.0) -> dict:
+    with tempfile.TemporaryDirectory(prefix="startmessung_") as tmp:
+        berichte = os.path.join(tmp, "start")
+        os.mkdir(berichte)
+        port = _freier_port()
+        umgebung = {**os.environ, "HOST": "127.0.0.1", "PORT": str(port), "WORKER": str(worker),
+                    "VORLADEN": "1" if vorladen else "0", "START_BERICHT": berichte,
+                    "METRIK_VERZEICHNIS": os.path.join(tmp, "metriken")}
+        with open(os.path.join(tmp, "server.log"), "w+", encoding="utf-8") as log:
+            t0 = time.perf_counter()
+            prozess = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app"], env=umgebung,
+                                       stdout=log, stderr=subprocess.STDOUT)
+            try:
+                while True:
+                    haupt, meldungen = _berichte(berichte)
+                    if haupt and len(meldungen) >= worker:
+                        break
+                    if prozess.poll() is not None or time.perf_counter() - t0 > frist_s:
+                        log.seek(0)
+                        raise RuntimeError(f"Server startet nicht:\n{log.read()[-2000:]}")
+                    time.sleep(0.01)
+                kaltstart = time.perf_counter() - t0
+                # Speicher aller Prozesse zum selben Zeitpunkt: PSS hängt davon ab, wie viele Prozesse Seiten teilen
+                haupt["speicher"] = messung.speicher(haupt["pid"])
+                for meldung in meldungen:
+                    meldung["speicher"] = messung.speicher(meldung["pid"])
+                t1 = time.perf_counter()
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=60) as antwort:
+                    antwort.read()
+                erste_anfrage = time.perf_counter() - t1
+            finally:
+                prozess.terminate()
+                try:
+                    prozess.wait(server.STOPP_FRIST_S + 10)
+                except subprocess.TimeoutExpired:
+                    prozess.kill()
+    pss = [m["speicher"]["pss"] for m in meldungen if m["speicher"]]
+    privat = [m["speicher"]["privat"] for m in meldungen if m["speicher"]]
+    return {
+        "vorladen": vorladen,
+        "worker": worker,
+        "kaltstart_s": kaltstart,
+        "import_s": sum(haupt["phasen"].values()) or max(m["worker_s"] for m in meldungen),
+        "erste_anfrage_s": erste_anfrage,
+        "pss_gesamt": sum(pss) + haupt["speicher"]["pss"] if haupt["speicher"] and pss else None,
+        "privat_je_worker": sum(privat) / len(privat) if privat else None,
+        "bericht": {"hauptprozess": haupt, "worker_meldungen": meldungen},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Kaltstart und Speicher je Worker, mit und ohne Vorladen")
+    parser.add_argument("--worker", type=int, default=max(2, server.worker_anzahl()),
+                        help="Worker (Standard: %(default)s)")
+    parser.add_argument("--json", help="Ergebnis zusätzlich als JSON in diese Datei schreiben")
+    args = parser.parse_args(argv)
+    if not os.path.exists("gunicorn.conf.py"):
+        parser.error("im Service-Verzeichnis aufrufen (gunicorn.conf.py fehlt)")
+
+    print(f"{'Variante':<14} {'Worker':>6} {'Kaltstart [s]':>13} {'Import [s]':>10} {'1. Anfrage [s]':>14} "
+          f"{'PSS gesamt [MB]':>15} {'privat/Worker [MB]':>18}")
+    ergebnisse = []
+    for vorladen in (True, False):
+        e = _starte_und_miss(args.worker, vorladen)
+        ergebnisse.append(e)
+        print(f"{'mit Vorladen' if vorladen else 'ohne Vorladen':<14} {e['worker']:>6} {e['kaltstart_s']:>13.2f} "
+              f"{e['import_s']:>10.2f} {e['erste_anfrage_s']:>14.3f} {_mb(e['pss_gesamt']):>15} "
+              f"{_mb(e['privat_je_worker']):>18}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cpus": server._cpus(), "ergebnisse": ergebnisse}, f, ensure_ascii=False, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""Telematik-Export aus ag-grid aufbereiten (gemeinsam für oguz_telematik und die Telematik-Route von oflaz_mieten).
+
+process_excel() lädt nur das aktive Blatt (bzw. mit patchen=False die ganze Mappe), legt das Blatt touren neu
+an, formatiert das Hauptblatt, zählt Adressen und Touren (Blatt kennzahlen) und übernimmt in einem Durchlauf
+über die Datenzeilen Details aus M–V, Menüanzahl und Clipboard-Zeilen. Die Optionen liest jeder Service selbst
+aus seiner Umgebung (KOMMENTAR_MODUS, KENNZAHLEN_FORMELN, XLSX_PATCHEN).
+"""
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from io import BytesIO
+
+import openpyxl
+from openpyxl.comments import Comment
+from openpyxl.styles import PatternFill
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils import get_column_letter
+
+from . import messung, xlsx_schreiben
+from .xlsx_lesen import lies_zeilen
+
+KENNZAHLEN_BLATT = "kennzahlen"
+DETAILS_BLATT = "details"
+
+
+def _frisches_blatt(workbook, name):
+    # Neues Blatt an derselben Stelle statt delete_rows auf dem alten (das verschiebt jede Zelle einzeln)
+    index = None
+    if name in workbook.sheetnames:
+        index = workbook.sheetnames.index(name)
+        workbook.remove(workbook[name])
+    return workbook.create_sheet(name, index)
+
+
+def zaehle_touren(zeilen):
+    """Tour → Anzahl der Zeilen mit Kunde, sortiert nach Tour.
+
+    zeilen: Werte A–H je Datenzeile (z. B. aus iter_rows(values_only=True)). Jede Tour aus Spalte A
+    erscheint, auch ohne Kunde in Spalte H (dann mit 0).
+    """
+    tour_customer_count = Counter()
+    for werte in zeilen:
+        tour = werte[0]
+        if tour:
+            tour_customer_count[tour] += 1 if werte[7] else 0
+    return {tour: tour_customer_count[tour] for tour in sorted(tour_customer_count)}
+
+
+def process_tours_table(workbook):
+    # Bei teilweise geladener Mappe zählen die Blätter der Originaldatei
+    original = xlsx_schreiben.original(workbook)
+    blaetter = workbook.sheetnames if original is None else xlsx_schreiben.blatt_uebersicht(original)[0]
+    if "ag-grid" not in blaetter:
+        if "touren" not in blaetter:
+            workbook.create_sheet("touren")
+        return
+
+    if "ag-grid" in workbook.sheetnames:
+        zeilen = werte_zeilen(workbook["ag-grid"], 2, 8)
+    else:
+        zeilen = lies_zeilen(original, range(1, 9), blatt="ag-grid", min_zeile=2)
+    tour_counts = zaehle_touren(werte for _, werte in zeilen)
+
+    tours_sheet = _frisches_blatt(workbook, "touren")
+
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    tours_sheet.append(["Tour", f"TG ({current_date})"])
+    for tour, count in tour_counts.items():
+        tours_sheet.append([tour, count])
+
+
+def kennzahlen(zeilen, filter_codes):
+    """Eindeutige Adressen (Spalte H) und Touren (Spalte A).
+
+    zeilen: Werte ab Spalte A je Datenzeile. Liefert (Bereich, Adressen, Touren) für die ganze Datei,
+    für die Filterauswahl insgesamt und für jeden Filtercode einzeln.
+    """
+    alle_adressen = set()
+    adressen_je_tour = defaultdict(set)
+    for werte in zeilen:
+        tour, adresse = werte[0], werte[7]
+        adresse = None if adresse in (None, "") else str(adresse)
+        if adresse is not None:
+            alle_adressen.add(adresse)
+        if tour not in (None, ""):
+            je_tour = adressen_je_tour[str(tour)]
+            if adresse is not None:
+                je_tour.add(adresse)
+
+    codes = [str(code) for code in filter_codes]
+    auswahl = set().union(*(adressen_je_tour.get(code, ()) for code in codes))
+    ergebnis = [
+        ("Gesamt", len(alle_adressen), len(adressen_je_tour)),
+        ("Filterauswahl", len(auswahl), len({code for code in codes if code in adressen_je_tour})),
+    ]
+    for code in codes:
+        ergebnis.append((code, len(adressen_je_tour.get(code, ())), int(code in adressen_je_tour)))
+    return ergebnis
+
+
+def schreibe_kennzahlen(workbook, kpi):
+    kpi_sheet = _frisches_blatt(workbook, KENNZAHLEN_BLATT)
+    kpi_sheet.append(["Bereich", "Adressen", "Touren"])
+    for zeile in kpi:
+        kpi_sheet.append(list(zeile))
+    kpi_sheet.column_dimensions["A"].width = 14
+
+
+def schreibe_details(workbook, details):
+    # Nachschlageblatt statt Notizen: Zeilennummer im Hauptblatt → Text aus M–V
+    details_sheet = _frisches_blatt(workbook, DETAILS_BLATT)
+    details_sheet.append(["Zeile", "Details"])
+    for row_num, text in details:
+        details_sheet.append([row_num, text])
+    details_sheet.column_dimensions["B"].width = 60
+    details_sheet.sheet_state = "hidden"
+
+
+def _kennzahl_formeln(sheet, max_row, col_af_idx, col_ah_idx):
+    """Formeln für AF1/AH1, die dem Autofilter folgen (KENNZAHLEN_FORMELN=1).
+
+    Nicht volatil: je Zeile SUBTOTAL(3, …) in versteckten Hilfsspalten (1 = gefüllt und nicht weggefiltert),
+    eindeutige Werte dann über COUNTIFS; die Bereiche reichen genau bis zur letzten Datenzeile. Das Kriterium
+    beginnt mit "=" und maskiert ~, * und ?, damit Operatoren und Platzhalter im Text wörtlich zählen.
+    Abweichend von kennzahlen() ignoriert COUNTIFS Groß-/Kleinschreibung (und scheitert an Texten über 255
+    Zeichen); die Formel wächst quadratisch mit der Zeilenzahl und rechnet bei jeder Filteränderung neu.
+    """
+    last_row = max(max_row, 2)
+    for ziel_idx, quelle, hilfs_idx in ((col_af_idx, "H", 35), (col_ah_idx, "A", 36)):
+        hilfs = get_column_letter(hilfs_idx)
+        for row_num in range(2, last_row + 1):
+            sheet.cell(row_num, hilfs_idx).value = f"=SUBTOTAL(3,{quelle}{row_num})"
+        sheet.column_dimensions[hilfs].hidden = True
+        werte = f"{quelle}2:{quelle}{last_row}"
+        sichtbar = f"{hilfs}2:{hilfs}{last_row}"
+        kriterium = f'"="&SUBSTITUTE(SUBSTITUTE(SUBSTITUTE({werte},"~","~~"),"*","~*"),"?","~?")'
+        sheet.cell(1, ziel_idx).value = (
+            f'=ROUND(SUMPRODUCT({sichtbar}/(COUNTIFS({werte},{kriterium},{sichtbar},1)+({sichtbar}=0))),0)'
+        )
+
+
+# Menüzeile "N 4 …" am Zeilenanfang zählt N Menüs (N = 1..6)
+_MENUE_ZEILE = re.compile(r"([1-6]) 4")
+# Kommentarquellen M–V
+_KOMMENTAR_SPALTEN = [get_column_letter(i) for i in range(13, 23)]
+
+
+def menue_anzahl(text):
+    if not text or not isinstance(text, str):
+        return None
+    count = 0
+    for line in text.splitlines():
+        treffer = _MENUE_ZEILE.match(line.strip())
+        if treffer:
+            count += int(treffer.group(1))
+    return count if count > 0 else None
+
+
+# _setze_fill und werte_zeilen nutzen openpyxl-Interna (cell._style, sheet._cells, workbook._fills); openpyxl ist
+# dafür auf 3.1.x begrenzt (pyproject.toml), oguz_telematik/tests/test_telematik.py vergleicht mit der Fassung ohne sie
+def _setze_fill(cell, fill_id):
+    # Stilindex direkt setzen; cell.fill = … hasht das Fill-Objekt für jede Zelle neu
+    if not cell.has_style:
+        cell._style = StyleArray()
+    cell._style.fillId = fill_id
+
+
+def werte_zeilen(sheet, min_row, max_col):
+    """Zeilenwerte wie sheet.iter_rows(min_row=..., max_col=..., values_only=True).
+
+    iter_rows legt im normalen (nicht read-only) Modus jede leere Zelle an; hier werden nur die
+    vorhandenen Zellen einmal gelesen.
+    """
+    zeilen = {}
+    for (row, col), cell in sheet._cells.items():
+        if row >= min_row and col <= max_col:
+            werte = zeilen.get(row)
+            if werte is None:
+                werte = zeilen[row] = [None] * max_col
+            werte[col - 1] = cell.value
+    leer = (None,) * max_col
+    for row in range(min_row, sheet.max_row + 1):
+        yield row, zeilen.get(row, leer)
+
+
+def telematik_zeilen(zeilen):
+    """Ein Durchlauf über die Datenzeilen (Zeilennummer, Werte A–V).
+
+    Liefert je Zeile: Zeilennummer, Kommentartext aus M–V, Menüanzahl aus L und die
+    Clipboard-Zeile aus A–K (None, wenn F nicht 1 oder 2 ist).
+    """
+    for row_num, werte in zeilen:
+        comment_text = "".join(
+            f"{buchstabe}{row_num}: {wert}\n" for buchstabe, wert in zip(_KOMMENTAR_SPALTEN, werte[12:22]) if wert is not None
+        ).strip()
+        clipboard_line = None
+        if werte[5] in (1, 2):  # Spalte F
+            row_data = ["" if wert is None else str(wert) for wert in werte[:10]]
+            wert_k = werte[10]  # K
+            row_data.append("LHK" if wert_k and "LHK" in str(wert_k) else "MS")
+            clipboard_line = "\t".join(row_data)
+        yield row_num, comment_text, menue_anzahl(werte[11]), clipboard_line
+
+
+def process_excel(quelle, kommentar_modus="kommentar", kennzahlen_formeln=False, patchen=True):
+    """quelle: Pfad oder Datei-Objekt (Upload im Speicher). Gibt (Workbook, Clipboard-Preview) zurück.
+
+    kommentar_modus: Details aus M–V als "kommentar" (Notiz an L), "blatt" (verstecktes Blatt details) oder
+    "spalte" (Text in AK). kennzahlen_formeln: Formeln statt Werte in AF1/AH1. patchen: nur das aktive Blatt
+    laden (xlsx_schreiben.lade_teilweise), sonst die ganze Mappe.
+    """
+    uhr = messung.Stoppuhr()
+    workbook = xlsx_schreiben.lade_teilweise(quelle) if patchen else openpyxl.load_workbook(quelle)
+    uhr.runde("laden")
+
+    # touren wird neu angelegt; ist es selbst das aktive Blatt, gilt das neue
+    process_tours_table(workbook)
+    uhr.runde("touren")
+    sheet = workbook.active
+    max_row = sheet.max_row
+
+    blue_fill = PatternFill(start_color="87CEFA", end_color="87CEFA", fill_type="solid")
+    green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
+    light_gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+
+    col_ac_idx = 29
+    col_ad_idx = 30
+    col_ae_idx = 31
+    col_af_idx = 32
+    col_ag_idx = 33
+    col_ah_idx = 34
+
+    sheet.cell(1, col_ac_idx).fill = blue_fill
+    sheet.cell(1, col_ad_idx).fill = blue_fill
+
+    sheet.cell(1, col_ae_idx).fill = green_fill
+    sheet.cell(1, col_af_idx).fill = green_fill
+
+    sheet.cell(1, col_ag_idx).fill = light_gray_fill
+    sheet.cell(1, col_ah_idx).fill = light_gray_fill
+
+    values_to_filter = ["D009", "D090", "D091", "D092", "D093", "D094", "D096", "D095", "D208", "D251", "D270", "D271", "D291", "D292", "SCD12", "SCD13"]
+    try:
+        sheet.auto_filter.add_filter_column(0, values_to_filter)
+        new_filter_last_col_letter = get_column_letter(28)
+        filter_range = f"A1:{new_filter_last_col_letter}{max_row}"
+        sheet.auto_filter.ref = filter_range
+    except Exception:
+        pass
+
+    subtotal_source_col_letter = get_column_letter(col_ac_idx)
+    current_max_row = max_row if max_row >= 2 else 2
+    subtotal_range_end_row = max(current_max_row, 2000)
+    sheet.cell(1, col_ad_idx).value = f'=SUBTOTAL(9,{subtotal_source_col_letter}2:{subtotal_source_col_letter}{subtotal_range_end_row})'
+
+    sheet.column_dimensions['A'].width = 6.5
+    sheet.column_dimensions['B'].width = 25
+    sheet.column_dimensions['C'].width = 20
+    sheet.column_dimensions['D'].width = 6
+    sheet.column_dimensions['E'].width = 10
+    sheet.column_dimensions['F'].width = 8
+    sheet.column_dimensions['G'].width = 15
+    sheet.column_dimensions['H'].width = 15
+
+    col_i_idx = 9
+    col_j_idx = 10
+    sheet.cell(row=1, column=col_i_idx).value = "Ablage"
+    sheet.column_dimensions[get_column_letter(col_i_idx)].width = 8
+    sheet.cell(row=1, column=col_j_idx).value = "Schlüssel"
+    sheet.column_dimensions[get_column_letter(col_j_idx)].width = 8
+
+    col_k_idx = 11
+    col_l_idx = 12
+    sheet.column_dimensions[get_column_letter(col_k_idx)].width = 15
+    sheet.column_dimensions[get_column_letter(col_l_idx)].width = 10
+
+    for col_idx_hide in range(13, 29):
+        sheet.column_dimensions[get_column_letter(col_idx_hide)].hidden = True
+
+    sheet.cell(1, 7).number_format = '0'
+    sheet.cell(1, 29).value = "Menü"
+
+    col_details_idx = 37
+    if kommentar_modus == "spalte":
+        sheet.cell(1, col_details_idx).value = "Details"
+        sheet.column_dimensions[get_column_letter(col_details_idx)].width = 40
+    uhr.runde("formatierung")
+
+    # Adressen/Touren in Python gezählt (ganze Datei und je Filtercode → Blatt kennzahlen)
+    zeilen = list(werte_zeilen(sheet, 2, 22))
+    kpi = kennzahlen((werte for _, werte in zeilen), values_to_filter)
+    schreibe_kennzahlen(workbook, kpi)
+
+    sheet.cell(1, col_ae_idx).value = 'Adressen'
+    sheet.cell(1, col_ag_idx).value = 'Touren'
+    if kennzahlen_formeln:
+        _kennzahl_formeln(sheet, max_row, col_af_idx, col_ah_idx)
+    else:
+        _, adressen, touren = kpi[0]
+        sheet.cell(1, col_af_idx).value = adressen
+        sheet.cell(1, col_ah_idx).value = touren
+    uhr.runde("kennzahlen")
+    messung.zaehle_zeilen("telematik", len(zeilen))
+
+    # Ein Durchlauf über die Datenzeilen: Details aus M–V, Menüanzahl in AC, G als Ganzzahl, Clipboard-Zeile
+    clipboard_data_lines = []
+    details = []
+    blue_fill_id = workbook._fills.add(blue_fill)
+    for row_num, comment_text, count, clipboard_line in telematik_zeilen(zeilen):
+        if comment_text:
+            if kommentar_modus == "blatt":
+                details.append((row_num, comment_text))
+            elif kommentar_modus == "spalte":
+                sheet.cell(row_num, col_details_idx).value = comment_text
+            else:
+                comment = Comment(comment_text, "System")
+                comment.width = 200
+                comment.height = 400
+                sheet.cell(row_num, col_l_idx).comment = comment
+        sheet.cell(row_num, 7).number_format = '0'
+        menu_cell = sheet.cell(row_num, col_ac_idx)
+        _setze_fill(menu_cell, blue_fill_id)
+        menu_cell.value = count
+        if clipboard_line is not None:
+            clipboard_data_lines.append(clipboard_line)
+
+    if kommentar_modus == "blatt":
+        schreibe_details(workbook, details)
+    # Notizen, Details und Menüanzahl entstehen im selben Durchlauf über die Zeilen
+    uhr.runde("kommentare_menues")
+
+    return workbook, "\n".join(clipboard_data_lines)
+
+
+def ergebnis_dateiname():
+    return f"{datetime.now().strftime('%Y%m%d')}.xlsx"
+
+
+def als_bytes(workbook) -> bytes:
+    puffer = BytesIO()
+    with messung.messe("speichern"):
+        xlsx_schreiben.speichere(workbook, puffer)
+    return puffer.getvalue()
+
@@ -0,0 +1,281 @@
+"""Schlanker XLSX-Leser für reine Zellwerte.
+
+Liest Blatt-XML und sharedStrings per iterparse direkt aus dem Zip, ohne openpyxl-Workbook. Zeilen
+kommen einzeln und nur die angefragten Spalten werden ausgewertet; im Speicher bleiben neben der
+laufenden Zeile nur die sharedStrings-Tabelle und die Datumsformate. Die Werte entsprechen dem, was
+openpyxl mit data_only=True liefert (int/float, datetime bei Datumsformat, bool, Text). Anders als dort
+werden in Texten die Maskierungen _xHHHH_ (Steuerzeichen, _x005F_ für einen wörtlichen Unterstrich)
+aufgelöst.
+"""
+import posixpath
+import re
+import zipfile
+from io import BytesIO
+from xml.etree.ElementTree import iterparse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+from openpyxl.utils.escape import unescape
+
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PAKET = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_ZEILE, _ZELLE, _WERT, _INLINE = f"{_MAIN}row", f"{_MAIN}c", f"{_MAIN}v", f"{_MAIN}is"
+_TEXT, _LAUF, _SI, _DATEN = f"{_MAIN}t", f"{_MAIN}r", f"{_MAIN}si", f"{_MAIN}sheetData"
+_ZIFFERN = "0123456789"
+# Wurzel des Blatt-XML, um ein Namensraum-Präfix (<x:worksheet>, <x:row>) zu erkennen
+_WURZEL = re.compile(rb"<([A-Za-z_][\w.-]*:)?worksheet[\s>]")
+
+_spalten_nr: dict[str, int] = {}
+
+
+def _spalte(ref: str) -> int:
+    buchstaben = ref.rstrip(_ZIFFERN)
+    nr = _spalten_nr.get(buchstaben)
+    if nr is None:
+        nr = _spalten_nr[buchstaben] = column_index_from_string(buchstaben)
+    return nr
+
+
+def _oeffne(quelle) -> zipfile.ZipFile:
+    if isinstance(quelle, (bytes, bytearray, memoryview)):
+        quelle = BytesIO(quelle)
+    elif hasattr(quelle, "seek"):
+        quelle.seek(0)
+    return zipfile.ZipFile(quelle)
+
+
+def _beziehungen(archiv: zipfile.ZipFile, teil: str) -> dict[str, tuple[str, str]]:
+    """rId → (Typ, Pfad im Zip) aus der .rels-Datei zu einem Teil."""
+    ordner, name = posixpath.split(teil)
+    try:
+        daten = archiv.read(posixpath.join(ordner, "_rels", f"{name}.rels"))
+    except KeyError:
+        return {}
+    ergebnis = {}
+    for _, el in iterparse(BytesIO(daten)):
+        if el.tag == f"{_PAKET}Relationship":
+            ziel = el.get("Target", "")
+            pfad = ziel.lstrip("/") if ziel.startswith("/") else posixpath.normpath(posixpath.join(ordner, ziel))
+            ergebnis[el.get("Id")] = (el.get("Type", ""), pfad)
+    return ergebnis
+
+
+def _mappe(archiv: zipfile.ZipFile):
+    """(Blätter als [(Name, Pfad)], Beziehungen der Mappe, 1904-Kalender?)."""
+    mappe = next((pfad for typ, pfad in _beziehungen(archiv, "").values() if typ.endswith("/officeDocument")),
+                 "xl/workbook.xml")
+    beziehungen = _beziehungen(archiv, mappe)
+    blaetter, datum_1904 = [], False
+    for _, el in iterparse(archiv.open(mappe)):
+        if el.tag == f"{_MAIN}workbookPr":
+            datum_1904 = el.get("date1904", "0").lower() in ("1", "true")
+        elif el.tag == f"{_MAIN}sheet":
+            typ, pfad = beziehungen.get(el.get(f"{_REL}id"), ("", ""))
+            if typ.endswith("/worksheet"):
+                blaetter.append((el.get("name"), pfad))
+    return blaetter, beziehungen, datum_1904
+
+
+def _text(el) -> str:
+    # Wie openpyxl: direkter <t>-Text, dann die <r>-Läufe; Lautschrift (<rPh>) bleibt außen vor
+    teile = [el.findtext(_TEXT) or ""]
+    teile += [lauf.findtext(_TEXT) or "" for lauf in el.iterfind(_LAUF)]
+    return unescape("".join(teile))
+
+
+def _geteilte_texte(archiv: zipfile.ZipFile, pfad: str | None):
+    """sharedStrings als (Liste, nachladen): nachladen(i) liest die Tabelle bis Eintrag i ein.
+
+    Wer nur die ersten Zeilen braucht (z. B. die Überschrift), liest so nur den Anfang der Tabelle.
+    """
+    texte = []
+    if not pfad or pfad not in archiv.NameToInfo:
+        return texte, lambda i: None
+    eintraege = iterparse(archiv.open(pfad))
+
+    def nachladen(i: int) -> None:
+        for _, el in eintraege:
+            if el.tag == _SI:
+                texte.append(_text(el))
+                el.clear()
+                if len(texte) > i:
+                    return
+    return texte, nachladen
+
+
+def _datum_stile(archiv: zipfile.ZipFile, pfad: str | None) -> dict[int, bool]:
+    """Stil-Index → True bei Zeitdauer-, False bei Datumsformat (nur Stile mit einem von beiden)."""
+    if not pfad or pfad not in archiv.NameToInfo:
+        return {}
+    eigene, xfs, in_cell_xfs = {}, [], False
+    for ereignis, el in iterparse(archiv.open(pfad), events=("start", "end")):
+        if el.tag == f"{_MAIN}cellXfs":
+            in_cell_xfs = ereignis == "start"
+        elif ereignis == "end" and el.tag == f"{_MAIN}numFmt":
+            eigene[int(el.get("numFmtId"))] = el.get("formatCode")
+        elif ereignis == "end" and in_cell_xfs and el.tag == f"{_MAIN}xf":
+            xfs.append(int(el.get("numFmtId", 0)))
+    stile = {}
+    for idx, fmt_id in enumerate(xfs):
+        fmt = eigene.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+        if is_date_format(fmt):
+            stile[idx] = is_timedelta_format(fmt)
+    return stile
+
+
+def blatt_namen(quelle) -> list[str]:
+    with _oeffne(quelle) as archiv:
+        return [name for name, _ in _mappe(archiv)[0]]
+
+
+def _blatt_pfad(blaetter, blatt) -> str | None:
+    if blatt is None:
+        return blaetter[0][1] if blaetter else None
+    pfad = dict(blaetter).get(blatt)
+    if pfad is None:
+        raise KeyError(f"Blatt {blatt!r} nicht gefunden")
+    return pfad
+
+
+def zeilen_anzahl(quelle, blatt=None, grenze: int | None = None) -> int:
+    """Anzahl der Zeilen-Elemente eines Blatts, ohne das XML zu parsen (Größenprüfung vor dem Einlesen).
+
+    Zählt die <row>-Tags im entpackten Blatt-XML; die Angabe <dimension> im Kopf ist dafür zu
+    unzuverlässig (fehlt bei manchen Exporten). Mit grenze endet die Suche, sobald sie überschritten ist.
+    """
+    with _oeffne(quelle) as archiv:
+        pfad = _blatt_pfad(_mappe(archiv)[0], blatt)
+        if pfad is None:
+            return 0
+        anzahl, rest, tags = 0, b"", None
+        with archiv.open(pfad) as xml:
+            for stueck in iter(lambda: xml.read(1 << 20), b""):
+                puffer = rest + stueck
+                if tags is None:
+                    wurzel = _WURZEL.search(puffer)
+                    tag = b"<" + (wurzel.group(1) or b"" if wurzel else b"") + b"row"
+                    tags = (tag + b" ", tag + b">", tag + b"/")
+                # Ab dem letzten "<" kann ein Tag angeschnitten sein; der Teil zählt im nächsten Stück
+                schnitt = puffer.rfind(b"<")
+                if schnitt < 0:
+                    schnitt = len(puffer)
+                anzahl += sum(puffer.count(t, 0, schnitt) for t in tags)
+                rest = puffer[schnitt:]
+                if grenze is not None and anzahl > grenze:
+                    return anzahl
+        return anzahl + sum(rest.count(t) for t in tags or ())
+
+
+def wie_read_excel(wert):
+    """Zellwert aus lies_zeilen() so, wie pd.read_excel ihn an seinen Parser gibt: leer als "", ganzzahlige Floats
+    als int."""
+    if wert is None:
+        return ""
+    if isinstance(wert, float) and wert.is_integer():
+        return int(wert)
+    return wert
+
+
+# Texte, die pd.read_excel als fehlend liest (Standard von na_values); mit dtype=str werden sie zu ""
+NA_WERTE = frozenset({"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>",
+                      "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"})
+
+
+def lies_zeilen(quelle, spalten=None, blatt=None, min_zeile: int = 1):
+    """Liefert (Zeilennummer, Werte) für jede Zeile mit mindestens einem Wert in den angefragten Spalten.
+
+    quelle: Pfad, Bytes oder Datei-Objekt einer .xlsx. spalten: Spaltennummern (1 = A) oder -buchstaben;
+    die Werte kommen in dieser Reihenfolge, leere Zellen als None. Ohne spalten kommt die ganze Zeile ab
+    Spalte A. blatt: Blattname, sonst das erste Arbeitsblatt (wie pd.read_excel). Fehlerwerte (#NV,
+    #DIV/0! …) zählen als leer.
+    """
+    with _oeffne(quelle) as archiv:
+        blaetter, beziehungen, datum_1904 = _mappe(archiv)
+        pfad = _blatt_pfad(blaetter, blatt)
+        if pfad is None:
+            return
+        teile = {typ.rsplit("/", 1)[-1]: p for typ, p in beziehungen.values()}
+        texte, texte_nachladen = _geteilte_texte(archiv, teile.get("sharedStrings"))
+        datum_stile = _datum_stile(archiv, teile.get("styles"))
+        epoche = MAC_EPOCH if datum_1904 else WINDOWS_EPOCH
+
+        position = None
+        if spalten is not None:
+            position = {s if isinstance(s, int) else column_index_from_string(s): i for i, s in enumerate(spalten)}
+
+        def wert(zelle):
+            typ = zelle.get("t")
+            if typ == "inlineStr":
+                el = zelle.find(_INLINE)
+                return None if el is None else _text(el)
+            roh = zelle.findtext(_WERT)
+            if not roh:
+                return None
+            if typ is None or typ == "n":
+                zahl = float(roh) if ("." in roh or "E" in roh or "e" in roh) else int(roh)
+                stil = zelle.get("s")
+                if stil and int(stil) in datum_stile:
+                    try:
+                        return from_excel(zahl, epoche, timedelta=datum_stile[int(stil)])
+                    except (OverflowError, ValueError):
+                        return None
+                return zahl
+            if typ == "s":
+                i = int(roh)
+                if i >= len(texte):
+                    texte_nachladen(i)
+                return texte[i]
+            if typ == "b":
+                return bool(int(roh))
+            if typ == "d":
+                return from_ISO8601(roh)
+            if typ == "e":
+                return None
+            return roh
+
+        spalten_nr_von = _spalten_nr
+        daten = None
+        zeilen_nr = 0
+        for ereignis, el in iterparse(archiv.open(pfad), events=("start", "end")):
+            if ereignis == "start":
+                if el.tag == _DATEN:
+                    daten = el
+                continue
+            if el.tag != _ZEILE:
+                continue
+            r = el.get("r")
+            zeilen_nr = int(r) if r else zeilen_nr + 1
+            if zeilen_nr >= min_zeile:
+                spalten_nr = 0
+                gefunden = {} if position is None else None
+                werte = None if position is None else [None] * len(position)
+                leer = True
+                for zelle in el:
+                    if zelle.tag != _ZELLE:
+                        continue
+                    ref = zelle.get("r")
+                    if ref:
+                        buchstaben = ref.rstrip(_ZIFFERN)
+                        spalten_nr = spalten_nr_von.get(buchstaben) or _spalte(buchstaben)
+                    else:
+                        spalten_nr += 1
+                    if werte is None:
+                        v = wert(zelle)
+                        if v is not None:
+                            gefunden[spalten_nr] = v
+                        continue
+                    i = position.get(spalten_nr)
+                    if i is not None:
+                        v = werte[i] = wert(zelle)
+                        leer = leer and v is None
+                if gefunden:
+                    yield zeilen_nr, tuple(gefunden.get(i) for i in range(1, max(gefunden) + 1))
+                elif not leer:
+                    yield zeilen_nr, tuple(werte)
+            # Abgearbeitete Zeilen sofort freigeben, damit der Baum nicht mitwächst
+            if daten is not None:
+                daten.clear()
+            else:
+                el.clear()
@@ -0,0 +1,680 @@
+"""Teilweise laden, gezielt zurückschreiben.
+
+lade_teilweise() gibt openpyxl nur die Blätter, die bearbeitet werden; der Rest der Mappe bleibt im
+Original-Zip. speichere() ersetzt danach nur die Teile, die openpyxl neu erzeugt hat: die geladenen und
+die neu angelegten Blätter samt Notizen, dazu die Ergänzungen in styles.xml und sharedStrings.xml.
+Alle übrigen Teile werden unverändert übernommen, damit bleibt in den anderen Blättern auch erhalten, was
+openpyxl nicht kennt (Diagramme, Datenschnitte, Steuerelemente). Lässt sich styles.xml nicht sicher ergänzen,
+schreibt openpyxl die ganze Mappe.
+
+Für Workbooks aus load_workbook() oder Workbook() speichert speichere() wie bisher mit openpyxl.
+"""
+import os
+import posixpath
+import re
+import shutil
+import weakref
+import zipfile
+from io import BytesIO
+from typing import NamedTuple
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr, unescape
+
+from openpyxl import load_workbook
+from openpyxl.styles.numbers import BUILTIN_FORMATS
+from openpyxl.writer.excel import ExcelWriter
+
+_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PAKET = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+_M = f"{{{_MAIN}}}"
+_R_ID = f"{{{_REL}}}id"
+_TYP_BLATT = f"{_REL}/worksheet"
+_TYP_TEXTE = f"{_REL}/sharedStrings"
+_TYP_STILE = f"{_REL}/styles"
+_TYP_RECHENKETTE = f"{_REL}/calcChain"
+_CT_TEXTE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+_CT_TABELLE = "application/vnd.openxmlformats-officedocument.spreadsheetml.table+xml"
+_XML_KOPF = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Workbook → (Originaldatei, geladene Blätter); nur solange das Workbook lebt
+_quellen = weakref.WeakKeyDictionary()
+
+
+class _Beziehung(NamedTuple):
+    id: str
+    typ: str
+    ziel: str  # Pfad im Zip, bei externen Zielen die Adresse
+    extern: bool
+
+
+class _Mappe(NamedTuple):
+    pfad: str
+    beziehungen: list[_Beziehung]
+    xml: bytes
+    blaetter: list[tuple[str, str | None, str]]  # (Name, Pfad, Sichtbarkeit) in Reihenfolge
+    aktiv: int
+
+
+def _als_bytes(quelle) -> bytes:
+    if isinstance(quelle, (bytes, bytearray)):
+        return bytes(quelle)
+    if hasattr(quelle, "read"):
+        quelle.seek(0)
+        return quelle.read()
+    with open(quelle, "rb") as f:
+        return f.read()
+
+
+def _rels_pfad(teil: str) -> str:
+    ordner, name = posixpath.split(teil)
+    return posixpath.join(ordner, "_rels", f"{name}.rels")
+
+
+def _lies_rels(archiv: zipfile.ZipFile, teil: str) -> list[_Beziehung]:
+    pfad = _rels_pfad(teil)
+    if pfad not in archiv.NameToInfo:
+        return []
+    ordner = posixpath.dirname(teil)
+    ergebnis = []
+    for el in ET.fromstring(archiv.read(pfad)):
+        ziel, extern = el.get("Target", ""), el.get("TargetMode") == "External"
+        if not extern:
+            ziel = ziel.lstrip("/") if ziel.startswith("/") else posixpath.normpath(posixpath.join(ordner, ziel))
+        ergebnis.append(_Beziehung(el.get("Id"), el.get("Type", ""), ziel, extern))
+    return ergebnis
+
+
+def _rels_xml(beziehungen) -> bytes:
+    extern = ' TargetMode="External"'
+    zeilen = [
+        f"<Relationship Id={quoteattr(b.id)} Type={quoteattr(b.typ)} "
+        f"Target={quoteattr(b.ziel if b.extern else '/' + b.ziel)}{extern if b.extern else ''}/>"
+        for b in beziehungen
+    ]
+    return f'{_XML_KOPF}<Relationships xmlns="{_PAKET}">{"".join(zeilen)}</Relationships>'.encode()
+
+
+def _erreichbar(archiv: zipfile.ZipFile, start, ausser=()) -> set[str]:
+    """Alle Teile, die von start aus über Beziehungen erreichbar sind (ohne die in ausser)."""
+    gesehen, offen = set(), list(start)
+    while offen:
+        teil = offen.pop()
+        if teil in gesehen or teil in ausser:
+            continue
+        gesehen.add(teil)
+        offen += [b.ziel for b in _lies_rels(archiv, teil) if not b.extern]
+    return gesehen
+
+
+def _mappe(archiv: zipfile.ZipFile) -> _Mappe:
+    pfad = next((b.ziel for b in _lies_rels(archiv, "") if b.typ.endswith("/officeDocument")), "xl/workbook.xml")
+    beziehungen = _lies_rels(archiv, pfad)
+    ziele = {b.id: b.ziel for b in beziehungen}
+    xml = archiv.read(pfad)
+    wurzel = ET.fromstring(xml)
+    blaetter = [(el.get("name"), ziele.get(el.get(_R_ID)), el.get("state", "visible")) for el in wurzel.iter(f"{_M}sheet")]
+    ansicht = wurzel.find(f"{_M}bookViews/{_M}workbookView")
+    aktiv = int(ansicht.get("activeTab", 0)) if ansicht is not None else 0
+    return _Mappe(pfad, beziehungen, xml, blaetter, aktiv if aktiv < len(blaetter) else 0)
+
+
+def blatt_uebersicht(quelle) -> tuple[list[str], str | None]:
+    """Namen aller Blätter und Name des aktiven Blatts, ohne die Mappe zu laden."""
+    with zipfile.ZipFile(BytesIO(_als_bytes(quelle))) as archiv:
+        mappe = _mappe(archiv)
+    namen = [name for name, _, _ in mappe.blaetter]
+    return namen, (namen[mappe.aktiv] if namen else None)
+
+
+def original(workbook) -> bytes | None:
+    """Inhalt der Originaldatei eines teilweise geladenen Workbooks, sonst None."""
+    eintrag = _quellen.get(workbook)
+    return eintrag[0] if eintrag else None
+
+
+def lade_teilweise(quelle, blaetter=None):
+    """openpyxl-Workbook, das nur die genannten Blätter enthält (ohne Angabe: das aktive Blatt).
+
+    speichere() setzt es wieder in die ganze Mappe ein.
+    """
+    daten = _als_bytes(quelle)
+    with zipfile.ZipFile(BytesIO(daten)) as archiv:
+        mappe = _mappe(archiv)
+        if blaetter is None:
+            blaetter = [mappe.blaetter[mappe.aktiv][0]] if mappe.blaetter else []
+        blaetter = set(blaetter)
+        auslassen = {pfad for name, pfad, _ in mappe.blaetter if name not in blaetter}
+        auslassen |= {b.ziel for b in mappe.beziehungen if b.typ == _TYP_RECHENKETTE}
+        teile = _erreichbar(archiv, [""], auslassen)
+
+        # workbook.xml nur mit den geladenen Blättern; definierte Namen fallen weg, weil ihre localSheetId
+        # sonst auf andere Blätter zeigt (sie bleiben in der Originaldatei und damit im Ergebnis erhalten)
+        wurzel = ET.fromstring(mappe.xml)
+        liste = wurzel.find(f"{_M}sheets")
+        for el in list(liste):
+            if el.get("name") not in blaetter:
+                liste.remove(el)
+        namen = wurzel.find(f"{_M}definedNames")
+        if namen is not None:
+            wurzel.remove(namen)
+        geladen = [el.get("name") for el in liste]
+        ansicht = wurzel.find(f"{_M}bookViews/{_M}workbookView")
+        if ansicht is not None:
+            aktiv = mappe.blaetter[mappe.aktiv][0] if mappe.blaetter else None
+            ansicht.set("activeTab", str(geladen.index(aktiv) if aktiv in geladen else 0))
+            ansicht.attrib.pop("firstSheet", None)
+
+        puffer = BytesIO()
+        with zipfile.ZipFile(puffer, "w") as teilmappe:
+            for info in archiv.infolist():
+                name = info.filename
+                if name == mappe.pfad:
+                    teilmappe.writestr(name, ET.tostring(wurzel))
+                elif name == "[Content_Types].xml" or name in teile or (
+                        name.endswith(".rels") and _teil_von_rels(name) in teile):
+                    _kopiere(archiv, teilmappe, info)
+    workbook = load_workbook(puffer)
+    _quellen[workbook] = (daten, geladen)
+    return workbook
+
+
+def _teil_von_rels(pfad: str) -> str:
+    ordner, name = posixpath.split(pfad)
+    return posixpath.join(posixpath.dirname(ordner), name[:-len(".rels")])
+
+
+def speichere(workbook, ziel) -> None:
+    """Wie workbook.save(ziel); teilweise geladene Workbooks werden in die Originaldatei eingesetzt."""
+    eintrag = _quellen.get(workbook)
+    if eintrag is None:
+        workbook.save(ziel)
+        return
+    daten = _setze_ein(workbook, *eintrag)
+    if isinstance(ziel, (str, os.PathLike)):
+        with open(ziel, "wb") as f:
+            f.write(daten)
+    else:
+        ziel.write(daten)
+
+
+# --- sharedStrings -------------------------------------------------------------------------------
+
+# openpyxl schreibt Texte inline in die Zelle; einfache Texte (ohne Formatierungsläufe) werden hier wie von
+# Excel in die sharedStrings verlegt, Wiederholungen stehen dann nur einmal in der Datei
+_INLINE_TEXT = re.compile(rb'<c ([^>]*?)t="inlineStr"([^>]*)><is><t(?: xml:space="preserve")?>([^<]*)</t></is></c>')
+
+
+class _GeteilteTexte:
+    """sharedStrings der Originaldatei plus die Texte der neu geschriebenen Blätter."""
+
+    def __init__(self, xml: bytes | None):
+        self.original = xml
+        self.index: dict[bytes, int] = {}
+        self.anzahl = 0
+        if xml is not None:
+            for si in ET.fromstring(xml).iter(f"{_M}si"):
+                t = si.find(f"{_M}t")
+                if t is not None and si.find(f"{_M}r") is None:
+                    self.index.setdefault(escape(t.text or "").encode("utf-8"), self.anzahl)
+                self.anzahl += 1
+        self.dazu: list[bytes] = []
+
+    def _nummer(self, text: bytes) -> int:
+        i = self.index.get(text)
+        if i is None:
+            i = self.index[text] = self.anzahl + len(self.dazu)
+            self.dazu.append(text)
+        return i
+
+    def uebernimm(self, blatt_xml: bytes) -> bytes:
+        return _INLINE_TEXT.sub(
+            lambda m: b'<c %st="s"%s><v>%d</v></c>' % (m.group(1), m.group(2), self._nummer(m.group(3))), blatt_xml)
+
+    def xml(self) -> bytes:
+        eintraege = b"".join(
+            b'<si><t xml:space="preserve">%s</t></si>' % text if text != text.strip() or b"\n" in text
+            else b"<si><t>%s</t></si>" % text
+            for text in self.dazu)
+        gesamt = self.anzahl + len(self.dazu)
+        if self.original is None:
+            return (f'{_XML_KOPF}<sst xmlns="{_MAIN}" uniqueCount="{gesamt}">'.encode() + eintraege + b"</sst>")
+        xml = self.original.decode("utf-8")
+        m = re.search(r"<(\w+:)?sst\b[^>]*>", xml)
+        # count (Anzahl der Verweise) lässt sich ohne die übrigen Blätter nicht bestimmen und ist optional
+        kopf = _mit_zaehler(re.sub(r'\scount="\d*"', "", m.group(0)), "uniqueCount", gesamt)
+        schluss = xml.rindex(f"</{m.group(1) or ''}sst>")
+        if m.group(1):
+            eintraege = eintraege.replace(b"<si>", f"<{m.group(1)}si>".encode()).replace(
+                b"</si>", f"</{m.group(1)}si>".encode()).replace(b"<t", f"<{m.group(1)}t".encode()).replace(
+                b"</t>", f"</{m.group(1)}t>".encode())
+        return (xml[:m.start()] + kopf + xml[m.end():schluss]).encode("utf-8") + eintraege + xml[schluss:].encode("utf-8")
+
+
+def _mit_zaehler(start_tag: str, attr: str, wert: int) -> str:
+    if re.search(rf'\s{attr}="\d*"', start_tag):
+        return re.sub(rf'(\s{attr}=")\d*(")', rf"\g<1>{wert}\g<2>", start_tag, count=1)
+    ende = -2 if start_tag.endswith("/>") else -1
+    return f'{start_tag[:ende]} {attr}="{wert}"{start_tag[ende:]}'
+
+
+def _haenge_an(xml: str, tag: str, elemente: list[str]) -> str | None:
+    """Hängt Elemente an den ersten Abschnitt <tag> an und zählt count hoch; None, wenn er fehlt."""
+    m = re.search(rf"<((?:\w+:)?){tag}\b[^>]*?/?>", xml)
+    if m is None:
+        return None
+    start = m.group(0)
+    kinder = re.compile(rf"<{re.escape(m.group(1))}{tag[:-1]}\b")
+    if start.endswith("/>"):
+        ende = m.end()
+        anzahl = len(elemente)
+        neu = _mit_zaehler(start[:-2] + ">", "count", anzahl) + "".join(elemente) + f"</{m.group(1)}{tag}>"
+    else:
+        ende = xml.index(f"</{m.group(1)}{tag}>", m.end())
+        anzahl = len(kinder.findall(xml, m.end(), ende)) + len(elemente)
+        neu = _mit_zaehler(start, "count", anzahl) + xml[m.end():ende] + "".join(elemente)
+    return xml[:m.start()] + neu + xml[ende:]
+
+
+# --- styles --------------------------------------------------------------------------------------
+
+_STIL_LISTEN = ("fonts", "fills", "borders", "cellStyleXfs", "cellXfs", "dxfs")
+
+
+def _stil_kinder(xml: str, tag: str) -> list[str]:
+    m = re.search(rf"<{tag}\b[^>]*?(/?)>", xml)
+    if m is None or m.group(1):
+        return []
+    ende = xml.index(f"</{tag}>", m.end())
+    kind = tag[:-1] if tag.endswith("s") else tag
+    if tag in ("cellStyleXfs", "cellXfs"):
+        kind = "xf"
+    return re.findall(rf"<{kind}\b(?:[^>]*?/>|.*?</{kind}>)", xml[m.end():ende], re.S)
+
+
+def _formate(wurzel) -> dict[int, str]:
+    liste = wurzel.find(f"{_M}numFmts")
+    return {} if liste is None else {int(el.get("numFmtId")): el.get("formatCode") for el in liste}
+
+
+def _xf_schluessel(el, formate):
+    fmt_id = int(el.get("numFmtId", 0))
+    return (formate.get(fmt_id, BUILTIN_FORMATS.get(fmt_id, fmt_id)),
+            el.get("fontId", "0"), el.get("fillId", "0"), el.get("borderId", "0"))
+
+
+def _stile_ergaenzen(alt: bytes, neu: bytes) -> bytes | None:
+    """Originale styles.xml plus die Einträge, die openpyxl angehängt hat; None, wenn das nicht sicher geht.
+
+    openpyxl behält beim Laden die Reihenfolge aller Listen und hängt neue Formate hinten an. Passt der
+    Anfang der Listen nicht zum Original, liefert die Funktion None und speichere() schreibt alles mit openpyxl.
+    """
+    a_wurzel, n_wurzel = ET.fromstring(alt), ET.fromstring(neu)
+    a_text, n_text = alt.decode("utf-8"), neu.decode("utf-8")
+    if not re.match(r"(?:<\?xml[^>]*\?>\s*)?<styleSheet\b", a_text):
+        return None  # Präfix für den Hauptnamensraum: Einfügen ohne Präfix wäre falsch
+    a_formate, n_formate = _formate(a_wurzel), _formate(n_wurzel)
+    laengen = {}
+    for tag in _STIL_LISTEN:
+        a_el, n_el = a_wurzel.find(f"{_M}{tag}"), n_wurzel.find(f"{_M}{tag}")
+        a_n, n_n = (0 if a_el is None else len(a_el)), (0 if n_el is None else len(n_el))
+        if n_n < a_n:
+            return None
+        laengen[tag] = a_n
+    a_xfs, n_xfs = a_wurzel.find(f"{_M}cellXfs"), n_wurzel.find(f"{_M}cellXfs")
+    if [_xf_schluessel(el, a_formate) for el in a_xfs] != [_xf_schluessel(el, n_formate) for el in n_xfs[:len(a_xfs)]]:
+        return None
+
+    # Zahlenformate der neuen Zellformate auf die IDs im Original abbilden, fehlende anhängen
+    nach_code = {code: fmt_id for fmt_id, code in a_formate.items()}
+    naechste = max([163, *a_formate]) + 1
+    neue_formate, abbildung = [], {}
+    for el in n_xfs[len(a_xfs):]:
+        fmt_id = int(el.get("numFmtId", 0))
+        if fmt_id in n_formate and fmt_id not in abbildung:
+            code = n_formate[fmt_id]
+            if code not in nach_code:
+                nach_code[code] = naechste
+                neue_formate.append(f"<numFmt numFmtId=\"{naechste}\" formatCode={quoteattr(code)}/>")
+                naechste += 1
+            abbildung[fmt_id] = nach_code[code]
+
+    def xf_anpassen(xf: str) -> str:
+        xf = re.sub(r'numFmtId="(\d+)"', lambda m: f'numFmtId="{abbildung.get(int(m.group(1)), m.group(1))}"', xf, count=1)
+        m = re.search(r'xfId="(\d+)"', xf)
+        if m and int(m.group(1)) >= laengen["cellStyleXfs"]:
+            xf = xf.replace(m.group(0), 'xfId="0"', 1)
+        return xf
+
+    ergebnis = a_text
+    if neue_formate:
+        if "<numFmts" in ergebnis:
+            ergebnis = _haenge_an(ergebnis, "numFmts", neue_formate)
+        else:
+            kopf = re.search(r"<styleSheet\b[^>]*>", ergebnis)
+            ergebnis = (ergebnis[:kopf.end()] + f'<numFmts count="{len(neue_formate)}">' + "".join(neue_formate)
+                        + "</numFmts>" + ergebnis[kopf.end():])
+    for tag in ("fonts", "fills", "borders", "cellXfs", "dxfs"):
+        dazu = _stil_kinder(n_text, tag)[laengen[tag]:]
+        if not dazu:
+            continue
+        if tag == "cellXfs":
+            dazu = [xf_anpassen(xf) for xf in dazu]
+        ergebnis = _haenge_an(ergebnis, tag, dazu)
+        if ergebnis is None:
+            return None
+    return ergebnis.encode("utf-8")
+
+
+# --- workbook.xml --------------------------------------------------------------------------------
+
+_ELEMENT_NACH = ("calcPr", "oleSize", "customWorkbookViews", "pivotCaches", "smartTagPr", "smartTagTypes",
+                 "webPublishing", "fileRecoveryPr", "webPublishObjects", "extLst")
+
+
+def _vor_erstem(xml: str, p: str, tags, einschub: str) -> str:
+    positionen = [m.start() for tag in tags for m in [re.search(rf"<{p}{tag}\b", xml)] if m]
+    pos = min(positionen) if positionen else xml.rindex(f"</{p}workbook>")
+    return xml[:pos] + einschub + xml[pos:]
+
+
+def _mappe_anpassen(alt: _Mappe, neu_xml: bytes, neu_blaetter, entfernt: set[str],
+                    rel_ids: dict[str, str]) -> bytes:
+    """Originale workbook.xml mit neuer Blattliste, verschobenen localSheetIds, Filterbereichen und Neuberechnung."""
+    xml = alt.xml.decode("utf-8")
+    elemente = list(re.finditer(r"<(\w+:)?sheet\b[^>]*/>", xml))
+    p = elemente[0].group(1) or "" if elemente else ""
+    rp = re.search(r"\s(\w+):id=", elemente[0].group(0)).group(1) if elemente else "r"
+    alt_namen = [name for name, _, _ in alt.blaetter]
+    text_von = {name: m.group(0) for name, m in zip(alt_namen, elemente)}
+    sichtbarkeit = {name: zustand for name, _, zustand in neu_blaetter}
+
+    # Reihenfolge: Original ohne entfernte Blätter; neue Blätter vor das nächste bekannte Blatt, sonst ans Ende
+    reihenfolge = [name for name in alt_namen if name not in entfernt]
+    neu_namen = [name for name, _, _ in neu_blaetter]
+    for i, name in enumerate(neu_namen):
+        if name in text_von:
+            continue
+        danach = next((n for n in neu_namen[i + 1:] if n in text_von and n not in entfernt), None)
+        reihenfolge.insert(reihenfolge.index(danach) if danach else len(reihenfolge), name)
+
+    naechste_id = max([0, *(int(i) for i in re.findall(r'sheetId="(\d+)"', xml))]) + 1
+    teile = []
+    for name in reihenfolge:
+        text = text_von.get(name)
+        if text is None:
+            text = f'<{p}sheet name={quoteattr(name)} sheetId="{naechste_id}" {rp}:id="{rel_ids[name]}"/>'
+            naechste_id += 1
+        if name in sichtbarkeit:
+            text = re.sub(r'\sstate="[^"]*"', "", text)
+            if sichtbarkeit[name] != "visible":
+                text = f'{text[:-2]} state="{sichtbarkeit[name]}"/>'
+        teile.append(text)
+    anfang = re.search(rf"<{p}sheets\b[^>]*>", xml)
+    ende = xml.index(f"</{p}sheets>")
+    xml = xml[:anfang.end()] + "".join(teile) + xml[ende:]
+
+    index_neu = {i: reihenfolge.index(name) for i, name in enumerate(alt_namen) if name in reihenfolge}
+
+    def verschiebe(m):
+        i = index_neu.get(int(m.group(2)))
+        return "" if i is None else f'{m.group(1)}{i}"'
+
+    # definierte Namen mit Blattbezug umnummerieren; die von entfernten Blättern fallen weg
+    def name_anpassen(m):
+        k = re.search(r'localSheetId="(\d+)"', m.group(0))
+        if k is None:
+            return m.group(0)
+        i = index_neu.get(int(k.group(1)))
+        if i is None:
+            return ""
+        return m.group(0).replace(k.group(0), f'localSheetId="{i}"', 1)
+
+    xml = re.sub(rf"<{p}definedName\b[^>]*>.*?</{p}definedName>", name_anpassen, xml, flags=re.S)
+    xml = re.sub(r'(\sactiveTab=")(\d+)"', lambda m: verschiebe(m) or f'{m.group(1)}0"', xml, count=1)
+    xml = re.sub(r'(\sfirstSheet=")(\d+)"', lambda m: verschiebe(m) or f'{m.group(1)}0"', xml, count=1)
+
+    # Filterbereiche der neu geschriebenen Blätter aus der openpyxl-Fassung übernehmen
+    neu_wurzel = ET.fromstring(neu_xml)
+    filter_namen = []
+    for el in neu_wurzel.iter(f"{_M}definedName"):
+        if el.get("name") == "_xlnm._FilterDatabase" and el.get("localSheetId") is not None:
+            i = reihenfolge.index(neu_namen[int(el.get("localSheetId"))])
+            xml = re.sub(rf'<{p}definedName\b(?=[^>]*name="_xlnm._FilterDatabase")(?=[^>]*localSheetId="{i}")[^>]*>.*?</{p}definedName>',
+                         "", xml, flags=re.S)
+            filter_namen.append(f'<{p}definedName name="_xlnm._FilterDatabase" localSheetId="{i}" hidden="1">'
+                                f"{escape(el.text or '')}</{p}definedName>")
+    if filter_namen:
+        if re.search(rf"<{p}definedNames\b[^>]*/>", xml):
+            xml = re.sub(rf"<{p}definedNames\b[^>]*/>", f"<{p}definedNames></{p}definedNames>", xml, count=1)
+        if f"</{p}definedNames>" in xml:
+            xml = xml.replace(f"</{p}definedNames>", "".join(filter_namen) + f"</{p}definedNames>", 1)
+        else:
+            xml = _vor_erstem(xml, p, _ELEMENT_NACH, f"<{p}definedNames>{''.join(filter_namen)}</{p}definedNames>")
+
+    # Neu geschriebene Formeln haben keine gespeicherten Werte: beim Öffnen alles neu berechnen
+    m = re.search(rf"<{p}calcPr\b[^>]*?/?>", xml)
+    if m:
+        xml = xml[:m.start()] + _mit_zaehler(m.group(0), "fullCalcOnLoad", 1) + xml[m.end():]
+    else:
+        xml = _vor_erstem(xml, p, _ELEMENT_NACH[1:], f'<{p}calcPr fullCalcOnLoad="1"/>')
+    return xml.encode("utf-8")
+
+
+# --- Zip -----------------------------------------------------------------------------------------
+
+_KOPIER_BLOCK = 1 << 20
+
+def _kopiere(quelle: zipfile.ZipFile, ziel: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Eintrag unverändert übernehmen (Name, Zeitstempel, Kompression), blockweise statt ganz im Speicher."""
+    eintrag = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    eintrag.compress_type = info.compress_type
+    eintrag.external_attr = info.external_attr
+    eintrag.file_size = info.file_size  # entscheidet über ZIP64 für große Teile
+    with quelle.open(info) as lesen, ziel.open(eintrag, "w") as schreiben:
+        shutil.copyfileobj(lesen, schreiben, _KOPIER_BLOCK)
+
+
+def _inhaltstypen(archiv: zipfile.ZipFile):
+    wurzel = ET.fromstring(archiv.read("[Content_Types].xml"))
+    standard = {el.get("Extension", "").lower(): el.get("ContentType") for el in wurzel.iter(f"{{{_CT}}}Default")}
+    einzeln = {el.get("PartName", "").lstrip("/"): el.get("ContentType") for el in wurzel.iter(f"{{{_CT}}}Override")}
+    return lambda teil: einzeln.get(teil) or standard.get(posixpath.splitext(teil)[1][1:].lower())
+
+
+def _freier_name(teil: str, belegt: set[str]) -> str:
+    if teil not in belegt:
+        return teil
+    stamm, endung = posixpath.splitext(teil)
+    stamm = stamm.rstrip("0123456789")
+    n = 1
+    while f"{stamm}{n}{endung}" in belegt:
+        n += 1
+    return f"{stamm}{n}{endung}"
+
+
+_TABELLEN_ID = re.compile(rb'(<(?:\w+:)?table\b[^>]*?\sid=")(\d+)(")')
+
+
+def _tabellen_ids(archiv: zipfile.ZipFile, teile) -> set[int]:
+    ids = set()
+    for teil in teile:
+        m = _TABELLEN_ID.search(archiv.read(teil))
+        if m:
+            ids.add(int(m.group(2)))
+    return ids
+
+
+def _alle_blaetter_mit_openpyxl(workbook, daten: bytes, geladen: list[str]) -> bytes:
+    """Ausweichweg, wenn sich styles.xml nicht ergänzen lässt: die übrigen Blätter der Originaldatei in das Workbook
+    übernehmen und die ganze Mappe mit openpyxl speichern, wie bei load_workbook().
+
+    Die Stilverweise der übernommenen Zellen passen, weil beide Workbooks dieselbe styles.xml gelesen haben und
+    openpyxl neue Formate nur hinten anhängt. Danach ist das Workbook vollständig und wird nicht mehr eingesetzt.
+    """
+    voll = load_workbook(BytesIO(daten))
+    alt_namen = [blatt.title for blatt in voll._sheets]
+    aktiv = voll.active.title if voll.active is not None else None
+    for i, blatt in enumerate(list(voll._sheets)):
+        if blatt.title in geladen:
+            if blatt.title in workbook.sheetnames:
+                # Definierte Namen und Druckbereiche fehlen im teilweise geladenen Blatt
+                ziel = workbook[blatt.title]
+                for name, definition in blatt.defined_names.items():
+                    ziel.defined_names.setdefault(name, definition)
+                ziel._print_rows = ziel._print_rows or blatt._print_rows
+                ziel._print_cols = ziel._print_cols or blatt._print_cols
+                ziel._print_area = ziel._print_area or blatt._print_area
+            continue
+        danach = next((name for name in alt_namen[i + 1:] if name in workbook.sheetnames), None)
+        blatt._parent = workbook
+        workbook._sheets.insert(workbook.sheetnames.index(danach) if danach else len(workbook._sheets), blatt)
+    for name, definition in voll.defined_names.items():
+        workbook.defined_names.setdefault(name, definition)
+    if aktiv in workbook.sheetnames:
+        workbook.active = workbook.sheetnames.index(aktiv)
+    _quellen.pop(workbook, None)
+    puffer = BytesIO()
+    workbook.save(puffer)
+    return puffer.getvalue()
+
+
+def _setze_ein(workbook, daten: bytes, geladen: list[str]) -> bytes:
+    # Zwischenstand unkomprimiert: die Teile werden unten ohnehin gelesen und neu gepackt
+    puffer = BytesIO()
+    with zipfile.ZipFile(puffer, "w", zipfile.ZIP_STORED, allowZip64=True) as archiv:
+        ExcelWriter(workbook, archiv).save()
+    with zipfile.ZipFile(BytesIO(daten)) as alt, zipfile.ZipFile(puffer) as neu:
+        a, n = _mappe(alt), _mappe(neu)
+        a_pfad = {name: pfad for name, pfad, _ in a.blaetter}
+        neu_namen = [name for name, _, _ in n.blaetter]
+        entfernt = set(geladen) - set(neu_namen)
+        ersetzt = [name for name in neu_namen if name in a_pfad]
+
+        # Teile, die nur an ersetzten oder entfernten Blättern hängen, fallen weg; Rechenkette ebenso
+        wurzeln = {a_pfad[name] for name in [*ersetzt, *entfernt]}
+        rechenkette = {b.ziel for b in a.beziehungen if b.typ == _TYP_RECHENKETTE}
+        bleibt = _erreichbar(alt, [""], wurzeln | rechenkette)
+        weg = (_erreichbar(alt, wurzeln) | rechenkette) - bleibt
+        weg |= {_rels_pfad(teil) for teil in weg}
+        belegt = set(alt.namelist()) - weg
+
+        # Neue Teile: Blätter (ersetzte unter ihrem alten Pfad) und alles, was an ihnen hängt
+        umbenannt = {pfad: a_pfad[name] for name, pfad, _ in n.blaetter if name in a_pfad}
+        belegt |= set(umbenannt.values())
+        for name, pfad, _ in n.blaetter:
+            if name not in a_pfad:
+                umbenannt[pfad] = _freier_name("xl/worksheets/sheet1.xml", belegt)
+                belegt.add(umbenannt[pfad])
+        abhaengig = _erreichbar(neu, [pfad for _, pfad, _ in n.blaetter]) - set(umbenannt)
+        for teil in sorted(abhaengig):
+            umbenannt[teil] = _freier_name(teil, belegt)
+            belegt.add(umbenannt[teil])
+
+        ersetzen: dict[str, bytes] = {}
+
+        # Styles: Original plus Ergänzungen, notfalls die Fassung von openpyxl
+        a_stile = next((b.ziel for b in a.beziehungen if b.typ == _TYP_STILE), None)
+        n_stile = next((b.ziel for b in n.beziehungen if b.typ == _TYP_STILE), None)
+        if n_stile:
+            if a_stile and a_stile in alt.NameToInfo:
+                stile = _stile_ergaenzen(alt.read(a_stile), neu.read(n_stile))
+                if stile is None:
+                    # Die übernommenen Blätter verweisen auf die Stilnummern des Originals; mit der styles.xml von
+                    # openpyxl passen sie nicht mehr → alle Blätter mit openpyxl schreiben
+                    return _alle_blaetter_mit_openpyxl(workbook, daten, geladen)
+                ersetzen[a_stile] = stile
+            else:
+                a_stile = _freier_name("xl/styles.xml", belegt)
+                belegt.add(a_stile)
+                ersetzen[a_stile] = neu.read(n_stile)
+
+        # Blätter und ihre Anhänge aus der openpyxl-Fassung; deren Texte kommen in die sharedStrings
+        a_texte_pfad = next((b.ziel for b in a.beziehungen if b.typ == _TYP_TEXTE), None)
+        if a_texte_pfad not in alt.NameToInfo:
+            a_texte_pfad = None
+        texte = _GeteilteTexte(alt.read(a_texte_pfad) if a_texte_pfad else None)
+        blatt_pfade = {pfad for _, pfad, _ in n.blaetter}
+        n_typ = _inhaltstypen(neu)
+        neue_typen = {}
+
+        # openpyxl zählt die Tabellen der geschriebenen Blätter ab 1; die übernommenen behalten ihre id. Excel
+        # repariert Mappen mit doppelten ids, daher bekommen die neuen Tabellen ids über allen verbliebenen
+        a_typ = _inhaltstypen(alt)
+        tabellen_id = max([0, *_tabellen_ids(alt, [teil for teil in alt.namelist()
+                                                  if teil not in weg and a_typ(teil) == _CT_TABELLE])])
+
+        def tabelle_umnummerieren(m):
+            nonlocal tabellen_id
+            tabellen_id += 1
+            return b"%s%d%s" % (m.group(1), tabellen_id, m.group(3))
+
+        for teil, ziel in umbenannt.items():
+            inhalt = neu.read(teil)
+            if n_typ(teil) == _CT_TABELLE:
+                inhalt = _TABELLEN_ID.sub(tabelle_umnummerieren, inhalt, count=1)
+            ersetzen[ziel] = texte.uebernimm(inhalt) if teil in blatt_pfade else inhalt
+            neue_typen[ziel] = n_typ(teil)
+            beziehungen = _lies_rels(neu, teil)
+            if beziehungen:
+                ersetzen[_rels_pfad(ziel)] = _rels_xml(
+                    b if b.extern else b._replace(ziel=umbenannt.get(b.ziel, b.ziel)) for b in beziehungen)
+
+        neue_texte_rel = None
+        if texte.dazu:
+            if a_texte_pfad is None:
+                a_texte_pfad = neue_texte_rel = _freier_name("xl/sharedStrings.xml", belegt)
+                belegt.add(neue_texte_rel)
+            ersetzen[a_texte_pfad] = texte.xml()
+
+        # workbook.xml und ihre Beziehungen
+        rel_ids = {}
+        beziehungen = [b for b in a.beziehungen if b.ziel not in weg or b.ziel in ersetzen]
+        vergeben = {b.id for b in beziehungen}
+        zaehler = 1
+
+        def neue_id():
+            nonlocal zaehler
+            while f"rId{zaehler}" in vergeben:
+                zaehler += 1
+            vergeben.add(f"rId{zaehler}")
+            return f"rId{zaehler}"
+
+        for name, pfad, _ in n.blaetter:
+            if name not in a_pfad:
+                rel_ids[name] = neue_id()
+                beziehungen.append(_Beziehung(rel_ids[name], _TYP_BLATT, umbenannt[pfad], False))
+        if neue_texte_rel:
+            beziehungen.append(_Beziehung(neue_id(), _TYP_TEXTE, neue_texte_rel, False))
+            neue_typen[neue_texte_rel] = _CT_TEXTE
+        if n_stile and not any(b.typ == _TYP_STILE for b in beziehungen):
+            beziehungen.append(_Beziehung(neue_id(), _TYP_STILE, a_stile, False))
+            neue_typen[a_stile] = n_typ(n_stile)
+        if beziehungen != a.beziehungen:
+            ersetzen[_rels_pfad(a.pfad)] = _rels_xml(beziehungen)
+        ersetzen[a.pfad] = _mappe_anpassen(a, n.xml, n.blaetter, entfernt, rel_ids)
+
+        # [Content_Types].xml: Einträge entfallener Teile raus, neue Teile dazu
+        typen = alt.read("[Content_Types].xml").decode("utf-8")
+        typen = re.sub(r'<Override\b[^>]*PartName="/?([^"]*)"[^>]*/>',
+                       lambda m: "" if unescape(m.group(1)) in weg or unescape(m.group(1)) in neue_typen else m.group(0),
+                       typen)
+        eintraege = "".join(f"<Override PartName={quoteattr('/' + teil)} ContentType={quoteattr(typ)}/>"
+                            for teil, typ in neue_typen.items() if typ)
+        schluss = typen.rindex("</Types>")
+        ersetzen["[Content_Types].xml"] = (typen[:schluss] + eintraege + typen[schluss:]).encode("utf-8")
+
+        ausgabe = BytesIO()
+        with zipfile.ZipFile(ausgabe, "w", zipfile.ZIP_DEFLATED) as ziel:
+            for info in alt.infolist():
+                if info.filename in ersetzen:
+                    eintrag = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    eintrag.compress_type = zipfile.ZIP_DEFLATED
+                    eintrag.external_attr = info.external_attr
+                    ziel.writestr(eintrag, ersetzen.pop(info.filename))
+                elif info.filename not in weg:
+                    _kopiere(alt, ziel, info)
+            for name, inhalt in ersetzen.items():
+                ziel.writestr(name, inhalt)
+    return ausgabe.getvalue()
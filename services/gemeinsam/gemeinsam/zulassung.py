@@ -0,0 +1,220 @@
+"""Zulassung für die Upload-Endpunkte: begrenzte Parallelität mit Warteschlange und Größenlimits.
+
+Höchstens MAX_PARALLEL Verarbeitungen laufen gleichzeitig, bis zu MAX_WARTEND weitere warten
+höchstens MAX_WARTEZEIT_S Sekunden auf einen Platz. Wer darüber hinaus kommt, bekommt sofort 429
+mit Retry-After, statt den Speicher mit einer weiteren Verarbeitung zu füllen und alle anderen
+auszubremsen. Zu große Uploads scheitern schon an der Content-Length (413, MAX_UPLOAD_MB), zu lange
+Tabellen an einer Zählung der Zeilen vor dem Einlesen (413, MAX_ZEILEN je Blatt).
+
+Im Job-Modus (?async=1) behält der Job den Platz der Anfrage, bis er fertig ist (behalte_platz()). So
+zählen eingereihte Jobs mit ihren Uploads zu MAX_PARALLEL, und der Prozesspool nimmt nie mehr an, als
+der Service gleichzeitig verarbeiten darf.
+
+Die Plätze liegen in geteiltem Speicher und werden beim Import angelegt: Unter gunicorn mit preload_app
+(server.py) gelten die Grenzen für alle Worker zusammen, weil die App vor dem fork geladen wird. Jeder
+Platz trägt die PID seines Prozesses; Plätze abgestürzter Worker werden wieder frei.
+"""
+import math
+import multiprocessing
+import os
+import time
+import zipfile
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+
+from werkzeug.exceptions import RequestEntityTooLarge, TooManyRequests
+
+from . import messung
+from .xlsx_lesen import blatt_namen, zeilen_anzahl
+
+# Gleichzeitige Verarbeitungen und Warteplätze für den ganzen Service
+MAX_PARALLEL = int(os.environ.get("MAX_PARALLEL", "2"))
+MAX_WARTEND = int(os.environ.get("MAX_WARTEND", "8"))
+# Länger wartet keine Anfrage auf einen Platz (deutlich unter dem 60-s-Timeout des Node-Proxys)
+MAX_WARTEZEIT_S = float(os.environ.get("MAX_WARTEZEIT_S", "30"))
+# Obergrenzen je Anfrage: Größe des Uploads und Zeilen je Tabellenblatt
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", "50"))
+MAX_ZEILEN = int(os.environ.get("MAX_ZEILEN", "250000"))
+
+_ABFRAGE_INTERVALL_S = 0.05
+
+
+class Ueberlastet(TooManyRequests):
+    def __init__(self, beschreibung: str, grund: str, retry_after: int):
+        super().__init__(beschreibung, retry_after=retry_after)
+        self.grund = grund
+
+
+class ZuGross(RequestEntityTooLarge):
+    def __init__(self, beschreibung: str, grund: str):
+        super().__init__(beschreibung)
+        self.grund = grund
+
+
+class Zulassung:
+    def __init__(self, parallel: int, wartend: int, wartezeit_s: float):
+        ctx = multiprocessing.get_context()
+        self._sperre = ctx.Lock()
+        # PID je belegtem Platz, 0 = frei
+        self._laufend = ctx.Array("i", max(parallel, 1), lock=False)
+        self._wartend = ctx.Array("i", max(wartend, 0), lock=False)
+        self.wartezeit_s = wartezeit_s
+        # Gleitender Mittelwert der Verarbeitungsdauer (je Prozess) für Retry-After
+        self._dauer_s = 5.0
+
+    @staticmethod
+    def _belege(plaetze) -> int | None:
+        pid = os.getpid()
+        for i, belegt in enumerate(plaetze):
+            if belegt == 0 or (belegt != pid and not messung.lebt(belegt)):
+                plaetze[i] = pid
+                return i
+        return None
+
+    def stand(self) -> tuple[int, int]:
+        """(laufend, wartend) über alle Prozesse."""
+        with self._sperre:
+            return sum(1 for p in self._laufend if p), sum(1 for p in self._wartend if p)
+
+    def retry_after(self) -> int:
+        laufend, wartend = self.stand()
+        schaetzung = self._dauer_s * (wartend + 1) / len(self._laufend)
+        return min(max(math.ceil(schaetzung), 1), 120)
+
+    def _gib_frei(self, platz: int, dauer_s: float) -> None:
+        with self._sperre:
+            self._laufend[platz] = 0
+        self._dauer_s = 0.8 * self._dauer_s + 0.2 * dauer_s
+
+    @contextmanager
+    def platz(self):
+        """Belegt einen Platz (wartet höchstens wartezeit_s) und liefert ihn als Platz.
+
+        Der Platz wird am Ende des Blocks frei, außer er wurde mit uebergeben() an einen Job weitergereicht.
+        """
+        t0 = time.monotonic()
+        with self._sperre:
+            platz = self._belege(self._laufend)
+            warteplatz = None if platz is not None else self._belege(self._wartend)
+        if platz is None and warteplatz is None:
+            raise Ueberlastet("Der Service ist ausgelastet, bitte später erneut versuchen.", "voll", self.retry_after())
+        try:
+            while platz is None:
+                if time.monotonic() - t0 >= self.wartezeit_s:
+                    raise Ueberlastet("Zu lange Warteschlange, bitte später erneut versuchen.", "wartezeit",
+                                      self.retry_after())
+                time.sleep(_ABFRAGE_INTERVALL_S)
+                with self._sperre:
+                    platz = self._belege(self._laufend)
+        finally:
+            if warteplatz is not None:
+                with self._sperre:
+                    self._wartend[warteplatz] = 0
+        belegt = Platz(self, platz, time.monotonic() - t0)
+        try:
+            yield belegt
+        finally:
+            if not belegt.uebergeben:
+                belegt.freigeben()
+
+
+class Platz:
+    """Ein belegter Verarbeitungsplatz; freigeben() lässt sich mehrfach aufrufen, wirkt aber nur einmal."""
+
+    def __init__(self, zulassung: Zulassung, index: int, warten_s: float):
+        self.warten_s = warten_s
+        self.uebergeben = False
+        self._zulassung = zulassung
+        self._index = index
+        self._start = time.monotonic()
+        self._sperre = Lock()
+
+    def uebergeben_an_job(self):
+        """Der Platz bleibt nach der Anfrage belegt; die zurückgegebene Funktion gibt ihn frei."""
+        self.uebergeben = True
+        return self.freigeben
+
+    def freigeben(self) -> None:
+        with self._sperre:
+            index, self._index = self._index, None
+        if index is not None:
+            self._zulassung._gib_frei(index, time.monotonic() - self._start)
+
+
+zulassung = Zulassung(MAX_PARALLEL, MAX_WARTEND, MAX_WARTEZEIT_S)
+
+
+def _metriken() -> None:
+    laufend, wartend = zulassung.stand()
+    messung.setze(messung.ZULASSUNG, "laufend", laufend)
+    messung.setze(messung.ZULASSUNG, "wartend", wartend)
+
+
+messung.bei_abruf(_metriken)
+
+
+def pruefe_zeilen(datei) -> None:
+    """ZuGross, wenn ein Blatt der Excel-Datei mehr als MAX_ZEILEN Zeilen hat; andere Dateien bleiben ungeprüft."""
+    try:
+        for blatt in blatt_namen(datei):
+            anzahl = zeilen_anzahl(datei, blatt, grenze=MAX_ZEILEN)
+            if anzahl > MAX_ZEILEN:
+                raise ZuGross(f"Blatt {blatt!r} hat mehr als {MAX_ZEILEN} Zeilen.", "zeilen")
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass  # kein gültiges XLSX: das meldet die Verarbeitung selbst
+    finally:
+        if hasattr(datei, "seek"):
+            datei.seek(0)
+
+
+def begrenzt(ansicht):
+    """Für Upload-Routen: Größe prüfen, auf einen Platz warten, Zeilen zählen, dann verarbeiten."""
+    @wraps(ansicht)
+    def mit_zulassung(*args, **kwargs):
+        from flask import current_app, g, request
+
+        grenze = current_app.config.get("MAX_CONTENT_LENGTH")
+        # Vor dem Warten und ohne den Upload zu lesen
+        if grenze and (request.content_length or 0) > grenze:
+            raise ZuGross(f"Upload größer als {grenze / (1024 * 1024):g} MB.", "groesse")
+        with zulassung.platz() as platz:
+            g.zulassung_platz = platz
+            messung.erfasse(messung.STUFE, "warten", platz.warten_s)
+            with messung.messe("zeilen_pruefen"):
+                for datei in request.files.values():
+                    pruefe_zeilen(datei.stream)
+            return ansicht(*args, **kwargs)
+    return mit_zulassung
+
+
+def behalte_platz():
+    """Für Job-Routen: Der Platz der laufenden Anfrage bleibt belegt, bis der Job fertig ist.
+
+    Liefert die Funktion, die ihn freigibt (für JobPool.starte(..., bei_ende=…)); ohne begrenzt() eine, die nichts tut.
+    """
+    from flask import g
+
+    platz = g.get("zulassung_platz")
+    if platz is None:
+        return lambda: None
+    return platz.uebergeben_an_job()
+
+
+def richte_ein(app, fehler_antwort) -> None:
+    """MAX_CONTENT_LENGTH setzen; 413/429 zählen und als JSON im Format des Service ausgeben.
+
+    fehler_antwort(Meldung) → dict. Ein 413 von Werkzeug selbst (Upload ohne Content-Length) zählt als "groesse".
+    """
+    from flask import jsonify
+
+    if app.config.get("MAX_CONTENT_LENGTH") is None:
+        app.config["MAX_CONTENT_LENGTH"] = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+    def _abgewiesen(e):
+        messung.zaehle(messung.ABGELEHNT, getattr(e, "grund", "groesse"))
+        kopf = [(k, v) for k, v in e.get_headers() if k.lower() != "content-type"]
+        return jsonify(fehler_antwort(e.description)), e.code, kopf
+
+    app.register_error_handler(RequestEntityTooLarge, _abgewiesen)
+    app.register_error_handler(TooManyRequests, _abgewiesen)
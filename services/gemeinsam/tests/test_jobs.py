@@ -0,0 +1,46 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from gemeinsam.jobs import JobPool
+
+
+def _absturz(job_dir):
+    os._exit(1)
+
+
+def _verdoppeln(job_dir, wert):
+    return {"status": "ok", "wert": 2 * wert}
+
+
+def test_neuer_pool_nach_abgestuerztem_worker(tmp_path):
+    pool = JobPool(str(tmp_path), 1)
+    job_id, _ = pool.neuer_job()
+    pool.starte(job_id, _absturz)
+    assert pool.zustand(job_id, warten=30)["status"] == "error"
+
+    # Der alte Pool ist jetzt kaputt (BrokenProcessPool); starte legt einen neuen an
+    job_id, _ = pool.neuer_job()
+    pool.starte(job_id, _verdoppeln, 21)
+    zustand = pool.zustand(job_id, warten=30)
+    assert zustand["status"] == "ok" and zustand["wert"] == 42
+
+
+class _KaputterPool:
+    def submit(self, *args):
+        raise BrokenProcessPool("kaputt")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_fehler_beim_einreihen_steht_im_job(tmp_path, monkeypatch):
+    pool = JobPool(str(tmp_path), 1)
+    versuche = []
+    monkeypatch.setattr(pool, "_pool", lambda: versuche.append(1) or _KaputterPool())
+    job_id, _ = pool.neuer_job()
+    with pytest.raises(BrokenProcessPool):
+        pool.starte(job_id, _verdoppeln, 1)
+    assert len(versuche) == 2
+    assert pool.zustand(job_id) == {"status": "error", "message": "kaputt", "jobId": job_id}
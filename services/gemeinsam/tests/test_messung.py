@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+from gemeinsam import messung
+
+
+def _beendete_pid():
+    prozess = subprocess.Popen([sys.executable, "-c", "pass"])
+    prozess.wait()
+    return prozess.pid
+
+
+def _schreibe(verzeichnis, pid, histogramme=(), zaehler=(), staende=()):
+    with open(os.path.join(verzeichnis, f"{pid}.json"), "w", encoding="utf-8") as f:
+        json.dump({"histogramme": list(histogramme), "zaehler": list(zaehler), "staende": list(staende)}, f)
+
+
+def test_metrics_ueber_alle_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(messung, "_verzeichnis", None)
+    messung.teile_ueber(str(tmp_path))
+    messung.erfasse(messung.STUFE, "teilen", 0.2)
+    messung.zaehle(messung.ABGELEHNT, "teilen")
+    messung.setze(messung.START, "teilen", 1.5)
+
+    anzahl = [0] * (len(messung._SEKUNDEN) + 1)
+    anzahl[-1] = 2
+    lebend, beendet = os.getppid(), _beendete_pid()
+    _schreibe(tmp_path, lebend, [[messung.STUFE, "teilen", anzahl, 200.0]], [[messung.ABGELEHNT, "teilen", 3]],
+              [[messung.START, "teilen", 2.5], [messung.ZULASSUNG, "laufend", 7]])
+    _schreibe(tmp_path, beendet, [[messung.STUFE, "teilen", anzahl, 100.0]], [[messung.ABGELEHNT, "teilen", 4]],
+              [[messung.START, "teilen", 9.5]])
+
+    text = messung.prometheus_text()
+    # Histogramme und Zähler aller Worker, auch beendeter, zusammen
+    assert 'stufe_dauer_sekunden_count{stufe="teilen"} 5\n' in text
+    assert 'stufe_dauer_sekunden_sum{stufe="teilen"} 300.2\n' in text
+    assert 'abgelehnte_anfragen_total{grund="teilen"} 8\n' in text
+    # Startdauer je lebendem Worker, Werte für den ganzen Service nur vom antwortenden Prozess
+    assert f'start_dauer_sekunden{{worker="{os.getpid()}",phase="teilen"}} 1.5\n' in text
+    assert f'start_dauer_sekunden{{worker="{lebend}",phase="teilen"}} 2.5\n' in text
+    assert f'worker="{beendet}"' not in text
+    assert 'zulassung_anfragen{zustand="laufend"} 7' not in text
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
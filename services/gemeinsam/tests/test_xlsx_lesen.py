@@ -0,0 +1,41 @@
+import zipfile
+from io import BytesIO
+
+from gemeinsam.xlsx_lesen import lies_zeilen
+
+_TYP = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _mappe(zeilen_xml: str, geteilte: list[str]) -> bytes:
+    """Kleinste XLSX mit einem Blatt und sharedStrings, so wie Excel sie schreibt (openpyxl schreibt Inline-Texte)."""
+    puffer = BytesIO()
+    with zipfile.ZipFile(puffer, "w") as z:
+        z.writestr("_rels/.rels", f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                                  f'<Relationship Id="rId1" Type="{_TYP}/officeDocument" Target="xl/workbook.xml"/>'
+                                  f'</Relationships>')
+        z.writestr("xl/workbook.xml", f'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                                      f'xmlns:r="{_TYP}"><sheets><sheet name="Blatt1" sheetId="1" r:id="rId1"/>'
+                                      f'</sheets></workbook>')
+        z.writestr("xl/_rels/workbook.xml.rels",
+                   f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   f'<Relationship Id="rId1" Type="{_TYP}/worksheet" Target="worksheets/sheet1.xml"/>'
+                   f'<Relationship Id="rId2" Type="{_TYP}/sharedStrings" Target="sharedStrings.xml"/>'
+                   f'</Relationships>')
+        z.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/'
+                                               f'main"><sheetData>{zeilen_xml}</sheetData></worksheet>')
+        z.writestr("xl/sharedStrings.xml", '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                                           + "".join(f"<si><t>{t}</t></si>" for t in geteilte) + "</sst>")
+    return puffer.getvalue()
+
+
+def test_maskierte_zeichen_in_geteilten_texten():
+    daten = _mappe('<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c>'
+                   '<c r="C1" t="s"><v>2</v></c></row><row r="2"><c r="A2"><v>1</v></c></row>',
+                   ["Zeile_x000D__x000A_Umbruch", "_x005F_x000D_ bleibt", "Tab_x0009_"])
+    zeilen = [(nr, list(werte)) for nr, werte in lies_zeilen(daten)]
+    assert zeilen == [(1, ["Zeile\r\nUmbruch", "_x000D_ bleibt", "Tab\t"]), (2, [1])]
+
+
+def test_maskierte_zeichen_in_inline_texten():
+    daten = _mappe('<row r="1"><c r="A1" t="inlineStr"><is><t>a_x000A_b</t></is></c></row>', [])
+    assert [(nr, list(werte)) for nr, werte in lies_zeilen(daten, [1])] == [(1, ["a\nb"])]
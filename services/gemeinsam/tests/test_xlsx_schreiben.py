@@ -0,0 +1,147 @@
+import re
+import zipfile
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.comments import Comment
+from openpyxl.styles import Font
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.table import Table
+
+from gemeinsam.xlsx_schreiben import lade_teilweise, speichere
+
+
+def _ausgangsmappe() -> bytes:
+    wb = Workbook()
+    a = wb.active
+    a.title = "A"
+    a["A1"] = "Mieter"
+    a["B1"] = "fett"
+    a["B1"].font = Font(bold=True)
+    b = wb.create_sheet("B")
+    b["A1"] = "Mieter"
+    b["A2"] = "fett"
+    b["A2"].font = Font(bold=True)
+    b["B2"] = "kursiv"
+    b["B2"].font = Font(italic=True)
+    b["B2"].comment = Comment("Notiz in B", "Test")
+    wb.create_sheet("C")["A1"] = 42
+    wb.defined_names["Summe"] = DefinedName("Summe", attr_text="C!$A$1")
+    wb.active = 1
+    puffer = BytesIO()
+    wb.save(puffer)
+    return puffer.getvalue()
+
+
+def _aendere_teil(daten: bytes, aenderungen) -> bytes:
+    """Kopie der Mappe; aenderungen bildet Teilnamen auf Funktionen bytes -> bytes ab."""
+    puffer = BytesIO()
+    with zipfile.ZipFile(BytesIO(daten)) as alt, zipfile.ZipFile(puffer, "w", zipfile.ZIP_DEFLATED) as neu:
+        for info in alt.infolist():
+            inhalt = alt.read(info.filename)
+            neu.writestr(info, aenderungen.get(info.filename, lambda x: x)(inhalt))
+    return puffer.getvalue()
+
+
+def _bearbeite_a(daten: bytes) -> bytes:
+    wb = lade_teilweise(daten, ["A"])
+    ws = wb["A"]
+    ws["A2"] = "Neuer Mieter"
+    ws["B2"] = 3.5
+    ws["B2"].number_format = "0.000"
+    ws["C2"] = "rot"
+    ws["C2"].font = Font(color="FF0000")
+    ws["C2"].comment = Comment("Notiz in A", "Test")
+    puffer = BytesIO()
+    speichere(wb, puffer)
+    return puffer.getvalue()
+
+
+def _pruefe(daten: bytes):
+    wb = load_workbook(BytesIO(daten))
+    assert wb.sheetnames == ["A", "B", "C"]
+    assert wb.active.title == "B"
+    a, b = wb["A"], wb["B"]
+    assert (a["A1"].value, a["A2"].value, a["B1"].font.b) == ("Mieter", "Neuer Mieter", True)
+    assert (a["B2"].value, a["B2"].number_format) == (3.5, "0.000")
+    assert a["C2"].font.color.rgb == "00FF0000" and a["C2"].comment.text == "Notiz in A"
+    assert (b["A1"].value, b["A2"].font.b, b["A2"].font.i, b["B2"].font.i) == ("Mieter", True, False, True)
+    assert b["B2"].comment.text == "Notiz in B"
+    assert wb["C"]["A1"].value == 42
+    assert wb.defined_names["Summe"].attr_text == "C!$A$1"
+    return wb
+
+
+def test_mehrere_blaetter_und_notizen():
+    ergebnis = _bearbeite_a(_ausgangsmappe())
+    _pruefe(ergebnis)
+    with zipfile.ZipFile(BytesIO(ergebnis)) as z:
+        assert "xl/sharedStrings.xml" in z.namelist()
+
+    # Zweiter Lauf auf dem Ergebnis: vorhandene sharedStrings werden ergänzt, nicht ersetzt
+    wb = lade_teilweise(ergebnis, ["A"])
+    wb["A"]["A3"] = "Mieter"
+    wb["A"]["A4"] = "Noch ein Mieter"
+    puffer = BytesIO()
+    speichere(wb, puffer)
+    wb = _pruefe(puffer.getvalue())
+    assert (wb["A"]["A3"].value, wb["A"]["A4"].value) == ("Mieter", "Noch ein Mieter")
+
+
+def test_doppelte_zellformate():
+    # Ein Zellformat doppelt in cellXfs, wie es Excel nach Kopieren zwischen Mappen schreibt; die Verweise im
+    # nicht geladenen Blatt B verschieben sich entsprechend
+    def stile(xml: bytes) -> bytes:
+        m = re.search(rb"<cellXfs[^>]*>(.*?)</cellXfs>", xml, re.S)
+        xfs = re.findall(rb"<xf\b.*?(?:/>|</xf>)", m.group(1), re.S)
+        neu = [xfs[0], xfs[0], *xfs[1:]]
+        return xml[:m.start()] + b'<cellXfs count="%d">' % len(neu) + b"".join(neu) + b"</cellXfs>" + xml[m.end():]
+
+    def verschiebe(xml: bytes) -> bytes:
+        return re.sub(rb' s="(\d+)"', lambda m: b' s="%d"' % (int(m.group(1)) + 1), xml)
+
+    daten = _aendere_teil(_ausgangsmappe(), {"xl/styles.xml": stile, "xl/worksheets/sheet1.xml": verschiebe,
+                                             "xl/worksheets/sheet2.xml": verschiebe})
+    _pruefe(_bearbeite_a(daten))
+
+
+def test_styles_mit_namensraum_praefix_speichert_alles_mit_openpyxl():
+    # Mit Präfix (<x:styleSheet …>) lässt sich styles.xml nicht ergänzen; dann schreibt openpyxl die ganze Mappe
+    def mit_praefix(xml: bytes) -> bytes:
+        xml = re.sub(rb"<(/?)(\w+)", rb"<\1x:\2", xml)
+        return xml.replace(b'xmlns="', b'xmlns:x="', 1)
+
+    ergebnis = _bearbeite_a(_aendere_teil(_ausgangsmappe(), {"xl/styles.xml": mit_praefix}))
+    _pruefe(ergebnis)
+    with zipfile.ZipFile(BytesIO(ergebnis)) as z:
+        assert b"<x:styleSheet" not in z.read("xl/styles.xml")
+
+    # Das Workbook ist danach vollständig und wird beim nächsten Speichern nicht mehr eingesetzt
+    wb = lade_teilweise(_aendere_teil(_ausgangsmappe(), {"xl/styles.xml": mit_praefix}), ["A"])
+    speichere(wb, BytesIO())
+    assert wb.sheetnames == ["A", "B", "C"]
+
+
+def test_tabellen_ids_bleiben_eindeutig():
+    # Tabellen in A und B; nur B wird geladen. openpyxl nummeriert die Tabelle von B neu ab 1, die von A behält 1
+    wb = Workbook()
+    wb.active.title = "A"
+    for ws in (wb.active, wb.create_sheet("B")):
+        ws.append(["Mieter", "Betrag"])
+        ws.append(["Muster", 100])
+        ws.add_table(Table(displayName=f"Tabelle{ws.title}", ref="A1:B2"))
+    puffer = BytesIO()
+    wb.save(puffer)
+
+    wb = lade_teilweise(puffer.getvalue(), ["B"])
+    wb["B"]["A3"] = "Neuer Mieter"
+    puffer = BytesIO()
+    speichere(wb, puffer)
+
+    with zipfile.ZipFile(puffer) as z:
+        tabellen = [z.read(n) for n in z.namelist() if n.startswith("xl/tables/")]
+    ids = [re.search(rb'<table\b[^>]*\sid="(\d+)"', xml).group(1) for xml in tabellen]
+    assert len(ids) == 2 and len(set(ids)) == 2
+    wb = load_workbook(puffer)
+    assert set(wb["A"].tables) == {"TabelleA"} and set(wb["B"].tables) == {"TabelleB"}
+    assert wb["B"]["A3"].value == "Neuer Mieter"
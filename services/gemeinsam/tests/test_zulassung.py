@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from gemeinsam import zulassung
+from gemeinsam.jobs import JobPool
+from gemeinsam.zulassung import Zulassung
+
+
+def _warte_auf_freigabe(job_dir, marke):
+    frist = time.monotonic() + 30
+    while not os.path.exists(marke) and time.monotonic() < frist:
+        time.sleep(0.05)
+    return {"status": "ok"}
+
+
+@pytest.fixture
+def dienst(tmp_path, monkeypatch):
+    # Ein Platz, keine Warteplätze: jede weitere Anfrage wird sofort abgewiesen
+    monkeypatch.setattr(zulassung, "zulassung", Zulassung(1, 0, 0.0))
+    jobs = JobPool(str(tmp_path / "jobs"), 2)
+    marke = str(tmp_path / "freigabe")
+
+    app = flask.Flask(__name__)
+    zulassung.richte_ein(app, lambda meldung: {"status": "error", "message": meldung})
+
+    @app.post("/process")
+    @zulassung.begrenzt
+    def process():
+        job_id, _ = jobs.neuer_job()
+        jobs.starte(job_id, _warte_auf_freigabe, marke, bei_ende=zulassung.behalte_platz())
+        return {"jobId": job_id}, 202
+
+    return app.test_client(), jobs, marke
+
+
+def test_job_haelt_platz_bis_zum_ende(dienst):
+    client, jobs, marke = dienst
+    antwort = client.post("/process?async=1")
+    assert antwort.status_code == 202
+    job_id = antwort.get_json()["jobId"]
+
+    # Die Anfrage ist beantwortet, der Job belegt den Platz aber weiter
+    assert zulassung.zulassung.stand() == (1, 0)
+    abgewiesen = client.post("/process?async=1")
+    assert abgewiesen.status_code == 429 and int(abgewiesen.headers["Retry-After"]) >= 1
+
+    open(marke, "w").close()
+    assert jobs.zustand(job_id, warten=30)["status"] == "ok"
+    frist = time.monotonic() + 10
+    while zulassung.zulassung.stand() != (0, 0) and time.monotonic() < frist:
+        time.sleep(0.05)
+    assert zulassung.zulassung.stand() == (0, 0)
+    assert client.post("/process?async=1").status_code == 202
+
+
+def test_platz_frei_wenn_job_nicht_startet(dienst, monkeypatch):
+    client, jobs, _ = dienst
+
+    def kaputt(*args):
+        raise RuntimeError("Pool weg")
+
+    monkeypatch.setattr(jobs, "_abschicken", kaputt)
+    assert client.post("/process?async=1").status_code == 500
+    assert zulassung.zulassung.stand() == (0, 0)
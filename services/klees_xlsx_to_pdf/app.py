@@ -2,115 +2,203 @@ from flask import Flask, request, send_file, jsonify, send_from_directory
 from flask_cors import CORS
 from datetime import datetime
 from io import BytesIO
+import numpy as np
 import pandas as pd
 import os
+from werkzeug.utils import secure_filename
+
+from gemeinsam import ablage, messung, xlsx_lesen, zulassung
+from gemeinsam.cache import ErgebnisCache, code_stand
+from gemeinsam.xlsx_lesen import NA_WERTE, lies_zeilen, wie_read_excel
+
+# Genutzte Spalten des Lagerbuchs (0-basiert): B Art.-Nr., D Bezeichnung, K Kolli, N Menge
+LAGERBUCH_SPALTEN = [1, 3, 10, 13]
+
+
+def _float_oder_none(wert):
+    try:
+        return float(wert)
+    except (ValueError, TypeError):
+        return None
+
+
+def _als_float(werte: pd.Series):
+    """float() je Wert, fehlende Werte zählen 0. Gibt (Zahlen, umwandelbar) zurück."""
+    werte = werte.where(werte.notna(), 0)
+    if werte.dtype.kind in "biuf":
+        return werte.astype(float).to_numpy(), np.ones(len(werte), dtype=bool)
+    werte = werte.astype(object)
+    zahlen = pd.to_numeric(werte, errors="coerce").to_numpy(dtype=float, copy=True)
+    umwandelbar = np.ones(len(werte), dtype=bool)
+    # Texte und alles, was to_numeric nicht liest, wie bisher über float() (" 3 " geht, "1,5" nicht)
+    einzeln = np.flatnonzero(werte.map(lambda wert: isinstance(wert, str)).to_numpy() | np.isnan(zahlen))
+    for pos, wert in zip(einzeln, werte.to_numpy()[einzeln]):
+        zahl = _float_oder_none(wert)
+        umwandelbar[pos] = zahl is not None
+        zahlen[pos] = np.nan if zahl is None else zahl
+    return zahlen, umwandelbar
+
+
+_WAHR, _FALSCH = {"True", "TRUE", "true"}, {"False", "FALSE", "false"}
+
+
+def _spalte_wie_read_excel(werte: pd.Series) -> pd.Series:
+    # Typen wie im Parser von pd.read_excel: Zahlen (auch als Text), sonst Wahrheitswerte, sonst object mit NaN
+    werte_na = werte.mask(werte.isin(NA_WERTE))
+    try:
+        zahlen = pd.to_numeric(werte_na)
+    except (TypeError, ValueError):
+        zahlen = None
+    if zahlen is not None:
+        # object nur bei Ganzzahlen jenseits von int64 neben fehlenden Werten; der Parser lässt sie dann unverändert
+        return werte if zahlen.dtype == object else zahlen
+    werte = werte_na
+    fehlend = werte.isna()
+    if werte[~fehlend].map(lambda wert: isinstance(wert, bool) or wert in _WAHR or wert in _FALSCH).all():
+        wahr = werte.map(lambda wert: wert if isinstance(wert, bool) else wert in _WAHR)
+        return wahr.astype(object).mask(fehlend) if fehlend.any() else wahr.astype(bool)
+    return werte
+
+
+def lies_lagerbuch(file) -> pd.DataFrame:
+    """Nur die LAGERBUCH_SPALTEN, mit Zeilen und Typen wie ``pd.read_excel(file, header=None)``."""
+    zeilen = []
+    for nr, werte in lies_zeilen(file, [s + 1 for s in LAGERBUCH_SPALTEN]):
+        # Leere Zeilen dazwischen behält pd.read_excel als NaN-Zeilen; der Index bleibt Excel-Zeile - 1
+        zeilen += [[""] * len(LAGERBUCH_SPALTEN)] * (nr - 1 - len(zeilen))
+        zeilen.append([wie_read_excel(w) for w in werte])
+    if not zeilen:
+        return pd.DataFrame()
+    roh = pd.DataFrame(zeilen, dtype=object)
+    # Arrays statt Series: der DataFrame erkennt dann Datumsspalten wie beim Einlesen mit pd.read_excel
+    return pd.DataFrame({spalte: _spalte_wie_read_excel(roh[i]).to_numpy()
+                         for i, spalte in enumerate(LAGERBUCH_SPALTEN)})
 
 
 def process_excel(file):
-    df = pd.read_excel(file, header=None)
-    data_rows = []
-    for index, row in df.iterrows():
-        if index >= 3:
-            art_no = row[1] if pd.notna(row[1]) else None
-            art_name = row[3] if pd.notna(row[3]) else None
-            koli = row[10] if pd.notna(row[10]) else 0
-            menge = row[13] if pd.notna(row[13]) else 0
-            if (
-                art_no and str(art_no).strip()
-                and str(art_no).strip().lower() not in ['artikel', 'lagerbuch', 'lagerbuchkonto', '']
-                and (not art_name or str(art_name).strip().lower() not in ['lagerbuch', 'artikel', ''])
-                and not any(x in str(art_no).lower() for x in ['sayfa', 'toplam', 'seite'])
-                and not any(x in str(art_name).lower() for x in ['lagerbuch', 'artikel', 'konto'])
-            ):
-                try:
-                    koli_val = float(koli)
-                    menge_val = float(menge)
-                    data_rows.append({
-                        'art_no': str(art_no).strip(),
-                        'art_name': str(art_name).strip() if art_name else '',
-                        'koli': koli_val,
-                        'menge': menge_val,
-                        'order': index
-                    })
-                except (ValueError, TypeError):
-                    continue
-    grouped_data = {}
-    for item in data_rows:
-        art_no = item['art_no']
-        if art_no not in grouped_data:
-            grouped_data[art_no] = item
-        else:
-            grouped_data[art_no]['koli'] += item['koli']
-            grouped_data[art_no]['menge'] += item['menge']
-    result = sorted(grouped_data.values(), key=lambda x: x['order'])
-    return result
+    df = lies_lagerbuch(file)
+    messung.zaehle_zeilen("lagerbuch", len(df))
+    if len(df) <= 3:
+        return []
+    if not (df.dtypes == object).any():
+        # Ohne Textspalte hat die zeilenweise Fassung (iterrows) alle Werte auf einen Typ gebracht, z. B. int → float.
+        # Sie sah die ganze Tabelle; gelesen werden nur LAGERBUCH_SPALTEN, in echten Lagerbüchern stehen in B und D
+        # aber immer Texte (Kopfzeilen, Bezeichnungen)
+        df = df.astype(df.values.dtype)
+    daten = df.iloc[3:]
+    art_no, art_name = daten[1], daten[3]
+
+    no_text = art_no.astype(str)
+    no_klein = no_text.str.lower()
+    no_kurz = no_text.str.strip()
+    name_text = art_name.astype(str)
+    name_leer = art_name.isna() | art_name.eq(0) | name_text.eq("")
+
+    behalten = (
+        art_no.notna() & ~art_no.eq(0) & no_kurz.ne("")
+        & ~no_kurz.str.lower().isin(['artikel', 'lagerbuch', 'lagerbuchkonto', ''])
+        & (name_leer | ~name_text.str.strip().str.lower().isin(['lagerbuch', 'artikel', '']))
+        & ~no_klein.str.contains('sayfa|toplam|seite')
+        & ~name_text.str.lower().str.contains('lagerbuch|artikel|konto')
+    )
+    koli, koli_ok = _als_float(daten[10])
+    menge, menge_ok = _als_float(daten[13])
+    behalten = behalten.to_numpy() & koli_ok & menge_ok
+
+    zeilen = pd.DataFrame({
+        'art_no': no_kurz.to_numpy()[behalten],
+        'art_name': name_text.str.strip().where(~name_leer, '').to_numpy()[behalten],
+        'order': daten.index.to_numpy()[behalten],
+    })
+    gruppen = zeilen.groupby('art_no', sort=False)
+    ergebnis = gruppen.agg(art_name=('art_name', 'first'), order=('order', 'first')).reset_index()
+    # Summen in Zeilenreihenfolge wie bisher: bincount addiert der Reihe nach, groupby.sum rechnet mit Kahan-Korrektur
+    nummern = gruppen.ngroup().to_numpy()
+    ergebnis['koli'] = np.bincount(nummern, weights=koli[behalten], minlength=len(ergebnis))
+    ergebnis['menge'] = np.bincount(nummern, weights=menge[behalten], minlength=len(ergebnis))
+    return ergebnis[['art_no', 'art_name', 'koli', 'menge', 'order']].to_dict('records')
 
 
 def create_pdf(data, output_buffer: BytesIO):
     from reportlab.lib.pagesizes import letter
+    from reportlab.pdfbase.pdfmetrics import stringWidth
     from reportlab.pdfgen import canvas
 
     c = canvas.Canvas(output_buffer, pagesize=letter)
     width, height = letter
 
-    rows_per_column = 55
     line_height = 12
     top_margin = 50
     bottom_margin = 20
     col_width = (width - 60) / 2
+    first_row_y = height - top_margin - 20
+    # Zeilen je Spalte aus dem Layout, nicht geschätzt: bis y unter bottom_margin fällt
+    rows_per_column = int((first_row_y - bottom_margin) // line_height) + 1
+    rows_per_page = rows_per_column * 2
 
     today = datetime.today().strftime('%d.%m.%Y')
-    current_page = 1
-    total_items = len(data)
-    total_pages = (total_items + (rows_per_column * 2) - 1) // (rows_per_column * 2)
-
-    def draw_header(page_num):
+    total_pages = max(1, (len(data) + rows_per_page - 1) // rows_per_page)
+
+    # Kopf, Spaltenüberschriften und Linien sind auf jeder Seite gleich: einmal als Form-XObject ablegen
+    c.beginForm("kopf")
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, height - 30, f"{today}")
+    c.setFont("Helvetica-Bold", 12)
+    c.drawCentredString(width / 2, height - 30, "KLEES LAGERBUCH")
+    header_y = height - top_margin
+    for x_offset in [0, col_width]:
+        c.drawString(40 + x_offset, header_y, "A.No")
+        c.drawString(78 + x_offset, header_y, "Artikel")
+        c.drawRightString(260 + x_offset, header_y, "Kolli")
+        c.drawRightString(300 + x_offset, header_y, "Menge")
+        c.drawRightString(220 + x_offset, header_y, "Bestand")
+    c.line(40, height - top_margin - 5, width - 40, height - top_margin - 5)
+    c.setLineWidth(1.5)
+    c.line(40 + col_width - 5, height - top_margin, 40 + col_width - 5, bottom_margin)
+    c.endForm()
+
+    def draw_column(items, x_offset):
+        # Ein Textobjekt je Spalte, Feld für Feld: linksbündige Felder laufen über den Zeilenabstand (T*),
+        # rechtsbündige über relative Sprünge (Td); die Schrift wechselt nur einmal, für die fette Kolli-Spalte
+        t = c.beginText()
+        t.setFont("Helvetica", 9, line_height)
+        for x, texte in [(40, (str(item['art_no'])[:6] for item in items)),
+                         (78, ((item['art_name'] or '')[:20] for item in items))]:
+            t.setTextOrigin(x + x_offset, first_row_y)
+            for text in texte:
+                t.textLine(text)
+
+        def right_aligned(x_right, font, size, texte):
+            t.setTextOrigin(x_right + x_offset, first_row_y + line_height)
+            vorher = 0
+            for text in texte:
+                breite = stringWidth(text, font, size)
+                t.moveCursor(vorher - breite, line_height)
+                t.textOut(text)
+                vorher = breite
+
+        right_aligned(300, "Helvetica", 9, (f"{item['menge']:.1f}" for item in items))
+        t.setFont("Helvetica-Bold", 10, line_height)
+        right_aligned(260, "Helvetica-Bold", 10, (f"{item['koli']:.1f}" for item in items))
+        c.drawText(t)
+        return [(40 + x_offset, y - 3, 320 + x_offset, y - 3)
+                for y in (first_row_y - i * line_height for i in range(len(items)))]
+
+    for page_num in range(1, total_pages + 1):
+        if page_num > 1:
+            c.showPage()
+        c.doForm("kopf")
         c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, height - 30, f"{today}")
         c.drawRightString(width - 40, height - 30, f"Seite {page_num} von {total_pages}")
-        c.setFont("Helvetica-Bold", 12)
-        c.drawCentredString(width / 2, height - 30, "KLEES LAGERBUCH")
-        for x_offset in [0, col_width]:
-            header_y = height - top_margin
-            c.drawString(40 + x_offset, header_y, "A.No")
-            c.drawString(78 + x_offset, header_y, "Artikel")
-            c.drawRightString(260 + x_offset, header_y, "Kolli")
-            c.drawRightString(300 + x_offset, header_y, "Menge")
-            c.drawRightString(220 + x_offset, header_y, "Bestand")
-        c.line(40, height - top_margin - 5, width - 40, height - top_margin - 5)
-        c.setLineWidth(1.5)
-        c.line(40 + col_width - 5, height - top_margin, 40 + col_width - 5, bottom_margin)
-
-    y_positions = [height - top_margin - 20] * 2
-    col_index = 0  # 0 = left, 1 = right
-
-    draw_header(current_page)
-
-    for item in data:
-        if y_positions[col_index] < bottom_margin:
-            if col_index == 0:
-                col_index = 1
-            else:
-                c.showPage()
-                current_page += 1
-                draw_header(current_page)
-                y_positions = [height - top_margin - 20] * 2
-                col_index = 0
-        x_offset = 0 if col_index == 0 else col_width
-        y_pos = y_positions[col_index]
-        c.setFont("Helvetica", 9)
-        c.drawString(40 + x_offset, y_pos, str(item['art_no'])[:6])
-        art_name_short = (item['art_name'] or '')[:20]
-        c.drawString(78 + x_offset, y_pos, art_name_short)
-        c.setFont("Helvetica-Bold", 10)
-        c.drawRightString(260 + x_offset, y_pos, f"{item['koli']:.1f}")
-        c.setFont("Helvetica", 9)
-        c.drawRightString(300 + x_offset, y_pos, f"{item['menge']:.1f}")
-        c.setFont("Helvetica", 9)
-        c.drawRightString(220 + x_offset, y_pos, "")
-        c.setLineWidth(0.2)
-        c.line(40 + x_offset, y_pos - 3, 320 + x_offset, y_pos - 3)
-        y_positions[col_index] -= 12
+        start = (page_num - 1) * rows_per_page
+        lines = []
+        for col_index, x_offset in enumerate([0, col_width]):
+            items = data[start + col_index * rows_per_column:start + (col_index + 1) * rows_per_column]
+            if items:
+                lines += draw_column(items, x_offset)
+        if lines:
+            c.setLineWidth(0.2)
+            c.lines(lines)
 
     c.save()
 
@@ -132,6 +220,13 @@ CORS(app, resources={
     }
 })
 
+messung.richte_ein(app)
+zulassung.richte_ein(app, lambda meldung: {"ok": False, "error": meldung})
+
+# Uploads und PDFs bleiben im Speicher; auf die Platte geht nur, was hier eingeschaltet ist (im Hintergrund)
+UPLOADS_ABLEGEN = os.environ.get("UPLOADS_ABLEGEN", "0") == "1"
+ERGEBNISSE_ABLEGEN = os.environ.get("ERGEBNISSE_ABLEGEN", "1") == "1"
+
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["RESULTS_FOLDER"] = RESULTS_FOLDER
 
@@ -139,6 +234,15 @@ app.config["RESULTS_FOLDER"] = RESULTS_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
+# Gleiches Lagerbuch am gleichen Tag → gespeichertes PDF statt erneuter Verarbeitung (RESULT_CACHE=0 schaltet ab)
+cache = ErgebnisCache(
+    RESULTS_FOLDER,
+    code_stand(os.path.abspath(__file__), xlsx_lesen.__file__),
+    max_bytes=int(os.environ.get("RESULTS_MAX_MB", "500")) * 1024 * 1024,
+    max_alter_s=float(os.environ.get("RESULTS_MAX_ALTER_H", "72")) * 3600,
+    aktiv=os.environ.get("RESULT_CACHE", "1") != "0",
+)
+
 
 @app.get("/health")
 def health():
@@ -153,45 +257,57 @@ def root():
         "endpoints": {
             "GET /health": "Service-Status",
             "POST /upload": "Excel hochladen, PDF herunterladen",
-            "GET /results/<filename>": "Gespeicherte PDFs abrufen"
+            "GET /results/<filename>": "Gespeicherte PDFs abrufen",
+            "GET /metrics": "Messwerte im Prometheus-Format"
         }
     }), 200
 
 @app.post("/upload")
+@zulassung.begrenzt
 def upload():
     uploaded_file = request.files.get("file")
     if not uploaded_file or uploaded_file.filename == "":
         return "Keine Datei hochgeladen.", 400
 
-    # Upload speichern
-    original_name = uploaded_file.filename
-    upload_path = os.path.join(UPLOAD_FOLDER, original_name)
-    uploaded_file.save(upload_path)
-
-    # Excel verarbeiten
-    with open(upload_path, "rb") as f:
-        data = process_excel(f)
-
-    # PDF erstellen (in Memory) und zusätzlich in results sichern
+    # Das PDF trägt das Tagesdatum im Kopf, daher gehört es zum Schlüssel
+    daten = uploaded_file.read()
+    messung.eingabe_groesse("lagerbuch", len(daten))
+    now = datetime.now()
+    schluessel = cache.schluessel(daten, now.strftime("%Y-%m-%d"))
+    treffer = cache.hole(schluessel)
+    if treffer:
+        filename = f"lagerbuch_{now.strftime('%Y%m%d_%H%M%S')}.pdf"
+        return send_file(treffer["pfad"], mimetype="application/pdf", as_attachment=True, download_name=filename)
+
+    if UPLOADS_ABLEGEN:
+        ablage.schreibe_spaeter(os.path.join(UPLOAD_FOLDER, secure_filename(uploaded_file.filename) or "lagerbuch.xlsx"), daten)
+
+    # Excel verarbeiten und PDF erstellen, beides in Memory
+    with messung.messe("process_excel"):
+        data = process_excel(BytesIO(daten))
+    messung.zaehle_zeilen("artikel", len(data))
     pdf_buffer = BytesIO()
-    create_pdf(data, pdf_buffer)
-    pdf_buffer.seek(0)
+    with messung.messe("create_pdf"):
+        create_pdf(data, pdf_buffer)
+    pdf = pdf_buffer.getvalue()
 
-    now = datetime.now()
+    # Kopie in results und Cache-Eintrag erst nach der Antwort
     filename = f"lagerbuch_{now.strftime('%Y%m%d_%H%M%S')}.pdf"
-    result_path = os.path.join(RESULTS_FOLDER, filename)
-
-    with open(result_path, "wb") as out_f:
-        out_f.write(pdf_buffer.getvalue())
+    if ERGEBNISSE_ABLEGEN:
+        ablage.schreibe_spaeter(os.path.join(RESULTS_FOLDER, filename), pdf)
+    ablage.im_hintergrund(cache.lege_ab_daten, schluessel, filename, pdf)
 
-    # Direkt-Download zurückgeben
-    return send_file(result_path, mimetype="application/pdf", as_attachment=True, download_name=filename)
+    # Direkt-Download aus dem Speicher
+    return send_file(BytesIO(pdf), mimetype="application/pdf", as_attachment=True, download_name=filename)
 
 
 @app.get("/results/<path:filename>")
 def get_result(filename: str):
     file_path = os.path.join(RESULTS_FOLDER, filename)
-    if not os.path.exists(file_path):
+    daten = ablage.ausstehend(file_path)
+    if daten is not None:
+        return send_file(BytesIO(daten), mimetype="application/pdf", as_attachment=True, download_name=filename)
+    if not ablage.warte_auf(file_path):
         return jsonify({"ok": False, "error": "Datei nicht gefunden"}), 404
     return send_from_directory(RESULTS_FOLDER, filename, as_attachment=True, mimetype="application/pdf", download_name=filename)
 
@@ -0,0 +1,73 @@
+"""Benchmark für die PDF-Erzeugung (synthetische Lagerbuch-Zeilen, keine Kundendateien).
+
+Aufruf aus diesem Verzeichnis:
+
+    python bench_klees.py           # PDF-Erzeugung je Größe
+    python bench_klees.py suite     # Lagerbuch → PDF über eine Größenreihe, Vergleich mit Baseline (--help)
+    python bench_klees.py last      # HTTP-Lasttest mit 1/4/16 parallelen Clients gegen den lokal gestarteten Service (--help)
+"""
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+from gemeinsam import benchlauf, lasttest
+from app import create_pdf, process_excel
+from synth import lagerbuch
+
+NAMEN = ["Schraube M4", "Dübel 8 mm", "Kabelbinder schwarz 200", "", None, "Mutter M6 verzinkt"]
+
+
+def _synth_daten(n: int, seed: int = 1):
+    """Zeilen wie aus process_excel: art_no, art_name, koli, menge, order."""
+    rnd = random.Random(seed)
+    return [
+        {"art_no": str(100000 + i), "art_name": rnd.choice(NAMEN),
+         "koli": rnd.uniform(0, 500), "menge": rnd.uniform(0, 10_000), "order": i}
+        for i in range(n)
+    ]
+
+
+def _messe(daten, wiederholungen: int = 3):
+    """Bestzeit für create_pdf und Größe des PDFs."""
+    zeiten = []
+    for _ in range(wiederholungen):
+        puffer = BytesIO()
+        t = time.perf_counter()
+        create_pdf(daten, puffer)
+        zeiten.append(time.perf_counter() - t)
+    return min(zeiten), len(puffer.getvalue()), puffer.getvalue().count(b"/Type /Page\n")
+
+
+def bench_pdf(groessen=(1_000, 10_000, 50_000)):
+    print(f"{'Zeilen':>8} {'Seiten':>7} {'erzeugen [s]':>13} {'je Seite [ms]':>14} {'PDF [KB]':>9}")
+    for n in groessen:
+        dauer, groesse, seiten = _messe(_synth_daten(n))
+        print(f"{n:>8} {seiten:>7} {dauer:>13.2f} {dauer / max(seiten, 1) * 1000:>14.2f} {groesse / 1024:>9.0f}")
+
+
+def _lagerbuch_pdf(daten: bytes) -> bytes:
+    puffer = BytesIO()
+    create_pdf(process_excel(BytesIO(daten)), puffer)
+    return puffer.getvalue()
+
+
+# Größe = Bewegungszeilen im Lagerbuch (etwa vier je Artikel, dazu die Zeilen der Seitenumbrüche)
+SZENARIEN = [benchlauf.Szenario("lagerbuch_pdf", (2_000, 20_000, 100_000), lagerbuch, _lagerbuch_pdf)]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def _last_anfrage(n: int, variante: int) -> lasttest.Anfrage:
+    return lasttest.Anfrage("/upload", {"file": ("lagerbuch.xlsx", lagerbuch(n, seed=variante + 1))})
+
+
+LAST = lasttest.Lastprofil(10_000, _last_anfrage)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["suite"]:
+        sys.exit(benchlauf.main(SZENARIEN, BASELINE, sys.argv[2:]))
+    if sys.argv[1:2] == ["last"]:
+        sys.exit(lasttest.main(LAST, os.path.dirname(os.path.abspath(__file__)), sys.argv[2:]))
+    bench_pdf()
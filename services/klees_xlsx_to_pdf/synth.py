@@ -0,0 +1,66 @@
+"""Synthetische Lagerbücher (keine Kundendaten).
+
+lagerbuch() erzeugt ein Lagerbuch wie aus der Warenwirtschaft exportiert: drei Kopfzeilen, je
+Artikel mehrere Bewegungszeilen (B Art.-Nr., D Bezeichnung, K Kolli, N Menge) und nach jeder
+Druckseite die Zeilen des Seitenumbruchs (Seitenzahl, Zwischensummen, wiederholte Überschrift,
+Lagerbuchkonto, Leerzeilen), teils türkisch beschriftet. Einzelne Mengen stehen als Text in der
+Zelle, einige davon nicht umwandelbar. Gleiche Parameter (n, seed) liefern byte-gleiche Dateien.
+"""
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from openpyxl import Workbook
+
+BEZEICHNUNGEN = ["Schraube M4x20 verzinkt", "Dübel 8 mm", "Kabelbinder schwarz 200", "Mutter M6", "Unterlegscheibe 6,4",
+                 "Winkel 40x40", "Silikon transparent", "Klebeband 50 m", "Holzschraube 4x40", "Gewindestange M8"]
+ZEILEN_JE_SEITE = 48
+SPALTEN = 14
+
+
+def _zeile(**werte) -> list:
+    # Spaltenbuchstabe → Wert, Rest leer
+    zeile = [None] * SPALTEN
+    for buchstabe, wert in werte.items():
+        zeile[ord(buchstabe) - ord("A")] = wert
+    return zeile
+
+
+def _ueberschrift() -> list:
+    return _zeile(A="Datum", B="Artikel", C="Lager", D="Bezeichnung", K="Kolli", N="Menge")
+
+
+def lagerbuch(n: int, seed: int = 1, artikel: int | None = None) -> bytes:
+    """Lagerbuch mit n Bewegungszeilen über etwa n/4 Artikel."""
+    rnd = random.Random(seed)
+    artikel = artikel or max(n // 4, 1)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Lagerbuch")
+    ws.append(_zeile(B="Lagerbuch", D=f"Mandant 01 – Stand {datetime(2024, 12, 31):%d.%m.%Y}"))
+    ws.append(_zeile(B="Lagerbuchkonto", D="Lagerbuchkonto 3100 Hauptlager"))
+    ws.append(_ueberschrift())
+    tag = datetime(2024, 1, 2)
+    seite = 1
+    for i in range(n):
+        if i and i % ZEILEN_JE_SEITE == 0:
+            # Seitenumbruch wie im Druckexport
+            ws.append(_zeile(B="Toplam", K=rnd.randint(100, 900), N=rnd.randint(1000, 9000)))
+            ws.append(_zeile(B=rnd.choice([f"Seite {seite}", f"Sayfa {seite}"])))
+            ws.append([None] * SPALTEN)
+            seite += 1
+            ws.append(_zeile(B="Lagerbuch", D=f"Seite {seite}"))
+            ws.append(_zeile(B="Lagerbuchkonto", D="Lagerbuchkonto 3100"))
+            ws.append(_ueberschrift())
+        nr = rnd.randrange(artikel)
+        menge = rnd.randint(-50, 200)
+        if rnd.random() < 0.02:
+            menge = rnd.choice([f" {menge} ", f"{menge},5"])
+        tag += timedelta(minutes=rnd.randint(1, 90))
+        ws.append(_zeile(
+            A=tag, B=str(400000 + nr), C="HL", D=BEZEICHNUNGEN[nr % len(BEZEICHNUNGEN)] + f" ({nr})",
+            E=rnd.choice(["Zugang", "Abgang", "Umbuchung"]), F=f"LS-{rnd.randint(10000, 99999)}",
+            K=rnd.randint(0, 12), N=menge,
+        ))
+    puffer = BytesIO()
+    wb.save(puffer)
+    return puffer.getvalue()
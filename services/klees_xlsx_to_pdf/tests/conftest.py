@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Die Module des Service (app.py usw.) liegen eine Ebene höher; die Tests laufen je Service: python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
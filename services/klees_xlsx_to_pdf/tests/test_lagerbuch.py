@@ -0,0 +1,156 @@
+import math
+import random
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+import app
+import synth
+
+
+# Stand vor der spaltenweisen Fassung (8435f28^, process_excel): iterrows, Prüfungen und Summen je Zeile
+def _alt_process_excel(df):
+    data_rows = []
+    for index, row in df.iterrows():
+        if index >= 3:
+            art_no = row[1] if pd.notna(row[1]) else None
+            art_name = row[3] if pd.notna(row[3]) else None
+            koli = row[10] if pd.notna(row[10]) else 0
+            menge = row[13] if pd.notna(row[13]) else 0
+            if (
+                art_no and str(art_no).strip()
+                and str(art_no).strip().lower() not in ['artikel', 'lagerbuch', 'lagerbuchkonto', '']
+                and (not art_name or str(art_name).strip().lower() not in ['lagerbuch', 'artikel', ''])
+                and not any(x in str(art_no).lower() for x in ['sayfa', 'toplam', 'seite'])
+                and not any(x in str(art_name).lower() for x in ['lagerbuch', 'artikel', 'konto'])
+            ):
+                try:
+                    koli_val = float(koli)
+                    menge_val = float(menge)
+                    data_rows.append({
+                        'art_no': str(art_no).strip(),
+                        'art_name': str(art_name).strip() if art_name else '',
+                        'koli': koli_val,
+                        'menge': menge_val,
+                        'order': index
+                    })
+                except (ValueError, TypeError):
+                    continue
+    grouped_data = {}
+    for item in data_rows:
+        art_no = item['art_no']
+        if art_no not in grouped_data:
+            grouped_data[art_no] = item
+        else:
+            grouped_data[art_no]['koli'] += item['koli']
+            grouped_data[art_no]['menge'] += item['menge']
+    result = sorted(grouped_data.values(), key=lambda x: x['order'])
+    return result
+
+
+def _gleich(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return type(a) is type(b) and a == b
+
+
+def _vergleiche(monkeypatch, df):
+    monkeypatch.setattr(app, "lies_lagerbuch", lambda file: file)
+    neu, alt = app.process_excel(df.copy()), _alt_process_excel(df.copy())
+    assert [list(z) for z in neu] == [list(z) for z in alt]
+    for z_neu, z_alt in zip(neu, alt):
+        assert all(_gleich(z_neu[k], z_alt[k]) for k in z_alt), (z_neu, z_alt)
+
+
+_NUMMERN = [400001, 400002, 400001.0, "400001", " 400002 ", 0, 0.0, False, True, "", " ", None, np.nan,
+            "Artikel", "LAGERBUCH", "Lagerbuchkonto", "Seite 2", "Sayfa 3", "Toplam", "nan"]
+_NAMEN = ["Schraube M8", " Mutter ", "", None, np.nan, 0, False, "Lagerbuch", "artikel", "Lagerbuchkonto 3100",
+          "Konto", 12, "nan"]
+_MENGEN = [0, 1, -3, 2.5, 0.1, 1e-17, 1e16, " 3 ", "1,5", "nan", "NaN", "", None, np.nan, True, False, "x"]
+
+
+def test_zufaellige_lagerbuecher_wie_vorher(monkeypatch):
+    rnd = random.Random(16)
+    for _ in range(300):
+        n = rnd.randint(0, 40)
+        spalten = {
+            1: [rnd.choice(_NUMMERN) for _ in range(n)],
+            3: [rnd.choice(_NAMEN) for _ in range(n)],
+            10: [rnd.choice(_MENGEN) for _ in range(n)],
+            13: [rnd.choice(_MENGEN) for _ in range(n)],
+        }
+        _vergleiche(monkeypatch, pd.DataFrame(spalten))
+
+
+def test_reine_zahlen_wie_vorher(monkeypatch):
+    # Ohne Textspalte bringt iterrows jede Zeile auf einen Typ: neben einer float-Spalte (z. B. Bezeichnungen nur
+    # NaN) wird aus der Artikelnummer 400001 dann "400001.0"
+    rnd = random.Random(17)
+    n = 50
+    df = pd.DataFrame({
+        1: [400000 + rnd.randrange(8) for _ in range(n)],
+        3: [rnd.randrange(3) for _ in range(n)],
+        10: [rnd.randint(-5, 12) for _ in range(n)],
+        13: [rnd.randint(-50, 200) for _ in range(n)],
+    })
+    _vergleiche(monkeypatch, df)
+    _vergleiche(monkeypatch, df.astype("float64"))
+    ohne_namen = df.copy()
+    ohne_namen[3] = np.nan
+    _vergleiche(monkeypatch, ohne_namen)
+    _vergleiche(monkeypatch, pd.DataFrame({1: [], 3: [], 10: [], 13: []}))
+
+
+def test_zusammengezaehlt_in_zeilenreihenfolge(monkeypatch):
+    # Gleitkommasummen wie bei += der Reihe nach, nicht kompensiert
+    werte = [0.1, 1e16, -1e16, 0.3, 1e-17] * 20
+    df = pd.DataFrame({1: ["400001"] * len(werte), 3: ["Schraube"] * len(werte), 10: werte, 13: werte[::-1]})
+    _vergleiche(monkeypatch, pd.concat([pd.DataFrame({1: ["Kopf"] * 3}), df], ignore_index=True))
+
+
+def _als_xlsx(zeilen) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    for zeile in zeilen:
+        ws.append(zeile)
+    puffer = BytesIO()
+    wb.save(puffer)
+    return puffer.getvalue()
+
+
+def _vergleiche_datei(daten: bytes):
+    # Stand vor dem XLSX-Leser (a34bf2b^): die ganze Tabelle über pd.read_excel(header=None)
+    alt = pd.read_excel(BytesIO(daten), header=None)
+    neu = app.lies_lagerbuch(BytesIO(daten))
+    pd.testing.assert_frame_equal(neu, alt[app.LAGERBUCH_SPALTEN])
+    ergebnis = app.process_excel(BytesIO(daten))
+    erwartet = _alt_process_excel(alt)
+    assert len(ergebnis) == len(erwartet)
+    for z_neu, z_alt in zip(ergebnis, erwartet):
+        assert list(z_neu) == list(z_alt) and all(_gleich(z_neu[k], z_alt[k]) for k in z_alt), (z_neu, z_alt)
+
+
+def test_synthetisches_lagerbuch_wie_vorher():
+    _vergleiche_datei(synth.lagerbuch(800))
+
+
+# Die Kopfzeilen haben wie jedes echte Lagerbuch Text in Spalte B. Sind B, D, K und N durchweg Zahlen, andere
+# Spalten aber nicht, weicht die Artikelnummer ab ("400001.0" statt "400001"): iterrows sah dort alle Spalten
+def test_zufaellige_lagerbuch_dateien_wie_vorher():
+    rnd = random.Random(18)
+    werte = {1: [w for w in _NUMMERN if w is not np.nan], 3: [w for w in _NAMEN if w is not np.nan],
+             10: [w for w in _MENGEN if w is not np.nan], 13: [w for w in _MENGEN if w is not np.nan]}
+    for _ in range(80):
+        zeilen = [["Lagerbuch"], ["Lagerbuchkonto"], [f"Spalte {i}" for i in range(15)]]
+        for _ in range(rnd.randint(0, 30)):
+            if rnd.random() < 0.05:
+                zeilen.append([])  # Leerzeile
+                continue
+            zeile = [rnd.choice([None, "HL", datetime(2024, 1, 2), 7]) for _ in range(15)]
+            for spalte, auswahl in werte.items():
+                zeile[spalte] = rnd.choice(auswahl)
+            zeilen.append(zeile)
+        _vergleiche_datei(_als_xlsx(zeilen))
@@ -0,0 +1,377 @@
+"""Benchmarks für den Mietabgleich (synthetische Daten, keine Kundendateien).
+
+Aufruf aus diesem Verzeichnis:
+
+    python bench_mieten.py           # Einzelvergleiche alt/neu
+    python bench_mieten.py suite     # ganzer Abgleich über eine Größenreihe, Vergleich mit Baseline (--help)
+    python bench_mieten.py last      # HTTP-Lasttest mit 1/4/16 parallelen Clients gegen den lokal gestarteten Service (--help)
+"""
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from gemeinsam import benchlauf, lasttest
+import synth
+from mieten import (
+    GOV_KEYS, MONATS_ZUORDNUNG, _norm_name, _parse_betrag, finde_suchwort_spalte, fuehre_mietabgleich_durch,
+    klassifiziere_spalte, lade_mieter_tabelle, lade_regeln, lade_regelwerk, lies_kontoauszug, normalisiere_betraege,
+    normalisiere_daten, ordne_mieter_zu, schreibe_suchtreffer,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _synth_mieter(n_mieter: int, seed: int = 1):
+    rnd = random.Random(seed)
+    eigentuemer, mieter = [], []
+    for i in range(n_mieter):
+        if rnd.random() < 0.1:
+            eigentuemer.append(f"Jobcenter Wuppertal {i}")
+        else:
+            eigentuemer.append(f"Eigentümer {i} Müller")
+        mieter.append(f"Mieter{i} Schmidt")
+    df_mieter = pd.DataFrame({"Eigentümer": eigentuemer, "Mieter": mieter})
+    mieter_row_map = {}
+    for r, name in enumerate(eigentuemer, start=2):
+        mieter_row_map.setdefault(_norm_name(name), r)
+    return df_mieter, mieter_row_map
+
+
+def _synth_such(df_mieter, n_buchungen: int, seed: int = 2):
+    rnd = random.Random(seed)
+    eigentuemer = df_mieter.iloc[:, 0].tolist()
+    mieter = df_mieter.iloc[:, 1].tolist()
+    payees, vwz = [], []
+    for j in range(n_buchungen):
+        i = rnd.randrange(len(eigentuemer))
+        if eigentuemer[i].startswith("Jobcenter"):
+            payees.append("Jobcenter Wuppertal")
+            vwz.append(f"KdU {mieter[i]} BG {j}")
+        else:
+            payees.append(eigentuemer[i])
+            vwz.append(f"Miete Whg {j % 13}")
+    df_such = pd.DataFrame({"payee": payees, "vwz": vwz})
+    df_such["__norm_payee"] = df_such["payee"].apply(_norm_name)
+    df_such["__norm_hit"] = df_such["vwz"].apply(_norm_name)
+    return df_such
+
+
+def _zuordnung_vollscan(df_mieter, df_such, mieter_row_map):
+    """Bisheriges Verfahren: je Mieter ein Vergleich über alle Buchungen."""
+    zuordnung = []
+    for _, row in df_mieter.iterrows():
+        key_norm = _norm_name(row.iloc[0])
+        excel_row = mieter_row_map.get(key_norm)
+        if not excel_row:
+            continue
+        tenant_norm = _norm_name(row.iloc[1])
+        if any(k in key_norm for k in GOV_KEYS) and tenant_norm:
+            treffer = df_such[df_such["__norm_hit"].str.contains(tenant_norm, na=False)]
+        else:
+            treffer = df_such[df_such["__norm_payee"] == key_norm]
+        if not treffer.empty:
+            zuordnung.append((excel_row, treffer))
+    return zuordnung
+
+
+def _zeit(fn, *args, wiederholungen: int = 3) -> float:
+    best = float("inf")
+    for _ in range(wiederholungen):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_zuordnung(groessen=((50, 2_000), (100, 5_000), (250, 10_000), (500, 20_000))):
+    print(f"{'Mieter':>7} {'Buchungen':>10} {'Vollscan [s]':>13} {'Index [s]':>10} {'Faktor':>7}")
+    for n_mieter, n_buchungen in groessen:
+        df_mieter, row_map = _synth_mieter(n_mieter)
+        df_such = _synth_such(df_mieter, n_buchungen)
+        t_alt = _zeit(_zuordnung_vollscan, df_mieter, df_such, row_map)
+        t_neu = _zeit(ordne_mieter_zu, df_mieter, df_such, row_map)
+        print(f"{n_mieter:>7} {n_buchungen:>10} {t_alt:>13.3f} {t_neu:>10.3f} {t_alt / t_neu:>6.1f}x")
+
+
+def _klassifikation_einzeln(texte, regeln):
+    """Bisheriges Verfahren: je Zeile bis zu 18 einzelne re.search-Aufrufe."""
+    def klassifiziere(text):
+        t = (text or "").lower()
+        for label, pats in regeln:
+            for p in pats:
+                if re.search(p, t, re.IGNORECASE):
+                    return label
+        return "Sonstiges"
+
+    def suchwort(text):
+        t = (text or "").lower()
+        for _, pats in regeln:
+            for p in pats:
+                m = re.search(p, t, re.IGNORECASE)
+                if m:
+                    return m.group(0)
+        return ""
+
+    return texte.apply(klassifiziere), [suchwort(t) for t in texte]
+
+
+def _klassifikation_regelwerk(texte, regelwerk):
+    return klassifiziere_spalte(texte, regelwerk), finde_suchwort_spalte(texte, regelwerk)
+
+
+def _synth_vwz(n: int, anteil_einmalig: float, seed: int = 3):
+    """Verwendungszwecke: überwiegend wiederkehrende Daueraufträge, ein Teil einmalige Texte."""
+    rnd = random.Random(seed)
+    monate = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober", "November", "Dezember"]
+    woerter = ["Miete", "Kaltmiete", "NK", "Nachzahlung", "Rate", "Honorar", "Strom", "Einkauf", "Whg", "Müller", "Gutschrift"]
+    texte = []
+    for j in range(n):
+        if rnd.random() < anteil_einmalig:
+            texte.append(" ".join(rnd.choice(woerter) for _ in range(5)) + f" Ref {j}")
+        else:
+            texte.append(f"{rnd.choice(woerter[:6])} {rnd.choice(monate)} Whg {rnd.randrange(300)}")
+    return pd.Series(texte)
+
+
+def bench_klassifikation(groessen=(10_000, 100_000)):
+    regeln = lade_regeln()
+    regelwerk = lade_regelwerk()
+    print(f"{'Zeilen':>8} {'einmalig':>9} {'re.search [s]':>14} {'Regelwerk [s]':>14} {'Faktor':>7}")
+    for n in groessen:
+        for anteil in (0.1, 1.0):
+            texte = _synth_vwz(n, anteil)
+            t_alt = _zeit(_klassifikation_einzeln, texte, regeln, wiederholungen=1)
+            t_neu = _zeit(_klassifikation_regelwerk, texte, regelwerk, wiederholungen=1)
+            print(f"{n:>8} {anteil:>8.0%} {t_alt:>14.3f} {t_neu:>14.3f} {t_alt / t_neu:>6.1f}x")
+
+
+def _schreibe_mieter_xlsx(pfad: str, n_mieter: int, seed: int = 4):
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "mieter"
+    kopf = ["Eigentümer", "Mieter", "Objekt"]
+    for betrag_hdr, datum_hdr in MONATS_ZUORDNUNG.values():
+        kopf += [betrag_hdr, datum_hdr]
+    ws.append(kopf)
+    for i in range(n_mieter):
+        werte = [f"Eigentümer {i}", f"Mieter {i}", f"Objekt {i % 40}"]
+        for _ in MONATS_ZUORDNUNG:
+            werte += [round(rnd.uniform(300, 1200), 2), f"0{rnd.randint(1, 9)}.01.2024"]
+        ws.append(werte)
+    wb.save(pfad)
+
+
+def _mieter_laden_alt(pfad: str):
+    """Bisheriges Verfahren: openpyxl, dann pd.read_excel und ein weiterer Lauf über Spalte A."""
+    wb = load_workbook(pfad)
+    ws = wb["mieter"]
+    df = pd.read_excel(pfad, sheet_name="mieter", dtype=str).fillna("")
+    row_map = {}
+    for r in range(1, ws.max_row + 1):
+        v = ws[f"A{r}"].value
+        if v is not None:
+            row_map.setdefault(_norm_name(v), r)
+    return wb, df, row_map
+
+
+def _messe_mieter_laden(variante: str, pfad: str):
+    # Läuft in einem frischen Prozess, damit der Spitzen-RSS nur diese Variante enthält
+    fn = _mieter_laden_alt if variante == "alt" else lade_mieter_tabelle
+    t0 = time.perf_counter()
+    fn(pfad)
+    dauer = time.perf_counter() - t0
+    rss_mb = None
+    if resource is not None:
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KiB
+    return dauer, rss_mb
+
+
+def bench_mieter_laden(groessen=(2_000, 10_000)):
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'Mieter':>7} {'Variante':>9} {'Zeit [s]':>9} {'Max-RSS [MB]':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in groessen:
+            pfad = os.path.join(tmp, f"mieter_{n}.xlsx")
+            _schreibe_mieter_xlsx(pfad, n)
+            for variante in ("alt", "neu"):
+                with ctx.Pool(1) as pool:
+                    dauer, rss = pool.apply(_messe_mieter_laden, (variante, pfad))
+                rss_txt = f"{rss:>13.1f}" if rss is not None else f"{'-':>13}"
+                print(f"{n:>7} {variante:>9} {dauer:>9.3f} {rss_txt}")
+
+
+def _synth_konto_roh(n: int, seed: int = 5):
+    """Betrags- und Datumsspalten wie nach read_excel(dtype=str): gemischte Schreibweisen."""
+    rnd = random.Random(seed)
+    betraege, daten = [], []
+    for _ in range(n):
+        b = round(rnd.uniform(-2000, 2000), 2)
+        betraege.append(rnd.choice([f"{b:.2f}".replace(".", ","), str(b), f"{b:,.2f} €".replace(",", "X").replace(".", ",").replace("X", ".")]))
+        tag, monat = rnd.randint(1, 28), rnd.randint(1, 12)
+        daten.append(rnd.choice([f"{tag:02d}.{monat:02d}.2024", f"2024-{monat:02d}-{tag:02d} 00:00:00"]))
+    return pd.Series(betraege), pd.Series(daten)
+
+
+def _normalisierung_einzeln(betraege, daten):
+    """Bisheriges Verfahren: Betrag per .apply, Datum je Buchung über die ISO/strptime-Kette."""
+    werte = betraege.apply(_parse_betrag)
+    roh = daten.astype(str).str.strip().str.replace(r"\s+", "", regex=True).str.replace("/", ".", regex=False)
+    dt = pd.to_datetime(roh, format="%d.%m.%Y", errors="coerce")
+    ergebnis = []
+    for dval, rv in zip(dt, roh):
+        if pd.notna(dval):
+            ergebnis.append((dval.month - 1, dval.strftime("%d.%m.%Y"), dval.date()))
+            continue
+        m_iso = re.search(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})", rv)
+        if m_iso:
+            parsed = datetime(int(m_iso.group(1)), int(m_iso.group(2)), int(m_iso.group(3)))
+        else:
+            parsed = datetime.strptime(rv, "%d.%m.%Y")
+        ergebnis.append((parsed.month - 1, parsed.strftime("%d.%m.%Y"), parsed.date()))
+    return werte, ergebnis
+
+
+def _normalisierung_spalten(betraege, daten):
+    return normalisiere_betraege(betraege), normalisiere_daten(daten)
+
+
+def bench_normalisierung(groessen=(10_000, 100_000)):
+    print(f"{'Zeilen':>8} {'je Zeile [s]':>13} {'Spalten [s]':>12} {'Faktor':>7}")
+    for n in groessen:
+        betraege, daten = _synth_konto_roh(n)
+        t_alt = _zeit(_normalisierung_einzeln, betraege, daten, wiederholungen=1)
+        t_neu = _zeit(_normalisierung_spalten, betraege, daten, wiederholungen=1)
+        print(f"{n:>8} {t_alt:>13.3f} {t_neu:>12.3f} {t_alt / t_neu:>6.1f}x")
+
+
+def _schreibe_konto_xlsx(pfad: str, n: int, extra_spalten: int, seed: int = 6):
+    """Bankexport mit Datum- und Zahlenzellen, Vorspann und zusätzlichen Spalten, die der Abgleich nicht braucht."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Umsätze")
+    ws.append(["Kontoauszug Girokonto"])
+    ws.append([])
+    ws.append(["Wertstellung", "Empfänger/Auftraggeber", "Verwendungszweck", "Kategorie", "Kontoname", "Betrag"]
+              + [f"Zusatz {i}" for i in range(extra_spalten)])
+    for j in range(n):
+        ws.append([datetime(2024, rnd.randint(1, 12), rnd.randint(1, 28)), f"Auftraggeber {j % 500}",
+                   f"Miete Whg {j % 300} Ref {rnd.randint(0, 10**9)}", "Miete", f"Objekt {j % 40}",
+                   round(rnd.uniform(-2000, 2000), 2)]
+                  + [rnd.choice([f"Info {rnd.randint(0, 10**6)}", rnd.uniform(0, 100), None]) for _ in range(extra_spalten)])
+    wb.save(pfad)
+
+
+def _konto_alle_spalten(pfad: str):
+    """Bisheriges Verfahren: ganzes Blatt als Text, Betrag und Wertstellung danach aus dem Text gelesen."""
+    df = pd.read_excel(pfad, dtype=str, skiprows=2).fillna("")
+    return normalisiere_betraege(df["Betrag"]), normalisiere_daten(df["Wertstellung"])
+
+
+def _konto_projiziert(pfad: str):
+    df = lies_kontoauszug(pfad)
+    return normalisiere_betraege(df["Betrag"]), normalisiere_daten(df["Wertstellung"])
+
+
+def bench_kontoauszug(groessen=((10_000, 4), (10_000, 40), (50_000, 40))):
+    print(f"{'Zeilen':>8} {'Spalten':>8} {'alle Spalten [s]':>17} {'projiziert [s]':>15} {'Faktor':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, extra in groessen:
+            pfad = os.path.join(tmp, f"konto_{n}_{extra}.xlsx")
+            _schreibe_konto_xlsx(pfad, n, extra)
+            t_alt = _zeit(_konto_alle_spalten, pfad, wiederholungen=1)
+            t_neu = _zeit(_konto_projiziert, pfad, wiederholungen=1)
+            print(f"{n:>8} {6 + extra:>8} {t_alt:>17.2f} {t_neu:>15.2f} {t_alt / t_neu:>6.1f}x")
+
+
+def _synth_suchtreffer(n: int):
+    betraege, daten = _synth_konto_roh(n)
+    df = pd.DataFrame({
+        "Empfänger/Auftraggeber": [f"Auftraggeber {j % 500}" for j in range(n)],
+        "Verwendungszweck": [f"Miete Whg {j % 300}" for j in range(n)],
+        "Betrag": normalisiere_betraege(betraege),
+        "__suchwort": "miete",
+    })
+    df["__datum"] = normalisiere_daten(daten)["tag"]
+    return df
+
+
+def _suchtreffer_zeilenweise(df):
+    """Bisheriges Verfahren: iterrows, append, danach zwei number_format-Zuweisungen je Zeile."""
+    wb = Workbook()
+    ws = wb.create_sheet("suchtreffer")
+    ws.append(["Datum", "Name", "Suchwort", "Betrag", "Verwendungszweck"])
+    for _, r in df.iterrows():
+        ws.append([r["__datum"], r["Empfänger/Auftraggeber"], str(r["__suchwort"]), r["Betrag"], r["Verwendungszweck"]])
+        row_idx = ws.max_row
+        ws.cell(row=row_idx, column=1).number_format = "DD.MM.YYYY"
+        ws.cell(row=row_idx, column=4).number_format = "#,##0.00"
+
+
+def _suchtreffer_gesamt(df):
+    schreibe_suchtreffer(Workbook(), df)
+
+
+def bench_suchtreffer(groessen=(2_000, 10_000)):
+    print(f"{'Zeilen':>8} {'zeilenweise [s]':>16} {'gesamt [s]':>11} {'Faktor':>7}")
+    for n in groessen:
+        df = _synth_suchtreffer(n)
+        t_alt = _zeit(_suchtreffer_zeilenweise, df, wiederholungen=1)
+        t_neu = _zeit(_suchtreffer_gesamt, df, wiederholungen=1)
+        print(f"{n:>8} {t_alt:>16.3f} {t_neu:>11.3f} {t_alt / t_neu:>6.1f}x")
+
+
+def _abgleich_eingabe(n_mieter: int):
+    return synth.mieter_mappe(n_mieter), synth.kontoauszug(n_mieter)
+
+
+def _abgleich(eingabe) -> bytes:
+    mieter, konto = eingabe
+    puffer = BytesIO()
+    fuehre_mietabgleich_durch(BytesIO(mieter), BytesIO(konto), ergebnis_pfad=puffer)
+    return puffer.getvalue()
+
+
+# Größe = Zahl der Mieter; der Kontoauszug hat etwa 15 Buchungen je Mieter
+SZENARIEN = [benchlauf.Szenario("mietabgleich", (100, 500, 2_000), _abgleich_eingabe, _abgleich)]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def _last_anfrage(n_mieter: int, variante: int) -> lasttest.Anfrage:
+    return lasttest.Anfrage("/process", {
+        "excel": ("mieter.xlsx", synth.mieter_mappe(n_mieter, seed=variante + 1)),
+        "konto": ("konto.xlsx", synth.kontoauszug(n_mieter, seed=variante + 1)),
+    })
+
+
+LAST = lasttest.Lastprofil(300, _last_anfrage)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["suite"]:
+        sys.exit(benchlauf.main(SZENARIEN, BASELINE, sys.argv[2:]))
+    if sys.argv[1:2] == ["last"]:
+        sys.exit(lasttest.main(LAST, os.path.dirname(os.path.abspath(__file__)), sys.argv[2:]))
+    bench_zuordnung()
+    print()
+    bench_klassifikation()
+    print()
+    bench_mieter_laden()
+    print()
+    bench_normalisierung()
+    print()
+    bench_kontoauszug()
+    print()
+    bench_suchtreffer()
@@ -0,0 +1,12 @@
+"""gunicorn-Einstellungen des Service, siehe gemeinsam/server.py.
+
+    gunicorn app:app                    # Worker = CPUs × WORKER_JE_CPU
+    python -m gemeinsam.startmessung    # Kaltstart und Speicher je Worker, mit und ohne Vorladen
+"""
+from gemeinsam import server
+
+STANDARD_PORT = 5005
+# Schwere Pakete, die alle Worker teilen sollen, auch solche, die die App erst bei Bedarf importiert
+VORLADEN_MODULE = ("numpy", "pandas", "openpyxl", "flask")
+
+globals().update(server.konfiguration(STANDARD_PORT, VORLADEN_MODULE))
@@ -0,0 +1,81 @@
+"""Buchungsjournal (SQLite) für wiederholte Mietabgleiche.
+
+Jede übernommene Buchung wird mit einem Fingerabdruck aus Datum, Betrag, Auftraggeber,
+Hash des Verwendungszwecks und Kontoname gespeichert. Ein erneuter Lauf mit einem sich
+überschneidenden Kontoauszug erkennt bekannte Buchungen per Indexzugriff; übersprungen werden
+sie nur, wenn sie in der hochgeladenen Mieterdatei auch in der gespeicherten Zielzelle stehen.
+"""
+import hashlib
+import sqlite3
+from datetime import datetime
+
+# SQLite erlaubt je Anweisung nur eine begrenzte Zahl gebundener Parameter
+_BLOCKGROESSE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buchungen (
+    bestand TEXT NOT NULL,
+    fingerabdruck TEXT NOT NULL,
+    datum TEXT NOT NULL,
+    betrag TEXT NOT NULL,
+    auftraggeber TEXT NOT NULL,
+    vwz_hash TEXT NOT NULL,
+    kontoname TEXT NOT NULL,
+    excel_zeile INTEGER,
+    monat TEXT,
+    erfasst_am TEXT NOT NULL,
+    PRIMARY KEY (bestand, fingerabdruck)
+) WITHOUT ROWID
+"""
+
+
+def vwz_hash(vwz: str) -> str:
+    return hashlib.sha1(str(vwz).encode("utf-8")).hexdigest()
+
+
+def fingerabdruck(datum: str, betrag: str, auftraggeber: str, vwz_hash_wert: str, kontoname: str) -> str:
+    teile = (datum, betrag, auftraggeber, vwz_hash_wert, kontoname)
+    return hashlib.sha1("\x1f".join(teile).encode("utf-8")).hexdigest()
+
+
+def oeffne_journal(pfad: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(pfad)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    conn.commit()
+    return conn
+
+
+def bekannte_buchungen(conn: sqlite3.Connection, bestand: str, fingerabdruecke) -> dict[str, tuple[int | None, str | None]]:
+    """Bereits erfasste Fingerabdrücke dieses Bestands mit der Zielzelle (Excel-Zeile, Monat) ihres Laufs."""
+    kandidaten = list(dict.fromkeys(fingerabdruecke))
+    bekannt: dict[str, tuple[int | None, str | None]] = {}
+    for i in range(0, len(kandidaten), _BLOCKGROESSE):
+        block = kandidaten[i:i + _BLOCKGROESSE]
+        platzhalter = ",".join("?" * len(block))
+        rows = conn.execute(
+            f"SELECT fingerabdruck, excel_zeile, monat FROM buchungen WHERE bestand = ? AND fingerabdruck IN ({platzhalter})",
+            [bestand, *block],
+        )
+        bekannt.update((fp, (zeile, monat)) for fp, zeile, monat in rows)
+    return bekannt
+
+
+def erfasse_buchungen(conn: sqlite3.Connection, bestand: str, eintraege) -> int:
+    """Speichert Einträge (dict mit fingerabdruck, datum, betrag, auftraggeber, vwz_hash, kontoname,
+    excel_zeile, monat); bereits bekannte Fingerabdrücke werden ignoriert."""
+    jetzt = datetime.now().isoformat(timespec="seconds")
+    rows = [
+        (
+            bestand, e["fingerabdruck"], e["datum"], e["betrag"], e["auftraggeber"], e["vwz_hash"],
+            e["kontoname"], e.get("excel_zeile"), e.get("monat"), jetzt,
+        )
+        for e in eintraege
+    ]
+    with conn:
+        cur = conn.executemany(
+            "INSERT OR IGNORE INTO buchungen (bestand, fingerabdruck, datum, betrag, auftraggeber, vwz_hash, "
+            "kontoname, excel_zeile, monat, erfasst_am) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return cur.rowcount
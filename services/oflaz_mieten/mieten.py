@@ -1,12 +1,29 @@
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.comments import Comment
-from openpyxl.cell.cell import MergedCell
+from openpyxl.cell.cell import Cell, MergedCell
+import json
 import os
+from contextlib import closing
+from itertools import chain, islice
 import re
-from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
-from datetime import datetime
-from openpyxl.utils import get_column_letter
+from typing import NamedTuple
+try:
+    import re._parser as sre_parse  # Python >= 3.11
+except ImportError:
+    import sre_parse
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.workbook.workbook import Workbook
+from openpyxl.worksheet.worksheet import Worksheet
+
+from journal import bekannte_buchungen, erfasse_buchungen, fingerabdruck, oeffne_journal, vwz_hash
+from gemeinsam.messung import Stoppuhr, zaehle_zeilen
+from gemeinsam.xlsx_lesen import NA_WERTE, blatt_namen, lies_zeilen, wie_read_excel
+from gemeinsam.xlsx_schreiben import lade_teilweise, speichere
 
 MONATS_ZUORDNUNG = {
     "Jan": ["Jan", "ZE-Jan"],
@@ -39,7 +56,10 @@ MONATS_NAMENS_MAPPING = {
 }
 
 BLATTNAME = "mieter"
+SUCHTREFFER_BLATT = "suchtreffer"
 MIETER_SPALTE = "A"
+# Eigentümer und Mieter: die Spalten der Mietertabelle, die die Zuordnung braucht (ab Spalte A)
+MIETER_TABELLE_SPALTEN = 2
 
 KONTO_DATUM = "Wertstellung"
 KONTO_PAYEE = "Empfänger/Auftraggeber"
@@ -47,170 +67,883 @@ KONTO_VWZ = "Verwendungszweck"
 KONTO_KATEGORIE = "Kategorie"  # optional
 KONTO_OBJEKT = "Kontoname"
 KONTO_BETRAG = "Betrag"
+KONTO_PFLICHT = [KONTO_DATUM, KONTO_PAYEE, KONTO_VWZ, KONTO_OBJEKT, KONTO_BETRAG]
+# So viele Zeilen am Anfang des Kontoauszugs werden nach der Überschrift durchsucht (Vorspann der Bank)
+KONTO_KOPF_ZEILEN = 10
 
+SONSTIGES = "Sonstiges"
+# Klassifikationsregeln; je Mandant über MIETEN_REGELN auf eine eigene Datei umstellbar
+REGELN_PFAD = os.environ.get("MIETEN_REGELN", os.path.join(os.path.dirname(os.path.abspath(__file__)), "regeln.json"))
+# Nur das Mieterblatt wird mit openpyxl geladen; beim Speichern werden nur dieses Blatt und suchtreffer ersetzt,
+# alle anderen Teile der Mappe bleiben unverändert. XLSX_PATCHEN=0 lädt und speichert die ganze Mappe.
+XLSX_PATCHEN = os.environ.get("XLSX_PATCHEN", "1") != "0"
+
+# Erweiterte Erkennung für Behörden-Eigentümer
+GOV_KEYS = ("jobcenter", "bundesagentur", "agentur", "agentur fuer arbeit", "arbeitsagentur", "stadt wuppertal")
+
+
+def _norm_name(val) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9\s]", " ", str(val).lower()).replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss")).strip()
+
+
+class Regelwerk(NamedTuple):
+    labels: list[str]
+    # (Label-Index, Pflicht-Literal, kompiliertes Muster) in Prioritätsreihenfolge
+    muster: list[tuple[int, str, re.Pattern]]
+
+
+_regelwerk_cache: dict[tuple[str, float], Regelwerk] = {}
 
-def fuehre_mietabgleich_durch(excel_pfad, konto_xlsx_pfad):
-    workbook = load_workbook(excel_pfad)
-    if BLATTNAME in workbook.sheetnames:
-        try:
-            worksheet = workbook[BLATTNAME]
-        except Exception:
-            return None
-        sheet_arg = BLATTNAME
-    else:
-        first_sheet = workbook.sheetnames[0]
-        worksheet = workbook[first_sheet]
-        sheet_arg = first_sheet
-
-    def _build_header_map(ws, max_scan_rows: int = 5) -> dict[str, str]:
-        for r in range(1, min(ws.max_row, max_scan_rows) + 1):
-            mapping: dict[str, str] = {}
-            for c in range(1, ws.max_column + 1):
-                v = ws.cell(r, c).value
-                if v is None:
-                    continue
-                name = str(v).strip()
-                if name and name not in mapping:
-                    mapping[name] = get_column_letter(c)
-            if mapping:
-                return mapping
-        return {}
 
+def lade_regeln(pfad: str | None = None) -> list[tuple[str, list[str]]]:
+    """Liest die Klassifikationsregeln als [(Label, [Regex, ...]), ...] in Prioritätsreihenfolge."""
+    with open(pfad or REGELN_PFAD, encoding="utf-8") as f:
+        daten = json.load(f)
+    regeln = []
+    for eintrag in daten.get("regeln", []):
+        label = str(eintrag.get("label", "")).strip()
+        if not label:
+            continue
+        muster = [str(m) for m in eintrag.get("muster", [])]
+        muster += [r"\b" + re.escape(str(w).lower()) + r"\b" for w in eintrag.get("stichworte", [])]
+        if muster:
+            regeln.append((label, muster))
+    if not regeln:
+        raise ValueError(f"Keine Klassifikationsregeln in {pfad or REGELN_PFAD} gefunden.")
+    return regeln
+
+
+def _pflicht_literal(muster: str) -> str:
+    """Längste ASCII-Zeichenfolge (kleingeschrieben), die in jedem Treffer vorkommen muss; "" = keine."""
     try:
-        header_map = _build_header_map(worksheet)
+        teile = list(sre_parse.parse(muster))
     except Exception:
-        header_map = {}
+        return ""
+    best = cur = ""
+    for op, av in teile:
+        if op is sre_parse.LITERAL and chr(av).isascii():
+            cur += chr(av).lower()
+        elif op is sre_parse.AT:
+            # Anker wie \b verbrauchen keine Zeichen
+            continue
+        else:
+            best = max(best, cur, key=len)
+            cur = ""
+    return max(best, cur, key=len)
+
+
+def kompiliere_regeln(regeln) -> Regelwerk:
+    """Kompiliert alle Muster einmalig und bestimmt je Muster ein Pflicht-Literal als Vorfilter."""
+    labels = [label for label, _ in regeln]
+    muster = [
+        (i, _pflicht_literal(m), re.compile(m, re.IGNORECASE))
+        for i, (_, ms) in enumerate(regeln)
+        for m in ms
+    ]
+    return Regelwerk(labels=labels, muster=muster)
+
+
+def lade_regelwerk(pfad: str | None = None) -> Regelwerk:
+    """Lädt und kompiliert die Regeldatei; bleibt bis zur nächsten Änderung der Datei gecacht."""
+    pfad = pfad or REGELN_PFAD
+    key = (os.path.abspath(pfad), os.path.getmtime(pfad))
+    regelwerk = _regelwerk_cache.get(key)
+    if regelwerk is None:
+        regelwerk = kompiliere_regeln(lade_regeln(pfad))
+        _regelwerk_cache[key] = regelwerk
+    return regelwerk
+
+
+def _werte_regeln_aus(texte: pd.Series, regelwerk: Regelwerk) -> tuple[np.ndarray, np.ndarray]:
+    """Label-Index des ersten passenden Musters (-1 = keins) und Treffertext je Zeile.
+
+    Jeder unterschiedliche Text wird nur einmal ausgewertet (Daueraufträge und Kategorien
+    wiederholen sich stark). Ein Muster wird nur gesucht, wenn sein Pflicht-Literal im Text
+    steht; bei Nicht-ASCII-Texten entfällt der Vorfilter, damit Sonderfälle der
+    Groß-/Kleinschreibung (z. B. "ſ") wie bei ``re.IGNORECASE`` behandelt werden.
+    """
+    codes, uniques = pd.factorize(texte.astype(str).str.lower())
+    label_idx = np.full(len(uniques) + 1, -1, dtype=np.intp)
+    treffer = np.full(len(uniques) + 1, "", dtype=object)
+    muster = regelwerk.muster
+    for u, text in enumerate(uniques):
+        ascii_text = text.isascii()
+        for i, literal, regex in muster:
+            if ascii_text and literal not in text:
+                continue
+            m = regex.search(text)
+            if m is not None:
+                label_idx[u] = i
+                treffer[u] = m.group(0)
+                break
+    return label_idx[codes], treffer[codes]
+
+
+def klassifiziere_spalte(texte: pd.Series, regelwerk: Regelwerk) -> pd.Series:
+    """Label der ersten passenden Regel je Text, sonst ``SONSTIGES``."""
+    label_idx, _ = _werte_regeln_aus(texte, regelwerk)
+    labels = np.asarray(regelwerk.labels + [SONSTIGES], dtype=object)
+    return pd.Series(labels[label_idx], index=texte.index, dtype=object)
+
+
+def finde_suchwort_spalte(texte: pd.Series, regelwerk: Regelwerk) -> pd.Series:
+    """Gefundenes Suchwort des ersten passenden Musters je Text (kleingeschrieben), sonst ``""``."""
+    _, treffer = _werte_regeln_aus(texte, regelwerk)
+    return pd.Series(treffer, index=texte.index, dtype=object)
 
-    df_mieter = pd.read_excel(excel_pfad, sheet_name=sheet_arg, dtype=str)
-    df_mieter = df_mieter.fillna("")
+
+def _trie_muster(namen) -> str:
+    trie: dict = {}
+    for name in namen:
+        node = trie
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def _knoten(node) -> str:
+        zweige = [re.escape(ch) + _knoten(sub) for ch, sub in sorted(node.items()) if ch]
+        if not zweige:
+            return ""
+        muster = zweige[0] if len(zweige) == 1 else "(?:" + "|".join(zweige) + ")"
+        if "" in node:
+            # Name endet hier, längere Namen werden (gierig) bevorzugt
+            return "(?:" + muster + ")?"
+        return muster
+
+    return _knoten(trie)
+
+
+def finde_namen_in_texten(texte, namen) -> dict[str, np.ndarray]:
+    """Sucht alle Namen in einem Durchlauf als Teilstring in den Texten.
+
+    Liefert je Name die (aufsteigenden) Positionen der Texte, die ihn enthalten – dieselbe
+    Semantik wie ``texte.str.contains(name)`` je Name, aber mit einem einzigen Regex-Lauf
+    über alle Texte. Die Namen werden dazu als Trie in ein Muster kompiliert; je Startposition
+    liefert das Muster den längsten passenden Namen, kürzere Namen an derselben Position sind
+    genau dessen Präfixe.
+    """
+    namen = sorted({n for n in namen if n})
+    ergebnis = {n: np.empty(0, dtype=np.intp) for n in namen}
+    if not namen:
+        return ergebnis
+    praefixe = {n: [p for p in namen if n.startswith(p)] for n in namen}
+    muster = re.compile("(?=(" + _trie_muster(namen) + "))")
+
+    texte = ["" if t is None else str(t) for t in texte]
+    # Normalisierte Texte enthalten keinen Zeilenumbruch, Treffer können also keine Textgrenze überspannen
+    gesamt = "\n".join(texte)
+    starts = np.cumsum([0] + [len(t) + 1 for t in texte[:-1]])
+
+    treffer_pos: dict[str, list[int]] = {}
+    for m in muster.finditer(gesamt):
+        for n in praefixe[m.group(1)]:
+            treffer_pos.setdefault(n, []).append(m.start())
+    for n, pos in treffer_pos.items():
+        zeilen = np.searchsorted(starts, np.asarray(pos), side="right") - 1
+        ergebnis[n] = np.unique(zeilen)
+    return ergebnis
+
+
+def ordne_mieter_zu(df_mieter, df_such, mieter_row_map):
+    """Ordnet jedem Mieter seine Buchungen aus df_such zu.
+
+    Liefert eine Liste von (Excel-Zeile, Positionen in df_such) in Reihenfolge der Mieterliste.
+    Die Auftraggeber werden dafür einmalig über ``__norm_payee`` indiziert, die Mieternamen bei
+    Behördenzahlungen gemeinsam über ``finde_namen_in_texten`` gesucht, statt df_such je Mieter
+    komplett zu durchsuchen.
+    """
     mieter_col_name = df_mieter.columns[0]
     mieter_b_col_name = df_mieter.columns[1] if len(df_mieter.columns) > 1 else None
-    objekt_col_name = df_mieter.columns[2] if len(df_mieter.columns) > 2 else None
+    payee_index = df_such.groupby("__norm_payee", sort=False).indices if len(df_such) else {}
+
+    kandidaten = []
+    for idx, m_name in df_mieter[mieter_col_name].items():
+        if not m_name:
+            continue
+        key_norm = _norm_name(m_name)
+        excel_row = mieter_row_map.get(key_norm)
+        if not excel_row:
+            continue
 
-    mieter_row_map = {}
+        owner_norm = key_norm
+        tenant_norm = _norm_name(df_mieter.at[idx, mieter_b_col_name] if mieter_b_col_name else "")
+        # Bei Behördenzahlungen: Suche Mieternamen im vollständigen Verwendungszweck
+        if any(k in owner_norm for k in GOV_KEYS) and tenant_norm:
+            kandidaten.append((excel_row, None, tenant_norm))
+        else:
+            kandidaten.append((excel_row, owner_norm, None))
+
+    # Alle Mieternamen der Behördenzahlungen gemeinsam in einem Lauf über den VWZ suchen
+    behoerden_namen = {t for (_, __, t) in kandidaten if t}
+    namens_index = {}
+    if behoerden_namen:
+        source_series = df_such.get("__norm_hit", df_such["__norm_payee"])
+        namens_index = finde_namen_in_texten(source_series.tolist(), behoerden_namen)
+
+    zuordnung = []
+    for excel_row, owner_norm, tenant_norm in kandidaten:
+        if tenant_norm:
+            positions = namens_index.get(tenant_norm)
+        else:
+            positions = payee_index.get(owner_norm)
+        if positions is None or len(positions) == 0:
+            continue
+        zuordnung.append((excel_row, positions))
+    return zuordnung
+
+
+_ISO_DATUM = re.compile(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})")
+_BETRAG_ENDE = re.compile(r"(\d+)[,\.](\d{1,2})$")
+
+
+def _parse_betrag(raw) -> float:
+    """Einzelwert-Erkennung eines Betrags ("1.234,56", "-12.5 €" …); NaN, wenn nichts erkennbar ist."""
+    s = (str(raw) or "").strip().replace("€", "").replace("\xa0", "").replace(" ", "")
+    if not s:
+        return np.nan
+    if "," in s:
+        s2 = s.replace(".", "").replace(",", ".")
+        try:
+            return float(s2)
+        except Exception:
+            pass
     try:
-        for r in range(1, worksheet.max_row + 1):
-            cell_val = worksheet[f"{MIETER_SPALTE}{r}"].value
-            if cell_val is None:
-                continue
-            key = str(cell_val)
-            key = re.sub(r"[^a-z0-9\s]", " ", key.lower())
-            key = key.replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss")
-            key = re.sub(r"\s+", " ", key).strip()
-            if key and key not in mieter_row_map:
-                mieter_row_map[key] = r
+        return float(s)
     except Exception:
-        pass
+        m = _BETRAG_ENDE.search(s)
+        if m:
+            try:
+                return float(m.group(1) + "." + m.group(2))
+            except Exception:
+                pass
+    return np.nan
+
+
+def normalisiere_betraege(roh: pd.Series) -> pd.Series:
+    """Beträge spaltenweise als float64 (NaN = unlesbar).
+
+    Zahlenspalten (aus Zellen mit Zahlenwert) werden direkt übernommen. Bei Text wird jeder eindeutige
+    Rohwert nur einmal umgewandelt; der Normalfall läuft über pd.to_numeric, nur was dort nicht lesbar
+    ist, geht durch _parse_betrag, damit das Ergebnis exakt der Einzelwert-Erkennung entspricht.
+    """
+    if is_numeric_dtype(roh) and not is_bool_dtype(roh):
+        return roh.astype("float64")
+    codes, eindeutig = pd.factorize(roh.astype(str), use_na_sentinel=False)
+    e = pd.Series(eindeutig, dtype=object)
+    s = (
+        e.str.strip()
+        .str.replace("€", "", regex=False).str.replace("\xa0", "", regex=False).str.replace(" ", "", regex=False)
+    )
+    mit_komma = s.str.contains(",", regex=False)
+    kandidat = s.where(~mit_komma, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    werte = pd.to_numeric(kandidat, errors="coerce").astype("float64")
+    offen = werte.isna() & (s != "")
+    if offen.any():
+        werte[offen] = [_parse_betrag(v) for v in e[offen]]
+    return pd.Series(werte.to_numpy()[codes], index=roh.index, dtype="float64")
 
+
+def _datum_aus_text(rv: str) -> tuple[int | None, str, date | None]:
+    """Rückfall für Texte, die nicht als TT.MM.JJJJ lesbar waren: (Monat 1–12, Anzeige, Datum).
+
+    Ein ISO-Datum liefert den Monat auch dann, wenn der Tag ungültig ist; die Anzeige bleibt dann der Rohtext.
+    """
+    m_iso = _ISO_DATUM.search(rv)
+    if m_iso:
+        monat = int(m_iso.group(2))
+        try:
+            parsed = datetime(int(m_iso.group(1)), int(m_iso.group(2)), int(m_iso.group(3)))
+        except ValueError:
+            return monat, rv, None
+        return monat, parsed.strftime("%d.%m.%Y"), parsed.date()
     try:
-        df_konto = pd.read_excel(konto_xlsx_pfad, dtype=str)
-    except Exception:
+        parsed = datetime.strptime(rv.replace("/", "."), "%d.%m.%Y")
+    except ValueError:
+        return None, rv, None
+    return parsed.month, parsed.strftime("%d.%m.%Y"), parsed.date()
+
+
+def _normalisiere_daten_eindeutig(s: pd.Series) -> pd.DataFrame:
+    if is_datetime64_any_dtype(s):
+        datum = s
+        roh = s.dt.strftime("%d.%m.%Y").fillna("")
+    elif is_numeric_dtype(s):
+        datum = pd.to_datetime(s, unit="d", origin="1899-12-30", errors="coerce")
+        roh = datum.dt.strftime("%d.%m.%Y")
+    else:
+        roh = s.astype(str).str.strip().str.replace(r"\s+", "", regex=True).str.replace("/", ".", regex=False)
+        datum = pd.to_datetime(roh, format="%d.%m.%Y", errors="coerce")
+
+    gueltig = datum.notna()
+    monat = datum.dt.month.fillna(0).astype("int64")
+    anzeige = datum.dt.strftime("%d.%m.%Y").astype(object)
+    tag = pd.Series(datum.dt.date, index=s.index, dtype=object)
+
+    offen = ~gueltig
+    if offen.any():
+        werte = [_datum_aus_text(str(v or "").strip()) for v in roh[offen]]
+        monat[offen] = [m or 0 for m, _, _ in werte]
+        anzeige[offen] = [a for _, a, _ in werte]
+        tag[offen] = [d for _, _, d in werte]
+
+    monat_idx = (monat - 1).where(monat.between(1, 12), -1)
+    return pd.DataFrame({"datum": datum, "roh": roh, "monat_idx": monat_idx, "anzeige": anzeige, "tag": tag})
+
+
+def normalisiere_daten(s: pd.Series) -> pd.DataFrame:
+    """Wertstellung einmal für alle Zeilen auflösen, je eindeutigem Rohwert nur einmal.
+
+    Spalten: datum (datetime64, NaT wenn nur per Rückfall lesbar), roh (Text für Fehlermeldungen/Journal),
+    monat_idx (0 = Jan … 11 = Dez, -1 = unbekannt), anzeige (TT.MM.JJJJ oder Rohtext), tag (date oder None).
+    """
+    codes, eindeutig = pd.factorize(s, use_na_sentinel=False)
+    teil = _normalisiere_daten_eindeutig(pd.Series(eindeutig))
+    return teil.take(codes).set_axis(s.index)
+
+
+def _norm_ddmmyyyy(s: str) -> str:
+    s = (s or "").strip()
+    m = re.match(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?$", s)
+    if not m:
+        return s
+    d = int(m.group(1)); mth = int(m.group(2)); yr = m.group(3)
+    if yr is None:
+        return f"{d:02d}.{mth:02d}"
+    return f"{d:02d}.{mth:02d}.{int(yr):04d}"
+
+
+def _parse_pairs(txt: str):
+    pairs = []
+    seen = set()
+    if not txt:
+        return pairs
+    for line in txt.splitlines():
+        m = re.search(r"(\d{1,2}\.\d{1,2}(?:\.\d{2,4})?)\s*(?:\[(.*?)\])?\s*:\s*([+-]?\d+(?:[.,]\d+)?)", line)
+        if not m:
+            continue
+        d = _norm_ddmmyyyy(m.group(1))
+        try:
+            amt = round(float(m.group(3).replace(".", "").replace(",", ".")), 2)
+        except Exception:
+            continue
+        key = (d, amt)
+        if key in seen:
+            continue
+        seen.add(key)
+        pairs.append((d, amt, m.group(1), (m.group(2) or "").strip()))
+    return pairs
+
+
+def _format_betrag(betrag: float) -> str:
+    return str(f"{betrag:.2f}").replace(".", ",")
+
+
+def _format_pair(pair) -> str:
+    _, amt, disp, kword = pair
+    tag = f"{disp}"
+    if kword:
+        tag += f" [{kword}]"
+    return f"{tag}: {_format_betrag(amt)} EUR"
+
+
+def _als_datum(val):
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    parsed = pd.to_datetime(val, dayfirst=True, errors="coerce")
+    if pd.isna(parsed):
         return None
+    return (parsed.to_pydatetime() if hasattr(parsed, "to_pydatetime") else parsed).date()
 
-    df_konto = df_konto.fillna("")
 
-    required_cols = [KONTO_DATUM, KONTO_PAYEE, KONTO_VWZ, KONTO_OBJEKT, KONTO_BETRAG]
-    missing = [c for c in required_cols if c not in df_konto.columns]
-    if missing:
-        raise ValueError(f"Fehlende Spalten im Kontoauszug: {', '.join(missing)}. Bitte per Überschrift bereitstellen.")
+class Buchung(NamedTuple):
+    excel_row: int
+    monat_idx: int  # 0 = Jan … 11 = Dez
+    betrag: float
+    datum_str: str  # TT.MM.JJJJ, wie im Kommentar
+    datum: date | None
+    suchwort: str
+    fingerabdruck: str = ""
+
+
+@dataclass
+class DatumsZelle:
+    """Zustand einer (ggf. zusammengeführten) ZE-Zelle: Datum und Kommentar mit Zahlungspaaren."""
+    koordinate: str
+    wert: object
+    paare: list = field(default_factory=list)
+    zeilen: list = field(default_factory=list)
+    kommentar_basis: int = 0
+    kommentar_neu: list | None = None
+    geaendert: bool = False
+
+    def kommentar(self) -> str | None:
+        if self.kommentar_neu is None:
+            return None
+        return "\n".join(self.zeilen[:self.kommentar_basis] + self.kommentar_neu)
+
+    def _setze_paare(self, paare):
+        self.paare = list(paare)
+        self.zeilen = [_format_pair(p) for p in self.paare]
+
+    def _ergaenze_paare(self, text: str):
+        # gleiches Ergebnis wie _parse_pairs auf dem kompletten neuen Kommentar: bereits geparste
+        # Paare ergeben formatiert und erneut geparst wieder dieselben Paare
+        keys = {(d, a) for (d, a, _, __) in self.paare}
+        for p in _parse_pairs(text):
+            if (p[0], p[1]) not in keys:
+                keys.add((p[0], p[1]))
+                self.paare.append(p)
+                self.zeilen.append(_format_pair(p))
+
+
+@dataclass
+class MonatsZelle:
+    """Betrag eines Mieters in einem Monat samt übernommener und als Dublette erkannter Buchungen."""
+    excel_row: int
+    monat: str
+    betrag_zelle: str
+    datum_zelle: str
+    betrag: float
+    betrag_alt: float
+    uebernommen: list = field(default_factory=list)
+    dubletten: list = field(default_factory=list)
 
-    df_konto["__betrag_raw"] = df_konto[KONTO_BETRAG].astype(str)
 
-    def _parse_amount_raw(raw: str):
-        s = (str(raw) or "").strip().replace("€", "").replace("\xa0", "").replace(" ", "")
-        if not s:
-            return pd.NA
-        if "," in s:
-            s2 = s.replace(".", "").replace(",", ".")
+@dataclass
+class AbgleichPlan:
+    monate: dict = field(default_factory=dict)  # Betragszelle (bei verbundenen Zellen die obere linke) -> MonatsZelle
+    datums_zellen: dict = field(default_factory=dict)  # Koordinate -> DatumsZelle
+
+    def geaenderte_monate(self):
+        return [m for m in self.monate.values() if m.uebernommen]
+
+
+def _betrag_aus_zelle(v) -> float:
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        return float(str(v).replace(".", "").replace(",", ".")) if v else 0.0
+    except Exception:
+        return 0.0
+
+
+def plane_buchungen(buchungen, header_map, zelle_lesen, zelle_aufloesen=None) -> AbgleichPlan:
+    """Erster Schritt des Abgleichs: alle Buchungen im Speicher je (Excel-Zeile, Monat) einplanen.
+
+    ``zelle_lesen(koordinate)`` liefert (Wert, Kommentartext) der Ausgangsdatei,
+    ``zelle_aufloesen(koordinate)`` die beschreibbare Zelle (Betrag und Datum) bei zusammengeführten Bereichen.
+    Dubletten (bereits im Kommentar bzw. als einzelner Vorbetrag vorhanden) werden erkannt, der
+    Betrag summiert und bei mehreren Zahlungen im Monat das früheste Datum gewählt – mit demselben
+    Ergebnis wie die frühere Verarbeitung Buchung für Buchung direkt im Arbeitsblatt, aber ohne
+    Kommentare je Buchung neu zu parsen.
+    """
+    plan = AbgleichPlan()
+    monate = list(MONATS_ZUORDNUNG.keys())
+    zellen = {}  # (Excel-Zeile, Monat) -> (Betragszelle, Datumszelle), aufgelöst
+    for b in buchungen:
+        if b.monat_idx < 0 or b.monat_idx > 11:
+            continue
+        ziel = monate[b.monat_idx]
+        betrag_hdr, datum_hdr = MONATS_ZUORDNUNG[ziel]
+        betrag_letter = header_map.get(betrag_hdr)
+        datum_letter = header_map.get(datum_hdr)
+        if not betrag_letter or not datum_letter:
+            continue
+
+        betrag_cell, datum_cell = zellen.get((b.excel_row, ziel)) or (None, None)
+        if betrag_cell is None:
+            betrag_cell = f"{betrag_letter}{b.excel_row}"
+            datum_cell = f"{datum_letter}{b.excel_row}"
+            if zelle_aufloesen is not None:
+                betrag_cell = zelle_aufloesen(betrag_cell)
+                datum_cell = zelle_aufloesen(datum_cell)
+            zellen[(b.excel_row, ziel)] = betrag_cell, datum_cell
+        # Monate in einem verbundenen Bereich (z. B. "Leerstand") teilen sich die Betragszelle und werden summiert
+        monat = plan.monate.get(betrag_cell)
+        if monat is None:
+            alt = _betrag_aus_zelle(zelle_lesen(betrag_cell)[0])
+            monat = MonatsZelle(b.excel_row, ziel, betrag_cell, datum_cell, alt, alt)
+            plan.monate[betrag_cell] = monat
+        dz = plan.datums_zellen.get(monat.datum_zelle)
+        if dz is None:
+            wert, kommentar = zelle_lesen(monat.datum_zelle)
+            dz = DatumsZelle(monat.datum_zelle, wert)
+            dz._setze_paare(_parse_pairs(kommentar or ""))
+            plan.datums_zellen[monat.datum_zelle] = dz
+
+        existing_amount = monat.betrag
+        prev_cell_val = dz.wert
+        new_key = (_norm_ddmmyyyy(b.datum_str), round(float(b.betrag), 2))
+        if any((d, a) == new_key for (d, a, _, __) in dz.paare):
+            monat.dubletten.append(b)
+            continue
+        prev_str = prev_cell_val.strftime("%d.%m.%Y") if hasattr(prev_cell_val, "strftime") else (str(prev_cell_val) if prev_cell_val else "")
+        if (existing_amount > 0.0) and not dz.paare:
+            prev_key = (_norm_ddmmyyyy(prev_str), round(existing_amount, 2))
+            if prev_key == new_key:
+                monat.dubletten.append(b)
+                continue
+
+        monat.betrag = existing_amount + float(b.betrag)
+        monat.uebernommen.append(b)
+        dz.geaendert = True
+        # Datum setzen: bei Mehrfacheinträgen im Monat das früheste Datum in ZE schreiben
+        has_previous_in_month = (existing_amount > 0.0) or (len(dz.paare) > 0)
+        if has_previous_in_month:
+            prev_dt = None
             try:
-                return float(s2)
+                if prev_cell_val:
+                    prev_dt = _als_datum(prev_cell_val)
             except Exception:
-                pass
+                prev_dt = None
+            new_dt = b.datum
+            dz.wert = new_dt if prev_dt is None else (prev_dt if (new_dt is None or prev_dt <= new_dt) else new_dt)
+
+            new_line = _zahlungs_zeile(b)
+            if dz.paare:
+                dz.kommentar_basis = len(dz.zeilen)
+                dz.kommentar_neu = [new_line]
+            else:
+                dz.kommentar_basis = 0
+                dz.kommentar_neu = ([f"{prev_str}: {_format_betrag(existing_amount)} EUR"] if prev_str else []) + [new_line]
+                dz._setze_paare([])
+            dz._ergaenze_paare("\n".join(dz.kommentar_neu))
+        else:
+            dz.wert = b.datum
+            dz.kommentar_basis = 0
+            dz.kommentar_neu = None
+            dz._setze_paare([])
+    return plan
+
+
+def _zahlungs_zeile(b: Buchung) -> str:
+    tag = b.datum_str
+    if b.suchwort:
+        tag += f" [{b.suchwort}]"
+    return f"{tag}: {_format_betrag(float(b.betrag))} EUR"
+
+
+def _get_writable_cell(ws, coord):
+    c = ws[coord]
+    if isinstance(c, MergedCell):
+        for r in ws.merged_cells.ranges:
+            if coord in r:
+                return ws.cell(row=r.min_row, column=r.min_col)
+    return c
+
+
+def wende_plan_an(worksheet, plan: AbgleichPlan) -> None:
+    """Zweiter Schritt: jede geänderte Zelle genau einmal ins Arbeitsblatt schreiben."""
+    betrag_zahlungen = {}
+    for monat in plan.geaenderte_monate():
+        betrag_cell = _get_writable_cell(worksheet, monat.betrag_zelle)
+        betrag_cell.value = monat.betrag
         try:
-            return float(s)
+            betrag_cell.number_format = "#,##0.00"
         except Exception:
-            m = re.search(r"(\d+)[,\.](\d{1,2})$", s)
-            if m:
-                try:
-                    return float(m.group(1) + "." + m.group(2))
-                except Exception:
-                    pass
-        return pd.NA
+            pass
+        betrag_zahlungen[betrag_cell.coordinate] = "\n".join(_zahlungs_zeile(b) for b in monat.uebernommen)
+    for dz in plan.datums_zellen.values():
+        if not dz.geaendert:
+            continue
+        date_cell = _get_writable_cell(worksheet, dz.koordinate)
+        text = dz.kommentar()
+        if date_cell.coordinate in betrag_zahlungen:
+            # Betrag und ZE im selben zusammengeführten Bereich (z. B. "Leerstand" über mehrere Monate): der Betrag
+            # bleibt stehen, die Zahlungen stehen nur im Kommentar (für die Dublettenprüfung beim nächsten Lauf)
+            text = text or betrag_zahlungen[date_cell.coordinate]
+        else:
+            try:
+                date_cell.value = dz.wert
+            except Exception:
+                date_cell.value = None
+            date_cell.number_format = "DD.MM.YYYY"
+        date_cell.comment = Comment(text, "System") if text is not None else None
 
-    df_konto[KONTO_BETRAG] = df_konto["__betrag_raw"].apply(_parse_amount_raw)
 
-    s = df_konto[KONTO_DATUM]
-    if is_datetime64_any_dtype(s):
-        df_konto["__raw_date"] = s.dt.strftime("%d.%m.%Y")
-    elif is_numeric_dtype(s):
-        dt = pd.to_datetime(s, unit="d", origin="1899-12-30", errors="coerce")
-        df_konto["__raw_date"] = dt.dt.strftime("%d.%m.%Y")
-        df_konto[KONTO_DATUM] = dt
+def steht_in_mappe(ws, header_map, excel_zeile, monat, datum_str: str, betrag: float) -> bool:
+    """Ob eine Buchung in der Mieterdatei eingetragen ist: als Zahlungspaar im Kommentar der ZE-Zelle oder, als
+    einzige Zahlung im Monat, als Datum und Betrag der Zellen (dieselbe Prüfung wie die Dublettenerkennung)."""
+    spalten = MONATS_ZUORDNUNG.get(monat)
+    if not excel_zeile or spalten is None:
+        return False
+    betrag_letter, datum_letter = header_map.get(spalten[0]), header_map.get(spalten[1])
+    if not betrag_letter or not datum_letter:
+        return False
+    betrag_zelle = _get_writable_cell(ws, f"{betrag_letter}{excel_zeile}")
+    datum_zelle = _get_writable_cell(ws, f"{datum_letter}{excel_zeile}")
+    schluessel = (_norm_ddmmyyyy(datum_str), round(float(betrag), 2))
+    paare = _parse_pairs(datum_zelle.comment.text if datum_zelle.comment else "")
+    if paare:
+        return any((d, a) == schluessel for (d, a, _, __) in paare)
+    wert = datum_zelle.value
+    datum_text = wert.strftime("%d.%m.%Y") if hasattr(wert, "strftime") else (str(wert) if wert else "")
+    return (_norm_ddmmyyyy(datum_text), round(_betrag_aus_zelle(betrag_zelle.value), 2)) == schluessel
+
+
+def _stil_mit_format(ws, number_format: str):
+    vorlage = Cell(ws)
+    vorlage.number_format = number_format
+    return vorlage._style
+
+
+def schreibe_suchtreffer(workbook, df_such) -> Worksheet:
+    """Prüfblatt "suchtreffer" mit allen klassifizierten Buchungen (ersetzt ein vorhandenes Blatt).
+
+    Die Zeilen werden direkt aus den normalisierten Spalten gebaut; alle Datums- bzw. Betragszellen
+    teilen sich ein vorab angelegtes Zellformat.
+    """
+    if SUCHTREFFER_BLATT in workbook.sheetnames:
+        del workbook[SUCHTREFFER_BLATT]
+    ws = workbook.create_sheet(SUCHTREFFER_BLATT)
+    ws.append(["Datum", "Name", "Suchwort", "Betrag", "Verwendungszweck"])
+    datum_stil = _stil_mit_format(ws, "DD.MM.YYYY")
+    betrag_stil = _stil_mit_format(ws, "#,##0.00")
+    zeilen = zip(
+        df_such["__datum"].tolist(),
+        df_such[KONTO_PAYEE].tolist(),
+        df_such["__suchwort"].astype(str).tolist(),
+        df_such[KONTO_BETRAG].tolist(),
+        df_such[KONTO_VWZ].tolist(),
+    )
+    for datum, name, suchwort, betrag, vwz in zeilen:
+        ws.append([
+            Cell(ws, value=datum, style_array=datum_stil),
+            name,
+            suchwort,
+            Cell(ws, value=None if pd.isna(betrag) else betrag, style_array=betrag_stil),
+            vwz,
+        ])
+    return ws
+
+
+class MieterTabelle(NamedTuple):
+    workbook: Workbook
+    worksheet: Worksheet
+    header_map: dict[str, str]
+    df_mieter: pd.DataFrame
+    mieter_row_map: dict[str, int]
+
+
+def _zelle_als_text(v) -> str:
+    # wie pd.read_excel(dtype=str): ganzzahlige Floats ohne ".0", leere Zellen als ""
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def lade_mieter_tabelle(excel_pfad, max_scan_rows: int = 5) -> MieterTabelle | None:
+    """Öffnet die Mieterdatei genau einmal und leitet alles Benötigte in einem Durchlauf ab.
+
+    Liefert Workbook und Arbeitsblatt (zum späteren Schreiben), die Zuordnung Überschrift →
+    Spaltenbuchstabe, die Mietertabelle als Strings (wie ``pd.read_excel(dtype=str)``: Zeile 1
+    als Überschrift; nur die MIETER_TABELLE_SPALTEN, die ordne_mieter_zu liest) und die Zuordnung
+    normalisierter Name → erste Excel-Zeile. Nach den ersten max_scan_rows Zeilen (Überschriften)
+    werden nur noch diese Spalten und MIETER_SPALTE gelesen.
+    """
+    if XLSX_PATCHEN:
+        namen = blatt_namen(excel_pfad)
+        workbook = lade_teilweise(excel_pfad, [BLATTNAME if BLATTNAME in namen else namen[0]] if namen else [])
     else:
-        s2 = (s.astype(str).str.strip().str.replace(r"\s+", "", regex=True).str.replace("/", ".", regex=False))
-        df_konto["__raw_date"] = s2
-        df_konto[KONTO_DATUM] = pd.to_datetime(s2, format="%d.%m.%Y", errors="coerce")
-
-    def klassifiziere(text: str) -> str:
-        t = (text or "").lower()
-        patterns = [
-            ("Miete", [r"\bmiet\w*\b", r"\bkm\b", r"\bkaltmiete\b", r"\bstellplatz\b", r"\bgarage\b"]),
-            ("Nebenkosten", [r"\bnebenkosten\b", r"\bnk\b", r"\bbetriebskosten\b", r"\bbk\b", r"\bhausgeld\b", r"\bheizkosten\b"]),
-            ("Nachzahlung", [r"\bnach\-?zahlung\b", r"\bnachz\b"]),
-            ("Rate", [r"\brate(nzahlung)?\b"]),
-            ("Honorar", [r"\bhonorar\b"]),
-        ]
-        for label, pats in patterns:
-            for p in pats:
-                if re.search(p, t, re.IGNORECASE):
-                    return label
-        return "Sonstiges"
+        workbook = load_workbook(excel_pfad)
+    if BLATTNAME in workbook.sheetnames:
+        try:
+            worksheet = workbook[BLATTNAME]
+        except Exception:
+            return None
+    else:
+        worksheet = workbook[workbook.sheetnames[0]]
+
+    mieter_col_idx = column_index_from_string(MIETER_SPALTE) - 1
+    kopf_zeilen = min(max_scan_rows, worksheet.max_row)
+    werte_zeilen = chain(
+        worksheet.iter_rows(max_row=kopf_zeilen, values_only=True),
+        worksheet.iter_rows(min_row=kopf_zeilen + 1, max_col=max(MIETER_TABELLE_SPALTEN, mieter_col_idx + 1),
+                            values_only=True),
+    )
+    header_map: dict[str, str] = {}
+    header_done = False
+    kopf: list = []
+    zeilen = []
+    breite = 0
+    mieter_row_map: dict[str, int] = {}
+
+    for r, values in enumerate(werte_zeilen, start=1):
+        if not header_done and r <= max_scan_rows:
+            for c, v in enumerate(values, start=1):
+                if v is None:
+                    continue
+                name = str(v).strip()
+                if name and name not in header_map:
+                    header_map[name] = get_column_letter(c)
+            header_done = bool(header_map)
+
+        cell_val = values[mieter_col_idx] if mieter_col_idx < len(values) else None
+        if cell_val is not None:
+            key = _norm_name(cell_val)
+            if key and key not in mieter_row_map:
+                mieter_row_map[key] = r
+
+        texte = [_zelle_als_text(v) for v in values[:MIETER_TABELLE_SPALTEN]]
+        while texte and texte[-1] == "":
+            texte.pop()
+        if r == 1:
+            # Überschriften behalten wie bei pd.read_excel ihren Typ (z. B. 2024 als Zahl)
+            kopf = [wie_read_excel(v) for v in values[:len(texte)]]
+        else:
+            # Texte wie "NA" liest pd.read_excel als fehlend, mit dtype=str und fillna also als ""
+            zeilen.append(["" if t in NA_WERTE else t for t in texte])
+        breite = max(breite, len(texte))
+
+    while zeilen and not zeilen[-1]:
+        zeilen.pop()
+    # Sind nur spätere Spalten belegt, bleiben die ersten als leere "Unnamed"-Spalten erhalten (wie bei read_excel);
+    # ordne_mieter_zu braucht mindestens die Mieterspalte
+    breite = max(breite, min(MIETER_TABELLE_SPALTEN, worksheet.max_column))
+
+    spalten = []
+    for i in range(breite):
+        name = kopf[i] if i < len(kopf) and kopf[i] != "" else f"Unnamed: {i}"
+        basis, n = name, 0
+        while name in spalten:
+            n += 1
+            name = f"{basis}.{n}"
+        spalten.append(name)
+    df_mieter = pd.DataFrame([z + [""] * (breite - len(z)) for z in zeilen], columns=spalten, dtype=object)
+    return MieterTabelle(workbook, worksheet, header_map, df_mieter, mieter_row_map)
+
+
+def _ist_kategorie(name: str) -> bool:
+    return name.strip().lower() in ("kategorie", "kategorien")
+
+
+def finde_konto_kopf(konto_xlsx_pfad) -> tuple[int, dict[str, int]]:
+    """Überschriftszeile des Kontoauszugs und die benötigten Spalten (Name → Spaltennummer, 1 = A).
+
+    Gesucht wird in den ersten KONTO_KOPF_ZEILEN Zeilen nach der ersten mit allen Pflichtspalten, damit ein
+    Vorspann der Bank (Kontonummer, Zeitraum …) nicht stört; ohne Treffer gilt Zeile 1. Benötigt werden die
+    Pflichtspalten und alle Kategorie-Spalten. Kommt eine Überschrift mehrfach vor, zählt wie bei
+    pd.read_excel nur die erste (die weiteren hießen dort "Name.1" usw.).
+    """
+    with closing(lies_zeilen(konto_xlsx_pfad)) as zeilen:
+        anfang = list(islice(zeilen, KONTO_KOPF_ZEILEN))
+    for kopf_nr, kopf in anfang:
+        namen = {str(wie_read_excel(w)) for w in kopf if w is not None}
+        if all(name in namen for name in KONTO_PFLICHT):
+            break
+    else:
+        kopf_nr, kopf = 1, next((werte for nr, werte in anfang if nr == 1), ())
+    spalten: dict[str, int] = {}
+    gesehen = set()
+    for nr, wert in enumerate(kopf, start=1):
+        if wert is None:
+            continue
+        name = str(wie_read_excel(wert))
+        if name in gesehen:
+            continue
+        gesehen.add(name)
+        if name in KONTO_PFLICHT or _ist_kategorie(name):
+            spalten[name] = nr
+    return kopf_nr, spalten
+
+
+def _typisiert(werte: list, spalte: str) -> pd.Series | None:
+    """Betrag als float64 bzw. Wertstellung als datetime64, wenn die Zellen durchweg diesen Typ haben."""
+    belegt = [w for w in werte if w is not None]
+    if spalte == KONTO_BETRAG and all(isinstance(w, (int, float)) and not isinstance(w, bool) for w in belegt):
+        return pd.Series([np.nan if w is None else float(w) for w in werte], dtype="float64")
+    if spalte == KONTO_DATUM and belegt and all(isinstance(w, datetime) for w in belegt):
+        try:
+            return pd.Series(pd.to_datetime(werte))
+        except (OverflowError, ValueError):  # außerhalb des Bereichs von datetime64[ns]
+            return None
+    return None
+
+
+def lies_kontoauszug(konto_xlsx_pfad) -> pd.DataFrame:
+    """Nur die benötigten Spalten des Kontoauszugs, gelesen über den schlanken XLSX-Leser.
+
+    Textspalten entsprechen ``pd.read_excel(dtype=str)`` mit leeren Zellen als "". Betrag kommt als
+    float64, Wertstellung als datetime64, wenn die Zellen Zahlen bzw. Datumswerte sind; sonst als Text
+    wie bisher (normalisiere_betraege und normalisiere_daten lesen beides). Zeilen ohne Wert in den
+    benötigten Spalten fallen weg.
+    """
+    kopf_nr, spalten = finde_konto_kopf(konto_xlsx_pfad)
+    if not spalten:
+        return pd.DataFrame()
+    namen = sorted(spalten, key=spalten.get)
+    roh = [werte for _, werte in lies_zeilen(konto_xlsx_pfad, [spalten[n] for n in namen], min_zeile=kopf_nr + 1)]
+    if not roh:
+        return pd.DataFrame(columns=namen, dtype=object)
+    df = pd.DataFrame([[wie_read_excel(w) for w in werte] for werte in roh], columns=namen, dtype=object)
+    df = df.mask(df.isin(NA_WERTE), "").astype(str)
+    for i, name in enumerate(namen):
+        if name in (KONTO_BETRAG, KONTO_DATUM):
+            typisiert = _typisiert([werte[i] for werte in roh], name)
+            if typisiert is not None:
+                df[name] = typisiert.to_numpy()
+    return df
+
+
+class Abgleich(NamedTuple):
+    pfad: object  # Dateipfad oder Puffer des Ergebnisses
+    uebersprungen: int  # per Buchungsjournal übersprungene Buchungen
+
+
+def fuehre_mietabgleich_durch(excel_pfad, konto_xlsx_pfad, regeln_pfad=None, journal_pfad=None, bestand="", ergebnis_pfad=None):
+    # Jeder Abschnitt bis zur nächsten uhr.runde() ist ein Schritt in Server-Timing und /metrics
+    uhr = Stoppuhr()
+    mieter = lade_mieter_tabelle(excel_pfad)
+    if mieter is None:
+        return None
+    workbook, worksheet, header_map, df_mieter, mieter_row_map = mieter
+    uhr.runde("mieter_laden")
+    zaehle_zeilen("mieter", len(df_mieter))
+
+    try:
+        df_konto = lies_kontoauszug(konto_xlsx_pfad)
+    except Exception:
+        return None
+
+    missing = [c for c in KONTO_PFLICHT if c not in df_konto.columns]
+    if missing:
+        raise ValueError(f"Fehlende Spalten im Kontoauszug: {', '.join(missing)}. Bitte per Überschrift bereitstellen.")
+
+    # Betrag und Wertstellung einmal für den ganzen Auszug normalisieren; alle späteren
+    # Schritte lesen nur noch diese Spalten
+    df_konto[KONTO_BETRAG] = normalisiere_betraege(df_konto[KONTO_BETRAG])
+    daten = normalisiere_daten(df_konto[KONTO_DATUM])
+    df_konto[KONTO_DATUM] = daten["datum"]
+    df_konto["__raw_date"] = daten["roh"]
+    df_konto["__monat_idx"] = daten["monat_idx"]
+    df_konto["__datum_str"] = daten["anzeige"]
+    df_konto["__datum"] = daten["tag"]
+    uhr.runde("konto_lesen")
+    zaehle_zeilen("konto", len(df_konto))
+
+    regelwerk = lade_regelwerk(regeln_pfad)
 
     # Kategorie-Spalten erkennen: "Kategorie" oder "Kategorien" (ggf. mehrere)
-    cat_cols = [c for c in df_konto.columns if str(c).strip().lower() in ("kategorie", "kategorien")]
+    cat_cols = [c for c in df_konto.columns if _ist_kategorie(str(c))]
     if cat_cols:
         cat_series = df_konto[cat_cols].astype(str).agg(" ".join, axis=1)
     else:
         cat_series = pd.Series([""] * len(df_konto), index=df_konto.index)
     df_konto["__text_summe"] = (df_konto[KONTO_VWZ].astype(str) + " " + cat_series + " " + df_konto[KONTO_OBJEKT].astype(str))
-    df_konto["__klass"] = df_konto["__text_summe"].apply(klassifiziere)
-
-    def finde_suchwort_priorisiert(cat_text: str, vwz_text: str) -> str:
-        def _scan(txt: str) -> str:
-            t = (txt or "").lower()
-            patterns = [
-                (None, [r"\bmiet\w*\b", r"\bkm\b", r"\bkaltmiete\b", r"\bstellplatz\b", r"\bgarage\b"]),
-                (None, [r"\bnebenkosten\b", r"\bnk\b", r"\bbetriebskosten\b", r"\bbk\b", r"\bhausgeld\b", r"\bheizkosten\b"]),
-                (None, [r"\bnach\-?zahlung\b", r"\bnachz\b"]),
-                (None, [r"\brate(nzahlung)?\b"]),
-                (None, [r"\bhonorar\b"]),
-            ]
-            for _, pats in patterns:
-                for p in pats:
-                    m = re.search(p, t, re.IGNORECASE)
-                    if m:
-                        return m.group(0)
-            return ""
-        # Priorität: zuerst Kategorie(n), dann Verwendungszweck
-        hit = _scan(cat_text)
-        if hit:
-            return hit
-        return _scan(vwz_text)
+    df_konto["__klass"] = klassifiziere_spalte(df_konto["__text_summe"], regelwerk)
 
     # Treffer: priorisierte Suche, damit bei Vorkommen in beiden Spalten nur einmal gezählt wird
-    df_konto["__hit"] = [finde_suchwort_priorisiert(c, v) for c, v in zip(cat_series, df_konto[KONTO_VWZ].astype(str))]
+    # Priorität: zuerst Kategorie(n), dann Verwendungszweck
+    hit_cat = finde_suchwort_spalte(cat_series, regelwerk)
+    hit_vwz = finde_suchwort_spalte(df_konto[KONTO_VWZ], regelwerk)
+    df_konto["__hit"] = hit_cat.where(hit_cat != "", hit_vwz)
+    df_konto["__suchwort"] = df_konto["__hit"].where(df_konto["__hit"] != "", df_konto["__klass"])
     # Normalisierte Felder für spätere Namenssuche im VWZ (insbesondere bei Jobcenter/Bundesagentur)
-    def _norm_text(val: str) -> str:
-        return re.sub(
-            r"\s+",
-            " ",
-            re.sub(r"[^a-z0-9\s]", " ", str(val).lower())
-            .replace("ä", "ae")
-            .replace("ö", "oe")
-            .replace("ü", "ue")
-            .replace("ß", "ss"),
-        ).strip()
-    df_konto["__norm_vwz"] = df_konto[KONTO_VWZ].astype(str).apply(_norm_text)
+    df_konto["__norm_vwz"] = df_konto[KONTO_VWZ].astype(str).apply(_norm_name)
     # Für die spätere Trefferauswahl bei Behördenzahlungen nutzen wir standardmäßig den VWZ
     df_konto["__norm_hit"] = df_konto["__norm_vwz"]
 
@@ -227,315 +960,98 @@ def fuehre_mietabgleich_durch(excel_pfad, konto_xlsx_pfad):
 
     df_konto["__month_override"] = ((df_konto[KONTO_VWZ].astype(str) + " " + cat_series).apply(finde_monats_override))
 
-    sheet_such = "suchtreffer"
-    if sheet_such in workbook.sheetnames:
-        del workbook[sheet_such]
-    ws_such = workbook.create_sheet(sheet_such)
-    ws_such.append(["Datum", "Name", "Suchwort", "Betrag", "Verwendungszweck"])
-
-    relevante_labels = {"Miete", "Nebenkosten", "Nachzahlung", "Rate", "Honorar"}
+    relevante_labels = set(regelwerk.labels)
     df_such = df_konto[df_konto["__klass"].isin(relevante_labels)].copy()
     try:
         df_such = df_such.sort_values([KONTO_PAYEE, KONTO_DATUM, KONTO_BETRAG], kind="mergesort")
     except Exception:
         pass
+    uhr.runde("klassifizieren")
 
-    for _, r in df_such.iterrows():
-        hit = r["__hit"] if r["__hit"] else r["__klass"]
-        ws_such.append(["", r[KONTO_PAYEE], str(hit), r[KONTO_BETRAG], r[KONTO_VWZ]])
-        row_idx = ws_such.max_row
-        date_cell = ws_such.cell(row=row_idx, column=1)
-        raw_val = r.get("__raw_date", "")
-        dval = r[KONTO_DATUM]
-        try:
-            if pd.notna(dval):
-                py_dt = dval.to_pydatetime() if hasattr(dval, "to_pydatetime") else dval
-                date_cell.value = py_dt.date()
-                date_cell.number_format = "DD.MM.YYYY"
-            else:
-                rv = (str(raw_val) or "").strip()
-                m_iso = re.search(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})", rv)
-                if m_iso:
-                    parsed = datetime(int(m_iso.group(1)), int(m_iso.group(2)), int(m_iso.group(3)))
-                    date_cell.value = parsed.date()
-                    date_cell.number_format = "DD.MM.YYYY"
-                else:
-                    rv2 = rv.replace("/", ".")
-                    parsed = datetime.strptime(rv2, "%d.%m.%Y")
-                    date_cell.value = parsed.date()
-                    date_cell.number_format = "DD.MM.YYYY"
-        except Exception:
-            date_cell.value = None
-            date_cell.number_format = "DD.MM.YYYY"
-        try:
-            ws_such.cell(row=row_idx, column=4).number_format = "#,##0.00"
-        except Exception:
-            pass
-
-    def _get_writable_cell(ws, coord):
-        c = ws[coord]
-        if isinstance(c, MergedCell):
-            for r in ws.merged_cells.ranges:
-                if coord in r:
-                    return ws.cell(row=r.min_row, column=r.min_col)
-        return c
+    schreibe_suchtreffer(workbook, df_such)
+    uhr.runde("suchtreffer")
+    zaehle_zeilen("suchtreffer", len(df_such))
 
-    def _write_date(cell, dt_val, raw_val) -> str:
-        if pd.notna(dt_val):
-            try:
-                py_dt = dt_val.to_pydatetime() if hasattr(dt_val, "to_pydatetime") else dt_val
-                cell.value = py_dt.date()
-                cell.number_format = "DD.MM.YYYY"
-                return py_dt.strftime("%d.%m.%Y")
-            except Exception:
-                pass
-        rv = (str(raw_val) or "").strip()
-        m_iso = re.search(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})", rv)
-        try:
-            if m_iso:
-                parsed = datetime(int(m_iso.group(1)), int(m_iso.group(2)), int(m_iso.group(3)))
-            else:
-                parsed = datetime.strptime(rv.replace("/", "."), "%d.%m.%Y")
-            cell.value = parsed.date()
-            cell.number_format = "DD.MM.YYYY"
-            return parsed.strftime("%d.%m.%Y")
-        except Exception:
-            cell.value = None
-            cell.number_format = "DD.MM.YYYY"
-            return ""
-
-    def _parse_amount_cell(val) -> float:
-        if val is None:
-            return 0.0
-        if isinstance(val, (int, float)):
-            return float(val)
-        s = str(val).replace(".", "").replace(",", ".")
-        try:
-            return float(s)
-        except Exception:
-            return 0.0
+    df_such["__norm_payee"] = df_such[KONTO_PAYEE].astype(str).apply(_norm_name)
 
-    def _norm_ddmmyyyy(s: str) -> str:
-        s = (s or "").strip()
-        m = re.match(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?$", s)
-        if not m:
-            return s
-        d = int(m.group(1)); mth = int(m.group(2)); yr = m.group(3)
-        if yr is None:
-            return f"{d:02d}.{mth:02d}"
-        return f"{d:02d}.{mth:02d}.{int(yr):04d}"
-
-    def _parse_pairs(txt: str):
-        pairs = []
-        seen = set()
-        if not txt:
-            return pairs
-        for line in txt.splitlines():
-            m = re.search(r"(\d{1,2}\.\d{1,2}(?:\.\d{2,4})?)\s*(?:\[(.*?)\])?\s*:\s*([+-]?\d+(?:[.,]\d+)?)", line)
-            if not m:
-                continue
-            d = _norm_ddmmyyyy(m.group(1))
-            try:
-                amt = round(float(m.group(3).replace(".", "").replace(",", ".")), 2)
-            except Exception:
-                continue
-            key = (d, amt)
-            if key in seen:
-                continue
-            seen.add(key)
-            pairs.append((d, amt, m.group(1), (m.group(2) or "").strip()))
-        return pairs
-
-    df_such["__norm_payee"] = df_such[KONTO_PAYEE].astype(str).apply(lambda val: re.sub(r"\s+", " ", re.sub(r"[^a-z0-9\s]", " ", str(val).lower()).replace("ä","ae").replace("ö","oe").replace("ü","ue").replace("ß","ss")).strip())
-    # Erweiterte Erkennung für Behörden-Eigentümer (außerhalb der Schleife definiert)
-    GOV_KEYS = ("jobcenter", "bundesagentur", "agentur", "agentur fuer arbeit", "arbeitsagentur", "stadt wuppertal")
-
-    for _, row in df_mieter.iterrows():
-        m_name = row[mieter_col_name]
-        if not m_name:
-            continue
-        key_norm = re.sub(r"\s+", " ", re.sub(r"[^a-z0-9\s]", " ", str(m_name).lower()).replace("ä","ae").replace("ö","oe").replace("ü","ue").replace("ß","ss")).strip()
-        excel_row = mieter_row_map.get(key_norm)
-        if not excel_row:
-            continue
-
-        owner_norm = key_norm
-        tenant_norm = re.sub(r"\s+", " ", re.sub(r"[^a-z0-9\s]", " ", str(row[mieter_b_col_name] if mieter_b_col_name else "").lower()).replace("ä","ae").replace("ö","oe").replace("ü","ue").replace("ß","ss")).strip()
-        # Bei Behördenzahlungen: Suche Mieternamen im vollständigen Verwendungszweck
-        if any(k in owner_norm for k in GOV_KEYS) and tenant_norm:
-            source_series = df_such.get("__norm_hit", df_such["__norm_payee"])
-            treffer = df_such[source_series.str.contains(tenant_norm, na=False)]
-        else:
-            treffer = df_such[df_such["__norm_payee"] == owner_norm]
-        if treffer.empty:
-            continue
+    # Mit Buchungsjournal: bereits in früheren Läufen übernommene Buchungen gar nicht erst zuordnen
+    if journal_pfad:
+        df_such["__fp_datum"] = df_such["__datum_str"].astype(str)
+        df_such["__fp_betrag"] = df_such[KONTO_BETRAG].map(lambda v: "" if pd.isna(v) else f"{float(v):.2f}")
+        df_such["__vwz_hash"] = df_such[KONTO_VWZ].astype(str).map(vwz_hash)
+        df_such["__fp"] = [
+            fingerabdruck(d, b, p, h, str(k))
+            for d, b, p, h, k in zip(df_such["__fp_datum"], df_such["__fp_betrag"], df_such["__norm_payee"], df_such["__vwz_hash"], df_such[KONTO_OBJEKT])
+        ]
+        with closing(oeffne_journal(journal_pfad)) as journal:
+            bekannt = bekannte_buchungen(journal, bestand, df_such["__fp"])
+        # Übersprungen wird nur, was in der hochgeladenen Datei auch in der damaligen Zielzelle steht; eine andere
+        # oder ältere Mieterdatei unter demselben Bestand bekommt die Buchung sonst nie
+        df_bekannt = df_such[df_such["__fp"].isin(bekannt.keys())]
+        vorhanden = {
+            fp for fp, d, b in zip(df_bekannt["__fp"], df_bekannt["__fp_datum"], df_bekannt[KONTO_BETRAG])
+            if steht_in_mappe(worksheet, header_map, *bekannt[fp], d, b)
+        }
+        df_neu = df_such[~df_such["__fp"].isin(vorhanden)]
+    else:
+        df_such["__fp"] = ""
+        df_neu = df_such
 
-        for _, t in treffer.iterrows():
-            dval = t[KONTO_DATUM]
-            raw_date = t.get("__raw_date", "")
-            kw = t["__hit"] if t["__hit"] else t["__klass"]
-            betrag = t[KONTO_BETRAG]
-            if pd.isna(betrag):
+    monat_idx = df_neu["__monat_idx"].to_numpy()
+    betraege = df_neu[KONTO_BETRAG].to_numpy()
+    datum_str = df_neu["__datum_str"].to_numpy()
+    datum = df_neu["__datum"].to_numpy()
+    suchwort = df_neu["__suchwort"].to_numpy()
+    fps = df_neu["__fp"].to_numpy()
+    buchungen = []
+    for excel_row, positions in ordne_mieter_zu(df_mieter, df_neu, mieter_row_map):
+        for p in positions:
+            if monat_idx[p] < 0 or np.isnan(betraege[p]):
                 continue
+            buchungen.append(Buchung(excel_row, int(monat_idx[p]), float(betraege[p]), datum_str[p], datum[p], suchwort[p], fps[p]))
 
-            month_idx = None
-            if pd.notna(dval):
-                try:
-                    month_idx = int(getattr(dval, "month"))
-                except Exception:
-                    month_idx = None
-            if month_idx is None:
-                rv = str(raw_date or "").strip()
-                m_iso = re.search(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})", rv)
-                if m_iso:
-                    try:
-                        month_idx = int(m_iso.group(2))
-                    except Exception:
-                        month_idx = None
-                if month_idx is None:
-                    try:
-                        month_idx = datetime.strptime(rv, "%d.%m.%Y").month
-                    except Exception:
-                        month_idx = None
-            if month_idx is None:
-                continue
-            month_idx = month_idx - 1
-            if month_idx < 0 or month_idx > 11:
-                continue
-            ziel = list(MONATS_ZUORDNUNG.keys())[month_idx]
+    def _zelle_lesen(coord):
+        c = worksheet[coord]
+        return c.value, (c.comment.text if c.comment else None)
 
-            betrag_hdr, datum_hdr = MONATS_ZUORDNUNG[ziel]
-            betrag_letter = header_map.get(betrag_hdr)
-            datum_letter = header_map.get(datum_hdr)
-            if not betrag_letter or not datum_letter:
-                continue
-            betrag_cell = f"{betrag_letter}{excel_row}"
-            datum_cell = f"{datum_letter}{excel_row}"
-
-            date_cell = _get_writable_cell(worksheet, datum_cell)
-            prev_cell_val = date_cell.value
-            existing_amount = 0.0
-            v = worksheet[betrag_cell].value
-            if isinstance(v, (int, float)):
-                existing_amount = float(v)
-            else:
-                try:
-                    existing_amount = float(str(v).replace(".", "").replace(",", ".")) if v else 0.0
-                except Exception:
-                    existing_amount = 0.0
-
-            existing_pairs = _parse_pairs(date_cell.comment.text if date_cell.comment else "")
-            existing_keys = {(d, a) for (d, a, _, __) in existing_pairs}
-
-            if pd.notna(dval):
-                try:
-                    new_date_str = dval.strftime("%d.%m.%Y")
-                except Exception:
-                    new_date_str = ""
-            else:
-                rv = str(raw_date or "").strip()
-                m_iso = re.search(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})", rv)
-                if m_iso:
-                    try:
-                        new_date_str = datetime(int(m_iso.group(1)), int(m_iso.group(2)), int(m_iso.group(3))).strftime("%d.%m.%Y")
-                    except Exception:
-                        new_date_str = rv
-                else:
-                    try:
-                        new_date_str = datetime.strptime(rv, "%d.%m.%Y").strftime("%d.%m.%Y")
-                    except Exception:
-                        new_date_str = rv
-            def _norm_ddmmyyyy_local(s: str) -> str:
-                s = (s or "").strip()
-                m = re.match(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?$", s)
-                if not m:
-                    return s
-                d = int(m.group(1)); mth = int(m.group(2)); yr = m.group(3)
-                if yr is None:
-                    return f"{d:02d}.{mth:02d}"
-                return f"{d:02d}.{mth:02d}.{int(yr):04d}"
-            new_key = (_norm_ddmmyyyy_local(new_date_str), round(float(betrag), 2))
-            if new_key in existing_keys:
-                continue
-            if (existing_amount > 0.0) and not existing_pairs:
-                prev_str = prev_cell_val.strftime("%d.%m.%Y") if hasattr(prev_cell_val, "strftime") else (str(prev_cell_val) if prev_cell_val else "")
-                prev_key = (_norm_ddmmyyyy_local(prev_str), round(existing_amount, 2))
-                if prev_key == new_key:
-                    continue
+    plan = plane_buchungen(
+        buchungen,
+        header_map,
+        _zelle_lesen,
+        lambda coord: _get_writable_cell(worksheet, coord).coordinate,
+    )
+    wende_plan_an(worksheet, plan)
+    uhr.runde("zuordnen")
+    zaehle_zeilen("buchungen", len(buchungen))
 
-            worksheet[betrag_cell] = existing_amount + float(betrag)
-            try:
-                worksheet[betrag_cell].number_format = "#,##0.00"
-            except Exception:
-                pass
-            # Datum setzen: bei Mehrfacheinträgen im Monat das früheste Datum in ZE schreiben
-            has_previous_in_month = (existing_amount > 0.0) or (len(existing_pairs) > 0)
-            # neuen Datumswert als echtes Datum ermitteln
-            new_date_dt = None
-            try:
-                dtmp = t[KONTO_DATUM]
-                if pd.notna(dtmp):
-                    py_dt = dtmp.to_pydatetime() if hasattr(dtmp, "to_pydatetime") else dtmp
-                    if py_dt:
-                        new_date_dt = getattr(py_dt, "date", lambda: py_dt)()
-                else:
-                    rv = str(raw_date or "").strip()
-                    m_iso = re.search(r"(\d{4})[-/\.](\d{2})[-/\.](\d{2})", rv)
-                    if m_iso:
-                        parsed = datetime(int(m_iso.group(1)), int(m_iso.group(2)), int(m_iso.group(3)))
-                        new_date_dt = parsed.date()
-                    else:
-                        parsed = datetime.strptime(rv.replace("/", "."), "%d.%m.%Y")
-                        new_date_dt = parsed.date()
-            except Exception:
-                new_date_dt = None
-            if has_previous_in_month:
-                # Vorhandenes Datum lesen und mit neuem Datum vergleichen (frühestes wählen)
-                prev_dt = None
-                try:
-                    if prev_cell_val:
-                        prev_pd = pd.to_datetime(prev_cell_val, dayfirst=True, errors="coerce")
-                        if pd.notna(prev_pd):
-                            prev_dt = (prev_pd.to_pydatetime() if hasattr(prev_pd, "to_pydatetime") else prev_pd).date()
-                except Exception:
-                    prev_dt = None
-                chosen_dt = new_date_dt if prev_dt is None else (prev_dt if (new_date_dt is None or prev_dt <= new_date_dt) else new_date_dt)
-                try:
-                    date_cell.value = chosen_dt
-                    date_cell.number_format = "DD.MM.YYYY"
-                except Exception:
-                    date_cell.value = None
-                    date_cell.number_format = "DD.MM.YYYY"
-            else:
-                try:
-                    date_cell.value = new_date_dt
-                    date_cell.number_format = "DD.MM.YYYY"
-                except Exception:
-                    date_cell.value = None
-                    date_cell.number_format = "DD.MM.YYYY"
-            if has_previous_in_month:
-                lines = []
-                if existing_pairs:
-                    for (_, amt, disp, kword) in existing_pairs:
-                        tag = f"{disp}"
-                        if kword:
-                            tag += f" [{kword}]"
-                        lines.append(f"{tag}: {str(f'{amt:.2f}').replace('.', ',')} EUR")
-                else:
-                    prev_str = prev_cell_val.strftime("%d.%m.%Y") if hasattr(prev_cell_val, "strftime") else (str(prev_cell_val) if prev_cell_val else "")
-                    if prev_str:
-                        lines.append(f"{prev_str}: {str(f'{existing_amount:.2f}').replace('.', ',')} EUR")
-                tag_new = new_date_str
-                if kw:
-                    tag_new += f" [{kw}]"
-                lines.append(f"{tag_new}: {str(f'{float(betrag):.2f}').replace('.', ',')} EUR")
-                date_cell.comment = Comment("\n".join(lines), "System")
-            else:
-                date_cell.comment = None
+    # ergebnis_pfad darf auch ein Puffer (BytesIO) sein; dann bleibt das Ergebnis im Speicher
+    result_path = ergebnis_pfad or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "mieten_abgleich.xlsx")
+    if isinstance(result_path, str):
+        os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    speichere(workbook, result_path)
+    uhr.runde("speichern")
 
-    result_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "mieten_abgleich.xlsx")
-    os.makedirs(os.path.dirname(result_path), exist_ok=True)
-    workbook.save(result_path)
-    return result_path
+    if journal_pfad:
+        # Übernommene und als Dublette erkannte Buchungen gelten ab jetzt als bekannt
+        details = df_neu.drop_duplicates("__fp").set_index("__fp")
+        monate = list(MONATS_ZUORDNUNG)
+        eintraege = []
+        for monat in plan.monate.values():
+            for b in monat.uebernommen + monat.dubletten:
+                d = details.loc[b.fingerabdruck]
+                eintraege.append({
+                    "fingerabdruck": b.fingerabdruck,
+                    "datum": d["__fp_datum"],
+                    "betrag": d["__fp_betrag"],
+                    "auftraggeber": d["__norm_payee"],
+                    "vwz_hash": d["__vwz_hash"],
+                    "kontoname": str(d[KONTO_OBJEKT]),
+                    "excel_zeile": monat.excel_row,
+                    "monat": monate[b.monat_idx],
+                })
+        with closing(oeffne_journal(journal_pfad)) as journal:
+            erfasse_buchungen(journal, bestand, eintraege)
+        uhr.runde("journal")
+    return Abgleich(result_path, len(df_such) - len(df_neu))
 
 
@@ -0,0 +1,174 @@
+"""Synthetische Eingaben für den Mietabgleich (keine Kundendaten).
+
+mieter_mappe() erzeugt eine Mieterdatei wie im Büro gepflegt: Überschriften mit Monaten und
+ZE-Monaten, teils schon eingetragene Zahlungen, verbundene Zellen für Leerstand und Bemerkungen,
+Behördenzahler (Jobcenter usw.) mit Mieternamen in Spalte B. kontoauszug() erzeugt den passenden
+Bankexport: Daueraufträge der Mieter, Behördenzahlungen mit dem Mieternamen im Verwendungszweck,
+Nebenkosten, Raten und fremde Buchungen, dazu die üblichen Zusatzspalten des Exports.
+Gleiche Parameter (n, seed) liefern byte-gleiche Dateien.
+"""
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from mieten import MONATS_ZUORDNUNG
+
+VORNAMEN = ["Anna", "Mehmet", "Olga", "Peter", "Fatma", "Jürgen", "Sabine", "Ahmet", "Ewa", "Klaus", "Leyla",
+            "Hans-Dieter", "Marija", "Stefan", "Ayşe", "Uwe", "Ingrid", "Dragan", "Nicole", "Yusuf"]
+NACHNAMEN = ["Müller", "Yılmaz", "Schmidt", "Kowalski", "Özdemir", "Schneider", "Fischer", "Weber", "Kaya",
+             "Becker", "Hoffmann", "Nowak", "Schäfer", "Demir", "Koch", "Richter", "Petrović", "Wagner",
+             "Şahin", "Krüger", "Hartmann", "Lange", "Çelik", "Werner", "Krause"]
+BEHOERDEN = ["Jobcenter Wuppertal", "Bundesagentur für Arbeit", "Stadt Wuppertal Sozialamt"]
+MONATE = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober",
+          "November", "Dezember"]
+FREMDE_BUCHUNGEN = [
+    ("Stadtwerke Wuppertal", "Abschlag Strom Kd-Nr. {nr}", "Energie"),
+    ("WSW Wasser", "Abschlag Wasser {monat}", "Energie"),
+    ("Hausverwaltung Berg GmbH", "Hausgeld WEG Objekt {obj}", "Wohnen"),
+    ("Sparkasse Wuppertal", "Rate Darlehen {nr}", "Kredit"),
+    ("Allianz Versicherung", "Beitrag Gebäudeversicherung {nr}", "Versicherung"),
+    ("REWE Markt", "Kartenzahlung {nr}", ""),
+    ("Steuerbüro Aydin", "Honorar Nebenkostenabrechnung {jahr}", "Dienstleistung"),
+]
+JAHR = 2024
+
+
+def namen(n: int) -> list[str]:
+    """n verschiedene Mieternamen, reproduzierbar."""
+    ergebnis = []
+    for i in range(n):
+        name = f"{VORNAMEN[i % len(VORNAMEN)]} {NACHNAMEN[(i // len(VORNAMEN)) % len(NACHNAMEN)]}"
+        runde = i // (len(VORNAMEN) * len(NACHNAMEN))
+        ergebnis.append(f"{name} {runde + 1}" if runde else name)
+    return ergebnis
+
+
+def _zahler(rnd: random.Random, n: int) -> list[tuple[str, str]]:
+    # (Spalte A, Mieter): etwa jeder achte Mieter wird über eine Behörde bezahlt
+    paare = []
+    for name in namen(n):
+        if rnd.random() < 0.125:
+            paare.append((f"{rnd.choice(BEHOERDEN)} ({name})", name))
+        else:
+            paare.append((name, name))
+    return paare
+
+
+def _soll(seed: int, i: int) -> float:
+    # Monatsmiete des i-ten Mieters, in Mieterdatei und Kontoauszug gleich
+    return round(random.Random(seed * 100_003 + i).uniform(350, 1100), 0)
+
+
+def _leerstand(seed: int, i: int) -> bool:
+    # Wohnung ab Juli leer: verbundene Zellen in der Mieterdatei; im Kontoauszug danach nur noch vereinzelte
+    # Restzahlungen, die im Abgleich in den verbundenen Monatszellen landen
+    return random.Random(seed * 7_919 + i).random() < 0.04
+
+
+def _als_bytes(wb: Workbook) -> bytes:
+    puffer = BytesIO()
+    wb.save(puffer)
+    return puffer.getvalue()
+
+
+def mieter_mappe(n: int, seed: int = 1, erfasste_monate: int = 2) -> bytes:
+    """Mieterdatei mit n Mietern; die ersten erfasste_monate Monate sind schon eingetragen."""
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "mieter"
+    kopf = ["Eigentümer", "Mieter", "Objekt", "Soll"]
+    for betrag_hdr, datum_hdr in MONATS_ZUORDNUNG.values():
+        kopf += [betrag_hdr, datum_hdr]
+    kopf += ["Bemerkung", ""]
+    ws.append(kopf)
+    erste_monatsspalte = 5
+    bemerkung = len(kopf) - 1
+    ws.merge_cells(start_row=1, start_column=bemerkung, end_row=1, end_column=bemerkung + 1)
+
+    for r, (zahler, mieter) in enumerate(_zahler(rnd, n), start=2):
+        soll = _soll(seed, r - 2)
+        werte = [zahler, mieter, f"Objekt {r % 37} Whg {r % 11}", soll]
+        for m in range(12):
+            if m < erfasste_monate:
+                werte += [soll, f"0{rnd.randint(1, 5)}.{m + 1:02d}.{JAHR}"]
+            else:
+                werte += [None, None]
+        ws.append(werte)
+        if _leerstand(seed, r - 2):
+            start = erste_monatsspalte + 12
+            ws.cell(r, start).value = "Leerstand"
+            ws.merge_cells(start_row=r, start_column=start, end_row=r, end_column=start + 10)
+        if rnd.random() < 0.1:
+            ws.cell(r, bemerkung).value = rnd.choice(["Mahnung März", "Ratenzahlung vereinbart", "Kaution offen"])
+            ws.merge_cells(start_row=r, start_column=bemerkung, end_row=r, end_column=bemerkung + 1)
+
+    ws.column_dimensions["A"].width = 32
+    ws.column_dimensions["B"].width = 24
+    for c in range(erste_monatsspalte, bemerkung):
+        ws.column_dimensions[get_column_letter(c)].width = 11
+    ws.freeze_panes = "C2"
+    return _als_bytes(wb)
+
+
+def kontoauszug(n_mieter: int, seed: int = 1, fremd_anteil: float = 0.3, zusatz_spalten: bool = True) -> bytes:
+    """Bankexport eines Jahres zu mieter_mappe(n_mieter, seed): etwa 12 Buchungen je Mieter plus Fremdbuchungen."""
+    rnd = random.Random(seed)
+    zahler = _zahler(rnd, n_mieter)
+    buchungen = []
+    for i, (a, mieter) in enumerate(zahler):
+        soll = _soll(seed, i)
+        behoerde = a != mieter
+        leer = _leerstand(seed, i)
+        for m in range(12):
+            if rnd.random() < (0.75 if leer and m >= 6 else 0.06):
+                continue  # ausgefallene Zahlung bzw. nach dem Auszug
+            tag = datetime(JAHR, m + 1, 1) + timedelta(days=rnd.randint(0, 5))
+            if behoerde:
+                payee = a.split(" (")[0]
+                vwz = (f"KdU {mieter.upper() if rnd.random() < 0.3 else mieter} BG-Nr. {36100 + i}//{rnd.randint(1, 9)} "
+                       f"Zeitraum 01.{m + 1:02d}.{JAHR}-{28:02d}.{m + 1:02d}.{JAHR} Leistungen nach SGB II")
+                kategorie = "Sozialleistungen"
+            else:
+                payee = a
+                vwz = rnd.choice([
+                    f"Miete {MONATE[m]} {JAHR} Whg {i % 11}",
+                    f"MIETE {m + 1:02d}/{JAHR} {mieter}",
+                    f"Kaltmiete + NK {MONATE[m][:3]}.",
+                    f"Dauerauftrag Miete {mieter}",
+                ])
+                kategorie = rnd.choice(["Miete", "Wohnen", ""])
+            betrag = soll if rnd.random() < 0.9 else round(soll * rnd.choice([0.5, 1.1, 2.0]), 2)
+            buchungen.append((tag, payee, vwz, kategorie, betrag))
+        if rnd.random() < 0.15:
+            buchungen.append((datetime(JAHR, rnd.randint(3, 6), rnd.randint(1, 28)), a.split(" (")[0],
+                              f"Nachzahlung Nebenkosten {JAHR - 1} {mieter}", "Wohnen", round(rnd.uniform(40, 600), 2)))
+
+    for j in range(int(len(buchungen) * fremd_anteil)):
+        payee, muster, kategorie = rnd.choice(FREMDE_BUCHUNGEN)
+        vwz = muster.format(nr=rnd.randint(10_000, 99_999), monat=rnd.choice(MONATE), obj=j % 37, jahr=JAHR - 1)
+        buchungen.append((datetime(JAHR, rnd.randint(1, 12), rnd.randint(1, 28)), payee, vwz, kategorie,
+                          -round(rnd.uniform(5, 900), 2)))
+    buchungen.sort(key=lambda b: b[0])
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Umsätze")
+    ws.append([f"Umsätze Girokonto DE12 3305 0000 0000 {seed:06d}"])
+    ws.append([f"Zeitraum: 01.01.{JAHR} - 31.12.{JAHR}"])
+    kopf = ["Buchungstag", "Wertstellung", "Empfänger/Auftraggeber", "Verwendungszweck", "Kategorie", "Kontoname",
+            "Betrag"]
+    if zusatz_spalten:
+        kopf += ["Währung", "IBAN", "BIC", "Buchungstext", "Mandatsreferenz", "Gläubiger-ID", "Saldo"]
+    ws.append(kopf)
+    saldo = 25_000.0
+    for tag, payee, vwz, kategorie, betrag in buchungen:
+        saldo += betrag
+        zeile = [tag, tag, payee, vwz, kategorie, "Mietkonto Wuppertal", betrag]
+        if zusatz_spalten:
+            zeile += ["EUR", f"DE{rnd.randint(10, 99)} 3305 0000 {rnd.randint(10**9, 10**10 - 1)}",
+                      "WUPSDE33XXX", "Gutschrift" if betrag > 0 else "Lastschrift", "", "", round(saldo, 2)]
+        ws.append(zeile)
+    return _als_bytes(wb)
@@ -0,0 +1,82 @@
+from datetime import date
+
+from openpyxl import Workbook
+
+from mieten import Buchung, _get_writable_cell, plane_buchungen, wende_plan_an
+
+# Jan in B/C, Feb in D/E, Mrz in F/G
+KOPF = {"Jan": "B", "ZE-Jan": "C", "Feb": "D", "ZE-Feb": "E", "Mrz": "F", "ZE-Mrz": "G"}
+
+
+def _plane_und_wende_an(ws, buchungen):
+    def zelle_lesen(coord):
+        c = ws[coord]
+        return c.value, (c.comment.text if c.comment else None)
+
+    plan = plane_buchungen(buchungen, KOPF, zelle_lesen, lambda coord: _get_writable_cell(ws, coord).coordinate)
+    wende_plan_an(ws, plan)
+    return plan
+
+
+def test_betrag_in_zusammengefuehrter_zelle():
+    wb = Workbook()
+    ws = wb.active
+    # Zeile 2: "Leerstand" über Jan bis ZE-Mrz; Zeile 3/4: Feb-Betrag über zwei Zeilen mit Vorbetrag
+    ws["B2"] = "Leerstand"
+    ws.merge_cells("B2:G2")
+    ws["D3"] = 100.0
+    ws.merge_cells("D3:D4")
+    ws.merge_cells("E3:E4")
+
+    plan = _plane_und_wende_an(ws, [
+        Buchung(2, 1, 450.0, "03.02.2024", date(2024, 2, 3), "Mieter A"),
+        Buchung(4, 1, 50.0, "05.02.2024", date(2024, 2, 5), "Mieter B"),
+    ])
+
+    # Der Betrag landet in der oberen linken Zelle des Bereichs, der Vorbetrag dort zählt mit. Liegt auch die
+    # ZE-Zelle im selben Bereich, steht die Zahlung nur im Kommentar
+    assert ws["B2"].value == 450.0
+    assert ws["B2"].number_format == "#,##0.00"
+    assert ws["B2"].comment.text == "03.02.2024 [Mieter A]: 450,00 EUR"
+    assert ws["D3"].value == 150.0
+    assert ws["E3"].value == date(2024, 2, 5)
+    assert "05.02.2024 [Mieter B]: 50,00 EUR" in ws["E3"].comment.text
+    assert {m.betrag_zelle for m in plan.geaenderte_monate()} == {"B2", "D3"}
+
+    # Ein zweiter Lauf mit denselben Buchungen erkennt sie als Dubletten
+    plan = _plane_und_wende_an(ws, [
+        Buchung(2, 1, 450.0, "03.02.2024", date(2024, 2, 3), "Mieter A"),
+        Buchung(4, 1, 50.0, "05.02.2024", date(2024, 2, 5), "Mieter B"),
+    ])
+    assert not plan.geaenderte_monate()
+    assert (ws["B2"].value, ws["D3"].value) == (450.0, 150.0)
+
+
+def test_ohne_zusammengefuehrte_zellen_unveraendert():
+    wb = Workbook()
+    ws = wb.active
+    ws["B2"] = 500.0
+    ws["C2"] = date(2024, 1, 2)
+    _plane_und_wende_an(ws, [
+        Buchung(2, 0, 20.0, "10.01.2024", date(2024, 1, 10), ""),
+        Buchung(2, 2, 520.0, "02.03.2024", date(2024, 3, 2), ""),
+    ])
+    assert ws["B2"].value == 520.0
+    assert ws["C2"].value == date(2024, 1, 2)
+    assert ws["F2"].value == 520.0
+    assert ws["G2"].value == date(2024, 3, 2)
+
+
+def test_monate_in_einem_bereich_werden_summiert():
+    wb = Workbook()
+    ws = wb.active
+    # Feb und Mrz (Betrag und ZE) als ein Bereich, wie "Leerstand" über mehrere Monate
+    ws["D2"] = "Leerstand"
+    ws.merge_cells("D2:G2")
+    plan = _plane_und_wende_an(ws, [
+        Buchung(2, 1, 300.0, "03.02.2024", date(2024, 2, 3), ""),
+        Buchung(2, 2, 120.0, "04.03.2024", date(2024, 3, 4), ""),
+    ])
+    assert ws["D2"].value == 420.0
+    assert ws["D2"].comment.text == "03.02.2024: 300,00 EUR\n04.03.2024: 120,00 EUR"
+    assert len(plan.geaenderte_monate()) == 1
@@ -0,0 +1,82 @@
+from io import BytesIO
+from types import SimpleNamespace
+
+from gemeinsam.cache import ErgebnisCache
+
+import app
+
+
+def test_bestand_und_speichern_aendern_den_schluessel(monkeypatch):
+    monkeypatch.setattr(app, "JOURNAL_PFAD", "")
+    basis = app._cache_schluessel(b"mieter", b"konto", "")
+    assert app._cache_schluessel(b"mieter", b"konto", "") == basis
+    assert app._cache_schluessel(b"mieter", b"konto", "Haus A") != basis
+    monkeypatch.setattr(app, "XLSX_PATCHEN", not app.XLSX_PATCHEN)
+    assert app._cache_schluessel(b"mieter", b"konto", "") != basis
+
+
+def test_regeln_aendern_den_schluessel(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "JOURNAL_PFAD", "")
+    regeln = tmp_path / "regeln.json"
+    regeln.write_text('{"regeln": []}', encoding="utf-8")
+    monkeypatch.setattr(app, "REGELN_PFAD", str(regeln))
+    basis = app._cache_schluessel(b"mieter", b"konto", "")
+    regeln.write_text('{"regeln": [{"muster": "x"}]}', encoding="utf-8")
+    assert app._cache_schluessel(b"mieter", b"konto", "") != basis
+
+
+def test_mit_journal_kein_cache(monkeypatch):
+    monkeypatch.setattr(app, "JOURNAL_PFAD", "journal.sqlite")
+    assert app._cache_schluessel(b"mieter", b"konto", "") is None
+
+
+def test_cache_antwort_wie_direkte_antwort(monkeypatch, tmp_path):
+    # Der synchrone Weg legt dieselbe Antwort im Cache ab, die er zurückgibt (samt übersprungener Buchungen)
+    def abgleich(mieter, konto, journal_pfad, bestand, ergebnis_pfad):
+        ergebnis_pfad.write(b"xlsx")
+        return SimpleNamespace(uebersprungen=3)
+
+    monkeypatch.setattr(app, "JOURNAL_PFAD", "")
+    monkeypatch.setattr(app, "RESULTS_FOLDER", str(tmp_path))
+    monkeypatch.setattr(app, "cache", ErgebnisCache(str(tmp_path), "test", max_bytes=1 << 20, max_alter_s=60))
+    monkeypatch.setattr(app, "fuehre_mietabgleich_durch", abgleich)
+    monkeypatch.setattr(app.ablage, "im_hintergrund", lambda fn, *args: fn(*args))
+    monkeypatch.setattr(app.ablage, "schreibe_spaeter", lambda pfad, daten: None)
+
+    client = app.app.test_client()
+    dateien = lambda: {"excel": (BytesIO(b"mieter"), "m.xlsx"), "konto": (BytesIO(b"konto"), "k.xlsx")}
+    direkt = client.post("/process", data=dateien()).get_json()
+    aus_cache = client.post("/process", data=dateien()).get_json()
+    assert direkt["uebersprungen"] == 3 and aus_cache.get("cache") is True
+    assert {k: v for k, v in aus_cache.items() if k not in ("cache", "download")} == \
+           {k: v for k, v in direkt.items() if k != "download"}
+
+
+def test_jeder_abgleich_eigene_datei(monkeypatch, tmp_path):
+    # Ein fester Dateiname ließe einen Download, der bei einem anderen Worker landet, das vorige Ergebnis finden
+    def abgleich(mieter, konto, journal_pfad, bestand, ergebnis_pfad):
+        ergebnis_pfad.write(b"ergebnis " + mieter.read())
+        return SimpleNamespace(uebersprungen=0)
+
+    monkeypatch.setattr(app, "RESULTS_FOLDER", str(tmp_path))
+    monkeypatch.setattr(app, "cache", ErgebnisCache(str(tmp_path), "test", max_bytes=1 << 20, max_alter_s=60, aktiv=False))
+    monkeypatch.setattr(app, "fuehre_mietabgleich_durch", abgleich)
+    monkeypatch.setattr(app.ablage, "im_hintergrund", lambda fn, *args: fn(*args))
+
+    client = app.app.test_client()
+    downloads = [
+        client.post("/process", data={"excel": (BytesIO(inhalt), "m.xlsx"), "konto": (BytesIO(b"konto"), "k.xlsx")})
+        .get_json()["download"]
+        for inhalt in (b"erster", b"zweiter")
+    ]
+    assert downloads[0] != downloads[1]
+    assert [client.get(d).data for d in downloads] == [b"ergebnis erster", b"ergebnis zweiter"]
+
+
+def test_fehlende_regeln_json_fehler(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "JOURNAL_PFAD", "")
+    monkeypatch.setattr(app, "REGELN_PFAD", str(tmp_path / "fehlt.json"))
+    antwort = app.app.test_client().post(
+        "/process", data={"excel": (BytesIO(b"mieter"), "m.xlsx"), "konto": (BytesIO(b"konto"), "k.xlsx")})
+    assert antwort.status_code == 500
+    assert antwort.get_json()["status"] == "error"
@@ -0,0 +1,37 @@
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+import synth
+from mieten import fuehre_mietabgleich_durch
+
+
+def _abgleich(mieter: bytes, konto: bytes, journal_pfad):
+    puffer = BytesIO()
+    ergebnis = fuehre_mietabgleich_durch(BytesIO(mieter), BytesIO(konto), journal_pfad=str(journal_pfad),
+                                         ergebnis_pfad=puffer)
+    return puffer.getvalue(), ergebnis.uebersprungen
+
+
+def _werte(daten: bytes):
+    ws = load_workbook(BytesIO(daten)).worksheets[0]
+    return [[(c.value, c.comment.text if c.comment else None) for c in zeile] for zeile in ws.iter_rows()]
+
+
+def test_bekannte_buchungen_nur_ueberspringen_wenn_in_der_mappe(tmp_path):
+    mieter, konto = synth.mieter_mappe(30), synth.kontoauszug(30)
+    journal = tmp_path / "journal.sqlite"
+
+    erstes, uebersprungen = _abgleich(mieter, konto, journal)
+    assert uebersprungen == 0
+
+    # Das Ergebnis erneut hochgeladen: alle Buchungen stehen schon drin und werden übersprungen
+    zweites, alle = _abgleich(erstes, konto, journal)
+    assert alle > 0
+    assert _werte(zweites) == _werte(erstes)
+
+    # Die ursprüngliche Mieterdatei noch einmal: übersprungen werden nur die Buchungen, die schon vor dem ersten
+    # Lauf darin standen; die übrigen werden wieder zugeordnet
+    drittes, uebersprungen = _abgleich(mieter, konto, journal)
+    assert uebersprungen < alle
+    assert _werte(drittes) == _werte(erstes)
@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook
+
+import synth
+from mieten import (KONTO_BETRAG, KONTO_DATUM, KONTO_OBJEKT, KONTO_PAYEE, KONTO_PFLICHT, KONTO_VWZ, lies_kontoauszug,
+                    normalisiere_betraege, normalisiere_daten)
+
+
+def _normalisiert(df, spalten):
+    # Wie fuehre_mietabgleich_durch weiterrechnet: Texte, Betrag als float, Wertstellung aufgelöst
+    daten = normalisiere_daten(df[KONTO_DATUM]).reset_index(drop=True)
+    return (df[spalten].astype(str).reset_index(drop=True), normalisiere_betraege(df[KONTO_BETRAG]).reset_index(drop=True),
+            daten.drop(columns="roh"))
+
+
+def _vergleiche(daten: bytes, kopf_zeile: int = 1):
+    # Stand vor dem XLSX-Leser (a34bf2b^): der ganze Auszug über pd.read_excel(dtype=str)
+    alt = pd.read_excel(BytesIO(daten), dtype=str, header=kopf_zeile - 1).fillna("")
+    neu = lies_kontoauszug(BytesIO(daten))
+    spalten = [c for c in alt.columns if c in KONTO_PFLICHT or str(c).strip().lower() in ("kategorie", "kategorien")]
+    assert sorted(neu.columns) == sorted(spalten)
+    # Zeilen ganz ohne Zellwert in den benötigten Spalten liest der neue Leser nicht mehr (sie blieben "Sonstiges")
+    roh = pd.read_excel(BytesIO(daten), dtype=str, header=kopf_zeile - 1, na_filter=False)
+    alt = alt[(roh[spalten] != "").any(axis=1)]
+    texte = [c for c in spalten if c not in (KONTO_BETRAG, KONTO_DATUM)]
+    a_texte, a_betrag, a_daten = _normalisiert(alt, texte)
+    n_texte, n_betrag, n_daten = _normalisiert(neu, texte)
+    pd.testing.assert_frame_equal(n_texte, a_texte)
+    pd.testing.assert_series_equal(n_betrag, a_betrag, check_names=False)
+    pd.testing.assert_frame_equal(n_daten.drop(columns="datum"), a_daten.drop(columns="datum"))
+    # Datumszellen füllen jetzt auch datum (vorher nur per Rückfall lesbar, also NaT), mit demselben Tag
+    pd.testing.assert_series_equal(n_daten["datum"].where(a_daten["datum"].notna()), a_daten["datum"])
+    nachgetragen = a_daten["datum"].isna() & n_daten["datum"].notna()
+    assert (n_daten.loc[nachgetragen, "datum"].dt.date == a_daten.loc[nachgetragen, "tag"]).all()
+
+
+def test_synthetischer_kontoauszug_wie_vorher():
+    _vergleiche(synth.kontoauszug(100), kopf_zeile=3)
+
+
+_DATEN = [datetime(2024, 1, 3), datetime(2024, 12, 31, 13, 5), "03.01.2024", " 4.2.2024 ", "2024-03-05", "15/04/2024",
+          45300, 45300.5, "", None, "NA", "gestern"]
+_BETRAEGE = [450.0, 450, -12.5, 0, 1e6, "1.234,56", "-12,50 €", "450", " 99,9", "12.5", "abc", "", None, "nan"]
+_TEXTE = ["Müller", "Jobcenter Wuppertal", "Miete Jan", "KdU Meier", 42, 3.5, "", None, "NULL", "  Leerzeichen  "]
+
+
+def test_zufaellige_kontoauszuege_wie_vorher():
+    rnd = random.Random(18)
+    for _ in range(60):
+        kopf = [*KONTO_PFLICHT, *rnd.sample(["Kategorie", "Kategorien", "Buchungstag", "Saldo", "Betrag"], 3)]
+        rnd.shuffle(kopf)
+        # Jeder dritte Auszug nur mit Datums- und Zahlenzellen: dann liest lies_kontoauszug beide Spalten typisiert
+        typisiert = rnd.random() < 0.3
+        daten = [w for w in _DATEN if isinstance(w, datetime)] if typisiert else _DATEN
+        betraege = [w for w in _BETRAEGE if isinstance(w, (int, float))] if typisiert else _BETRAEGE
+        wb = Workbook()
+        ws = wb.active
+        ws.append(kopf)
+        for _ in range(rnd.randint(0, 40)):
+            zeile = []
+            for name in kopf:
+                if rnd.random() < 0.1:
+                    zeile.append(None)
+                elif name == KONTO_DATUM:
+                    zeile.append(rnd.choice(daten))
+                elif name == KONTO_BETRAG:
+                    zeile.append(rnd.choice(betraege))
+                elif name in (KONTO_PAYEE, KONTO_VWZ, KONTO_OBJEKT, "Kategorie", "Kategorien"):
+                    zeile.append(rnd.choice(_TEXTE))
+                else:
+                    zeile.append(rnd.choice([1.5, "x", datetime(2024, 1, 1)]))
+            ws.append(zeile)
+        puffer = BytesIO()
+        wb.save(puffer)
+        _vergleiche(puffer.getvalue())
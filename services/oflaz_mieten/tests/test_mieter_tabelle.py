@@ -0,0 +1,107 @@
+import random
+import re
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+import synth
+from mieten import MIETER_SPALTE, MIETER_TABELLE_SPALTEN, lade_mieter_tabelle
+
+
+# Stand vor dem einmaligen Einlesen (Baseline 867640a, fuehre_mietabgleich_durch): openpyxl für Kopf und
+# Zeilennummern, dazu pd.read_excel(dtype=str) für die Tabelle
+def _alt_mieter_tabelle(excel_pfad):
+    workbook = load_workbook(excel_pfad)
+    if "mieter" in workbook.sheetnames:
+        worksheet = workbook["mieter"]
+        sheet_arg = "mieter"
+    else:
+        first_sheet = workbook.sheetnames[0]
+        worksheet = workbook[first_sheet]
+        sheet_arg = first_sheet
+
+    def _build_header_map(ws, max_scan_rows: int = 5) -> dict[str, str]:
+        for r in range(1, min(ws.max_row, max_scan_rows) + 1):
+            mapping: dict[str, str] = {}
+            for c in range(1, ws.max_column + 1):
+                v = ws.cell(r, c).value
+                if v is None:
+                    continue
+                name = str(v).strip()
+                if name and name not in mapping:
+                    mapping[name] = get_column_letter(c)
+            if mapping:
+                return mapping
+        return {}
+
+    header_map = _build_header_map(worksheet)
+    excel_pfad.seek(0)
+    df_mieter = pd.read_excel(excel_pfad, sheet_name=sheet_arg, dtype=str)
+    df_mieter = df_mieter.fillna("")
+
+    mieter_row_map = {}
+    for r in range(1, worksheet.max_row + 1):
+        cell_val = worksheet[f"{MIETER_SPALTE}{r}"].value
+        if cell_val is None:
+            continue
+        key = str(cell_val)
+        key = re.sub(r"[^a-z0-9\s]", " ", key.lower())
+        key = key.replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss")
+        key = re.sub(r"\s+", " ", key).strip()
+        if key and key not in mieter_row_map:
+            mieter_row_map[key] = r
+    return header_map, df_mieter, mieter_row_map
+
+
+def _vergleiche(daten: bytes):
+    header_map, df_alt, row_map = _alt_mieter_tabelle(BytesIO(daten))
+    neu = lade_mieter_tabelle(BytesIO(daten))
+    assert neu.header_map == header_map
+    assert neu.mieter_row_map == row_map
+    # ordne_mieter_zu liest nur die ersten MIETER_TABELLE_SPALTEN Spalten. Eine ganz leere Spalte ohne Überschrift
+    # am Ende behandelt es wie eine fehlende (bei einem leeren Blatt ist die Mieterspalte jetzt da, vorher brach
+    # ordne_mieter_zu ab), leere Zeilen (ohne Mieternamen) am Ende überspringt es
+    erwartet, df_neu = _ohne_leeren_rand(df_alt.iloc[:, :MIETER_TABELLE_SPALTEN]), _ohne_leeren_rand(neu.df_mieter)
+    assert list(df_neu.columns) == list(erwartet.columns)
+    assert df_neu.values.tolist() == erwartet.values.tolist()
+
+
+def _ohne_leeren_rand(df):
+    while len(df.columns) and str(df.columns[-1]).startswith("Unnamed: ") and (df.iloc[:, -1] == "").all():
+        df = df.iloc[:, :-1]
+    while len(df) and (df.iloc[-1] == "").all():
+        df = df.iloc[:-1]
+    return df
+
+
+def test_synthetische_mieterdatei_wie_vorher():
+    _vergleiche(synth.mieter_mappe(200))
+
+
+# Ohne True/False: pd.read_excel(dtype=str) liest sie nach einer 1 bzw. 0 in derselben Spalte als "1"/"0"
+_WERTE = [None, None, "", " ", "Müller, Hans", "MÜLLER HANS", "Jobcenter Wuppertal (für Meier)", "Straße 1",
+          0, 7, -3, 1.0, 2.5, 1e16, datetime(2024, 3, 1), datetime(2024, 3, 1, 12, 30), "NA", "nan"]
+
+
+def test_zufaellige_mieterdateien_wie_vorher():
+    rnd = random.Random(4)
+    for _ in range(100):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = rnd.choice(["mieter", "Tabelle1"])
+        # Überschrift mit Lücken und Doppelten; vereinzelt erst in Zeile 2
+        start = rnd.choice([1, 1, 1, 2])
+        breite = rnd.randint(1, 6)
+        for c in range(1, breite + 1):
+            ws.cell(start, c).value = rnd.choice(["Eigentümer", "Mieter", "Mieter", "Objekt", None, 2024, "NA"])
+        for r in range(start + 1, start + rnd.randint(0, 40)):
+            if rnd.random() < 0.1:
+                continue  # Leerzeile
+            for c in range(1, breite + rnd.randint(0, 2) + 1):
+                ws.cell(r, c).value = rnd.choice(_WERTE)
+        puffer = BytesIO()
+        wb.save(puffer)
+        _vergleiche(puffer.getvalue())
@@ -0,0 +1,76 @@
+import random
+import re
+
+import pandas as pd
+
+from mieten import finde_suchwort_spalte, klassifiziere_spalte, lade_regelwerk
+
+
+# Stand vor regeln.json (Baseline 867640a, fuehre_mietabgleich_durch): Muster je Aufruf, re.search je Zeile
+def _alt_klassifiziere(text: str) -> str:
+    t = (text or "").lower()
+    patterns = [
+        ("Miete", [r"\bmiet\w*\b", r"\bkm\b", r"\bkaltmiete\b", r"\bstellplatz\b", r"\bgarage\b"]),
+        ("Nebenkosten", [r"\bnebenkosten\b", r"\bnk\b", r"\bbetriebskosten\b", r"\bbk\b", r"\bhausgeld\b", r"\bheizkosten\b"]),
+        ("Nachzahlung", [r"\bnach\-?zahlung\b", r"\bnachz\b"]),
+        ("Rate", [r"\brate(nzahlung)?\b"]),
+        ("Honorar", [r"\bhonorar\b"]),
+    ]
+    for label, pats in patterns:
+        for p in pats:
+            if re.search(p, t, re.IGNORECASE):
+                return label
+    return "Sonstiges"
+
+
+def _alt_finde_suchwort_priorisiert(cat_text: str, vwz_text: str) -> str:
+    def _scan(txt: str) -> str:
+        t = (txt or "").lower()
+        patterns = [
+            (None, [r"\bmiet\w*\b", r"\bkm\b", r"\bkaltmiete\b", r"\bstellplatz\b", r"\bgarage\b"]),
+            (None, [r"\bnebenkosten\b", r"\bnk\b", r"\bbetriebskosten\b", r"\bbk\b", r"\bhausgeld\b", r"\bheizkosten\b"]),
+            (None, [r"\bnach\-?zahlung\b", r"\bnachz\b"]),
+            (None, [r"\brate(nzahlung)?\b"]),
+            (None, [r"\bhonorar\b"]),
+        ]
+        for _, pats in patterns:
+            for p in pats:
+                m = re.search(p, t, re.IGNORECASE)
+                if m:
+                    return m.group(0)
+        return ""
+    hit = _scan(cat_text)
+    if hit:
+        return hit
+    return _scan(vwz_text)
+
+
+# Stichworte, Beinahe-Treffer und Sonderfälle der Groß-/Kleinschreibung
+_WOERTER = [
+    "Miete", "MIETE", "Mietzahlung", "mieter", "Kaltmiete", "KM", "km/h", "kmh", "Stellplatz", "Garage", "Garagen",
+    "Nebenkosten", "NK", "nk-abrechnung", "Betriebskosten", "BK", "bkk", "Hausgeld", "Heizkosten", "Nach-Zahlung",
+    "Nachzahlung", "nachzahlungen", "NACHZ", "Rate", "Ratenzahlung", "Raten", "rate1", "Honorar", "honorare",
+    "Überweisung", "März", "Straße", "Wohnung", "Jobcenter", "ſtellplatz", "MİETE", "miet_e", "3.OG", "", "-", "/",
+]
+
+
+def _text(rnd: random.Random) -> str:
+    return rnd.choice([" ", "", ", ", "/"]).join(rnd.choice(_WOERTER) for _ in range(rnd.randint(0, 5)))
+
+
+def test_klassifikation_wie_vorher():
+    rnd = random.Random(3)
+    texte = pd.Series([_text(rnd) for _ in range(3000)])
+    neu = klassifiziere_spalte(texte, lade_regelwerk())
+    assert neu.tolist() == [_alt_klassifiziere(t) for t in texte]
+
+
+def test_suchwort_wie_vorher():
+    rnd = random.Random(4)
+    kategorien = pd.Series([_text(rnd) if rnd.random() < 0.4 else "" for _ in range(3000)])
+    vwz = pd.Series([_text(rnd) for _ in range(3000)])
+    regelwerk = lade_regelwerk()
+    hit_cat = finde_suchwort_spalte(kategorien, regelwerk)
+    hit_vwz = finde_suchwort_spalte(vwz, regelwerk)
+    neu = hit_cat.where(hit_cat != "", hit_vwz)
+    assert neu.tolist() == [_alt_finde_suchwort_priorisiert(c, v) for c, v in zip(kategorien, vwz)]
@@ -1,16 +1,36 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 import os
 from datetime import datetime
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.comments import Comment
-from openpyxl.styles import PatternFill
+from io import BytesIO
+from werkzeug.utils import secure_filename
+
+from gemeinsam import ablage, messung, telematik, xlsx_lesen, xlsx_schreiben, zulassung
+from gemeinsam.cache import ErgebnisCache, code_stand
+from gemeinsam.jobs import JobPool
+from gemeinsam.telematik import als_bytes, ergebnis_dateiname
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 RESULTS_FOLDER = os.path.join(BASE_DIR, "results")
+# Parallel laufende Verarbeitungen im Job-Modus (POST /telematik/process?async=1)
+JOB_WORKER = int(os.environ.get("JOB_WORKER", "2"))
+# Ergebnis-Cache (RESULT_CACHE=0 schaltet ihn ab) und Obergrenzen für den results/-Ordner
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "1") != "0"
+RESULTS_MAX_MB = int(os.environ.get("RESULTS_MAX_MB", "500"))
+RESULTS_MAX_ALTER_H = float(os.environ.get("RESULTS_MAX_ALTER_H", "72"))
+# Uploads werden im Speicher verarbeitet; UPLOADS_ABLEGEN=1 legt sie zusätzlich (im Hintergrund) unter uploads/ ab
+UPLOADS_ABLEGEN = os.environ.get("UPLOADS_ABLEGEN", "0") == "1"
+# Telematik: Adressen/Touren stehen als berechnete Werte in AF1/AH1 (Aufschlüsselung im Blatt kennzahlen);
+# KENNZAHLEN_FORMELN=1 schreibt stattdessen nicht volatile Formeln, die dem Autofilter folgen
+KENNZAHLEN_FORMELN = os.environ.get("KENNZAHLEN_FORMELN", "0") == "1"
+# Details aus M–V: "kommentar" (Notiz an L, Standard), "blatt" (verstecktes Blatt details) oder
+# "spalte" (zusammengefasster Text in AK); Notizen machen die Datei groß und das Speichern langsam
+KOMMENTAR_MODUS = os.environ.get("KOMMENTAR_MODUS", "kommentar")
+# Nur das aktive Blatt wird mit openpyxl geladen und zurückgeschrieben, alle anderen Teile der Mappe bleiben
+# unverändert; XLSX_PATCHEN=0 lädt und speichert wie früher die ganze Mappe mit openpyxl
+XLSX_PATCHEN = os.environ.get("XLSX_PATCHEN", "1") != "0"
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -25,211 +45,91 @@ CORS(app, resources={
     }
 })
 
+messung.richte_ein(app)
+zulassung.richte_ein(app, lambda meldung: {"status": "error", "message": meldung})
+
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["RESULTS_FOLDER"] = RESULTS_FOLDER
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
-
-def process_tours_table(workbook):
-    if "touren" not in workbook.sheetnames:
-        workbook.create_sheet("touren")
-    tours_sheet = workbook["touren"]
-
-    if "ag-grid" not in workbook.sheetnames:
-        return
-    ag_grid_sheet = workbook["ag-grid"]
-
-    current_date = datetime.now().strftime("%Y-%m-%d")
-
-    tours_sheet.cell(1, 1, "Tour")
-    tours_sheet.cell(1, 2, f"TG ({current_date})")
-
-    tour_values = []
-    for row in range(2, ag_grid_sheet.max_row + 1):
-        tour_value = ag_grid_sheet.cell(row, 1).value
-        if tour_value:
-            tour_values.append(tour_value)
-
-    unique_tours = sorted(list(set(tour_values)))
-
-    if tours_sheet.max_row >= 2:
-        tours_sheet.delete_rows(2, tours_sheet.max_row - 1)
-
-    for i, tour in enumerate(unique_tours, 2):
-        tours_sheet.cell(i, 1, tour)
-
-    tour_customer_count = {}
-    for row in range(2, ag_grid_sheet.max_row + 1):
-        tour = ag_grid_sheet.cell(row, 1).value
-        customer = ag_grid_sheet.cell(row, 8).value
-        if tour and customer:
-            tour_customer_count[tour] = tour_customer_count.get(tour, 0) + 1
-
-    for row_idx in range(2, len(unique_tours) + 2):
-        tour = tours_sheet.cell(row_idx, 1).value
-        if tour:
-            tours_sheet.cell(row_idx, 2, tour_customer_count.get(tour, 0))
+jobs = JobPool(RESULTS_FOLDER, JOB_WORKER)
+cache = ErgebnisCache(
+    RESULTS_FOLDER,
+    code_stand(os.path.abspath(__file__), telematik.__file__, xlsx_schreiben.__file__, xlsx_lesen.__file__),
+    max_bytes=RESULTS_MAX_MB * 1024 * 1024,
+    max_alter_s=RESULTS_MAX_ALTER_H * 3600,
+    aktiv=RESULT_CACHE,
+)
 
 
-def process_excel(file_path, save_directory):
-    workbook = openpyxl.load_workbook(file_path)
-    sheet = workbook.active
+def process_excel(quelle, kommentar_modus=None):
+    """quelle: Pfad oder Datei-Objekt (Upload im Speicher). Gibt (Workbook, Clipboard-Preview) zurück."""
+    return telematik.process_excel(quelle, kommentar_modus or KOMMENTAR_MODUS, KENNZAHLEN_FORMELN, XLSX_PATCHEN)
 
-    process_tours_table(workbook)
 
-    blue_fill = PatternFill(start_color="87CEFA", end_color="87CEFA", fill_type="solid")
-    green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-    light_gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+def _cache_schluessel(daten: bytes) -> str:
+    # Dateiname und Touren-Überschrift enthalten das Tagesdatum; die Optionen bestimmen Inhalt und Aufbau der Datei
+    return cache.schluessel(daten, datetime.now().strftime("%Y-%m-%d"), KOMMENTAR_MODUS, KENNZAHLEN_FORMELN,
+                            XLSX_PATCHEN)
 
-    col_ac_idx = 29
-    col_ad_idx = 30
-    col_ae_idx = 31
-    col_af_idx = 32
-    col_ag_idx = 33
-    col_ah_idx = 34
 
-    for row in range(1, sheet.max_row + 1):
-        sheet.cell(row, col_ac_idx).fill = blue_fill
-    sheet.cell(1, col_ad_idx).fill = blue_fill
+def _aus_cache(schluessel, treffer):
+    return {**treffer["antwort"], "download": f"/results/{schluessel}/{treffer['datei']}", "cache": True}
 
-    sheet.cell(1, col_ae_idx).fill = green_fill
-    sheet.cell(1, col_af_idx).fill = green_fill
 
-    sheet.cell(1, col_ag_idx).fill = light_gray_fill
-    sheet.cell(1, col_ah_idx).fill = light_gray_fill
-
-    values_to_filter = ["D009", "D090", "D091", "D092", "D093", "D094", "D096", "D095", "D208", "D251", "D270", "D271", "D291", "D292", "SCD12", "SCD13"]
-    try:
-        sheet.auto_filter.add_filter_column(0, values_to_filter)
-        new_filter_last_col_letter = get_column_letter(28)
-        filter_range = f"A1:{new_filter_last_col_letter}{sheet.max_row}"
-        sheet.auto_filter.ref = filter_range
-    except Exception:
-        pass
-
-    subtotal_source_col_letter = get_column_letter(col_ac_idx)
-    current_max_row = sheet.max_row if sheet.max_row >= 2 else 2
-    subtotal_range_end_row = max(current_max_row, 2000)
-    sheet.cell(1, col_ad_idx).value = f'=SUBTOTAL(9,{subtotal_source_col_letter}2:{subtotal_source_col_letter}{subtotal_range_end_row})'
-
-    sheet.cell(1, col_ae_idx).value = 'Adressen'
-    sheet.cell(1, col_af_idx).value = '=SUMPRODUCT(--(FREQUENCY(COLUMN(1:1175),SUBTOTAL(3,INDIRECT("H"&ROW(2:1175)))*MATCH(H2:H1175&"",H2:H1175&"",0))>0))-1'
-
-    sheet.cell(1, col_ag_idx).value = 'Touren'
-    sheet.cell(1, col_ah_idx).value = '=SUMPRODUCT(--(FREQUENCY(COLUMN(1:1),SUBTOTAL(3,INDIRECT("A"&ROW(2:1175)))*MATCH(A2:A1175&"",A2:A1175&"",0))>0))-1'
-
-    sheet.column_dimensions['A'].width = 6.5
-    sheet.column_dimensions['B'].width = 25
-    sheet.column_dimensions['C'].width = 20
-    sheet.column_dimensions['D'].width = 6
-    sheet.column_dimensions['E'].width = 10
-    sheet.column_dimensions['F'].width = 8
-    sheet.column_dimensions['G'].width = 15
-    sheet.column_dimensions['H'].width = 15
-
-    col_i_idx = 9
-    col_j_idx = 10
-    sheet.cell(row=1, column=col_i_idx).value = "Ablage"
-    sheet.column_dimensions[get_column_letter(col_i_idx)].width = 8
-    sheet.cell(row=1, column=col_j_idx).value = "Schlüssel"
-    sheet.column_dimensions[get_column_letter(col_j_idx)].width = 8
-
-    col_k_idx = 11
-    col_l_idx = 12
-    sheet.column_dimensions[get_column_letter(col_k_idx)].width = 15
-    sheet.column_dimensions[get_column_letter(col_l_idx)].width = 10
-
-    comment_target_col_idx = col_l_idx
-    comment_source_start_col_idx = 13
-    comment_source_end_col_idx = 22
-
-    for row_num in range(2, sheet.max_row + 1):
-        comment_text = ""
-        for col_idx_comment_source in range(comment_source_start_col_idx, comment_source_end_col_idx + 1):
-            cell_value = sheet.cell(row_num, col_idx_comment_source).value
-            if cell_value is not None:
-                column_letter_for_comment = get_column_letter(col_idx_comment_source)
-                comment_text += f"{column_letter_for_comment}{row_num}: {cell_value}\n"
-        if comment_text:
-            comment = Comment(comment_text.strip(), "System")
-            comment.width = 200
-            comment.height = 400
-            sheet.cell(row_num, comment_target_col_idx).comment = comment
-
-    for cell in sheet["G"]:
-        cell.number_format = '0'
-
-    for col_idx_hide in range(13, 29):
-        sheet.column_dimensions[get_column_letter(col_idx_hide)].hidden = True
-
-    sheet.cell(1, 29).value = "Menü"
-
-    starts_with_list = ["1 4", "2 4", "3 4", "4 4", "5 4", "6 4"]
-    source_count_col_idx = col_l_idx
-    target_count_col_idx = 29
-
-    for row_num in range(2, sheet.max_row + 1):
-        cell_value_j = sheet.cell(row_num, source_count_col_idx).value
-        count = 0
-        if cell_value_j and isinstance(cell_value_j, str):
-            lines = cell_value_j.splitlines()
-            for line in lines:
-                for start_pattern in starts_with_list:
-                    if line.strip().startswith(start_pattern):
-                        try:
-                            count += int(start_pattern.split()[0])
-                        except (ValueError, IndexError):
-                            pass
-        sheet.cell(row_num, target_count_col_idx).value = count if count > 0 else None
-
-    current_date_str = datetime.now().strftime("%Y%m%d")
-    modified_file_name = f"{current_date_str}.xlsx"
-    os.makedirs(save_directory, exist_ok=True)
-    modified_file_path = os.path.join(save_directory, modified_file_name)
-    workbook.save(modified_file_path)
-    return modified_file_path
-
-
-def build_clipboard_preview(sheet):
-    clipboard_data_lines = []
-    for row_num in range(2, sheet.max_row + 1):
-        if sheet.cell(row_num, 6).value in [1, 2]:  # Spalte F
-            row_data = []
-            for col_idx in range(1, 12):  # bis einschließlich K
-                cell_val = sheet.cell(row_num, col_idx).value
-                if col_idx == 11:  # K
-                    if cell_val and "LHK" in str(cell_val):
-                        row_data.append("LHK")
-                    else:
-                        row_data.append("MS")
-                else:
-                    row_data.append(str(cell_val) if cell_val is not None else "")
-            clipboard_data_lines.append("\t".join(row_data))
-    return "\n".join(clipboard_data_lines)
+def _telematik_job(job_dir, daten, schluessel):
+    # Läuft im Job-Pool; das Ergebnis landet im Ordner des Jobs, damit parallele Läufe sich nicht überschreiben
+    wb, clipboard_preview = process_excel(BytesIO(daten))
+    result_path = os.path.join(job_dir, ergebnis_dateiname())
+    with messung.messe("speichern"):
+        xlsx_schreiben.speichere(wb, result_path)
+    antwort = {
+        "status": "ok",
+        "message": "Telematik-Datei verarbeitet.",
+        "clipboardPreview": clipboard_preview,
+    }
+    cache.lege_ab(schluessel, result_path, antwort)
+    return {**antwort, "download": f"/results/{os.path.basename(job_dir)}/{os.path.basename(result_path)}"}
 
 
 @app.post("/telematik/process")
+@zulassung.begrenzt
 def telematik_process():
     try:
         excel = request.files.get("excel")
         if not excel:
             return jsonify({"status": "error", "message": "Excel-Datei fehlt (Feldname: excel)."}), 400
 
-        upload_name = excel.filename or "telematik.xlsx"
-        upload_path = os.path.join(UPLOAD_FOLDER, upload_name)
-        excel.save(upload_path)
-
-        result_path = process_excel(upload_path, RESULTS_FOLDER)
-        if not result_path or not os.path.exists(result_path):
-            return jsonify({"status": "error", "message": "Ergebnisdatei wurde nicht erstellt."}), 500
-
-        wb = openpyxl.load_workbook(result_path)
-        sheet = wb.active
-        clipboard_preview = build_clipboard_preview(sheet)
+        daten = excel.read()
+        messung.eingabe_groesse("telematik", len(daten))
+        if UPLOADS_ABLEGEN:
+            ablage.schreibe_spaeter(os.path.join(UPLOAD_FOLDER, secure_filename(excel.filename or "") or "telematik.xlsx"), daten)
+        schluessel = _cache_schluessel(daten)
+        treffer = cache.hole(schluessel)
+        if treffer:
+            return jsonify(_aus_cache(schluessel, treffer))
+
+        if request.args.get("async") == "1":
+            job_id, _ = jobs.neuer_job()
+            jobs.starte(job_id, _telematik_job, daten, schluessel, bei_ende=zulassung.behalte_platz())
+            return jsonify({"status": "accepted", "jobId": job_id, "statusUrl": f"/jobs/{job_id}"}), 202
+
+        # Verarbeitung und Clipboard-Preview im Speicher; die Datei wird erst nach der Antwort geschrieben
+        wb, clipboard_preview = process_excel(BytesIO(daten))
+        inhalt = als_bytes(wb)
+        # Eigener Ordner je Ergebnis wie im Job-Modus: der Dateiname gilt für den ganzen Tag, ein Download bei
+        # einem anderen Worker fände sonst die Datei eines früheren Uploads
+        download_name = ablage.eigener_ordner(ergebnis_dateiname())
+        antwort = {
+            "status": "ok",
+            "message": "Telematik-Datei verarbeitet.",
+            "clipboardPreview": clipboard_preview
+        }
+        ablage.schreibe_spaeter(os.path.join(RESULTS_FOLDER, download_name), inhalt)
+        ablage.im_hintergrund(cache.lege_ab_daten, schluessel, os.path.basename(download_name), inhalt, antwort)
 
-        download_name = os.path.basename(result_path)
         return jsonify({
             "status": "ok",
             "message": "Telematik-Datei verarbeitet.",
@@ -240,17 +140,40 @@ def telematik_process():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    # ?wait=<Sekunden> hält die Anfrage offen, bis der Job fertig ist (max. 30 s)
+    try:
+        warten = float(request.args.get("wait", 0))
+    except ValueError:
+        warten = 0.0
+    zustand = jobs.zustand(job_id, warten)
+    if zustand is None:
+        return jsonify({"status": "error", "message": "Job nicht gefunden"}), 404
+    # Die im Job gemessenen Schritte stehen im Server-Timing-Header, nicht in der Antwort
+    zeiten = zustand.pop("zeiten", None)
+    antwort = jsonify(zustand)
+    if zeiten:
+        antwort.headers["Server-Timing"] = messung.server_timing((f"job_{name}", dauer) for name, dauer in zeiten)
+    return antwort
+
+
 @app.get("/results/<path:filename>")
 def download_result(filename):
     file_path = os.path.join(RESULTS_FOLDER, filename)
-    if not os.path.exists(file_path):
+    xlsx_mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # Noch nicht geschrieben → direkt aus dem Speicher
+    daten = ablage.ausstehend(file_path)
+    if daten is not None:
+        return send_file(BytesIO(daten), mimetype=xlsx_mimetype, as_attachment=True, download_name=os.path.basename(filename))
+    if not ablage.warte_auf(file_path):
         return jsonify({"status": "error", "message": "Datei nicht gefunden"}), 404
     return send_from_directory(
         RESULTS_FOLDER,
         filename,
         as_attachment=True,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        download_name=filename
+        mimetype=xlsx_mimetype,
+        download_name=os.path.basename(filename)
     )
 
 
@@ -265,8 +188,10 @@ def root():
         "ok": True,
         "service": "oguz-telematik",
         "endpoints": {
-            "POST /telematik/process": "Excel hochladen und verarbeiten",
+            "POST /telematik/process": "Excel hochladen und verarbeiten (?async=1: sofort Job-ID zurück)",
+            "GET /jobs/<job_id>": "Job-Status (?wait=<s> für Long-Polling)",
             "GET /results/<filename>": "Ergebnis-Excel abrufen",
+            "GET /metrics": "Messwerte im Prometheus-Format",
             "GET /health": "Service-Status"
         }
     }), 200
@@ -0,0 +1,76 @@
+"""Benchmarks für die Telematik-Verarbeitung (synthetische Exporte, keine Kundendateien).
+
+Aufruf aus diesem Verzeichnis:
+
+    python bench_telematik.py           # Kommentar-Modi im Vergleich
+    python bench_telematik.py suite     # Verarbeiten + Speichern über eine Größenreihe, Vergleich mit Baseline (--help)
+    python bench_telematik.py last      # HTTP-Lasttest mit 1/4/16 parallelen Clients gegen den lokal gestarteten Service (--help)
+"""
+import os
+import sys
+import time
+import zipfile
+from io import BytesIO
+
+import openpyxl
+
+from gemeinsam import benchlauf, lasttest, xlsx_schreiben
+from app import KOMMENTAR_MODUS, XLSX_PATCHEN, als_bytes, process_excel
+from synth import telematik_export
+
+
+def _messe_modus(daten: bytes, modus: str, wiederholungen: int = 3):
+    """Bestzeiten für Verarbeiten, Speichern und erneutes Öffnen, dazu Dateigröße und entpackte XML-Größe."""
+    zeiten = []
+    for _ in range(wiederholungen):
+        t = time.perf_counter()
+        wb, _ = process_excel(BytesIO(daten), modus)
+        t_verarbeiten = time.perf_counter() - t
+        puffer = BytesIO()
+        t = time.perf_counter()
+        xlsx_schreiben.speichere(wb, puffer)
+        t_speichern = time.perf_counter() - t
+        t = time.perf_counter()
+        openpyxl.load_workbook(BytesIO(puffer.getvalue()))
+        t_oeffnen = time.perf_counter() - t
+        zeiten.append((t_verarbeiten, t_speichern, t_oeffnen))
+    with zipfile.ZipFile(puffer) as z:
+        entpackt = sum(info.file_size for info in z.infolist())
+    return (*(min(spalte) for spalte in zip(*zeiten)), len(puffer.getvalue()), entpackt)
+
+
+def bench_kommentare(groessen=(5_000, 20_000)):
+    print(f"(Standard über KOMMENTAR_MODUS: {KOMMENTAR_MODUS}, XLSX_PATCHEN: {int(XLSX_PATCHEN)})")
+    print(f"{'Zeilen':>8} {'Modus':>10} {'verarbeiten [s]':>16} {'speichern [s]':>14} {'öffnen [s]':>11} "
+          f"{'Datei [KB]':>11} {'XML [KB]':>9}")
+    for n in groessen:
+        daten = telematik_export(n)
+        for modus in ("kommentar", "blatt", "spalte"):
+            t_verarbeiten, t_speichern, t_oeffnen, groesse, entpackt = _messe_modus(daten, modus)
+            print(f"{n:>8} {modus:>10} {t_verarbeiten:>16.2f} {t_speichern:>14.2f} {t_oeffnen:>11.2f} "
+                  f"{groesse / 1024:>11.0f} {entpackt / 1024:>9.0f}")
+
+
+def _telematik(daten: bytes) -> bytes:
+    wb, _ = process_excel(BytesIO(daten))
+    return als_bytes(wb)
+
+
+# Größe = Datenzeilen im Export; Kommentar-Modus und XLSX_PATCHEN wie in der Umgebung gesetzt
+SZENARIEN = [benchlauf.Szenario("telematik", (2_000, 10_000, 30_000), telematik_export, _telematik)]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def _last_anfrage(n: int, variante: int) -> lasttest.Anfrage:
+    return lasttest.Anfrage("/telematik/process", {"excel": ("export.xlsx", telematik_export(n, seed=variante + 1))})
+
+
+LAST = lasttest.Lastprofil(5_000, _last_anfrage)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["suite"]:
+        sys.exit(benchlauf.main(SZENARIEN, BASELINE, sys.argv[2:]))
+    if sys.argv[1:2] == ["last"]:
+        sys.exit(lasttest.main(LAST, os.path.dirname(os.path.abspath(__file__)), sys.argv[2:]))
+    bench_kommentare()
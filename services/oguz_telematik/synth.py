@@ -0,0 +1,33 @@
+"""Synthetische Telematik-Exporte (keine Kundendaten).
+
+telematik_export() erzeugt einen Export wie aus ag-grid: A Tour (teils mit Filtercode), F Menge,
+G Kundennummer, H Kunde, K Kostform, L Menütext und M–V Zusatzinfos, die als Notizen bzw. Details
+übernommen werden. Gleiche Parameter (n, seed) liefern byte-gleiche Dateien.
+"""
+import random
+from io import BytesIO
+
+from openpyxl import Workbook
+
+FILTER_CODES = ["D009", "D090", "D091", "D208", "D251", "SCD12"]
+MENUE_TEXTE = [None, None, None, "1 4 Menü", "3 4 Menü\n2 4 Extra", "6 4 Schonkost", "Hinweis: Hund"]
+
+
+def telematik_export(n: int, seed: int = 1) -> bytes:
+    """Export mit n Datenzeilen im Blatt ag-grid."""
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "ag-grid"
+    ws.append(["Tour"] + [f"Spalte {i}" for i in range(2, 29)])
+    for r in range(n):
+        zeile = [
+            rnd.choice(FILTER_CODES + ["D500", None]), f"Kunde {r}", f"Straße {r % 300}", 1, "PLZ",
+            rnd.choice([1, 2, 3, None]), 1234500 + r, f"K{r % 2000}", None, None,
+            rnd.choice(["LHK", "MS", None]), rnd.choice(MENUE_TEXTE),
+        ]
+        zeile += [rnd.choice([None, None, "Klingeln", "2. OG", f"Tel. 0202 {r}", 5]) for _ in range(13, 23)]
+        ws.append(zeile)
+    puffer = BytesIO()
+    wb.save(puffer)
+    return puffer.getvalue()
@@ -0,0 +1,15 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("option, wert", [("KOMMENTAR_MODUS", "blatt"), ("KENNZAHLEN_FORMELN", True),
+                                          ("XLSX_PATCHEN", False)])
+def test_optionen_aendern_den_schluessel(monkeypatch, option, wert):
+    vorher = app._cache_schluessel(b"daten")
+    monkeypatch.setattr(app, option, wert)
+    assert app._cache_schluessel(b"daten") != vorher
+
+
+def test_gleiche_eingabe_gleicher_schluessel():
+    assert app._cache_schluessel(b"daten") == app._cache_schluessel(b"daten")
@@ -0,0 +1,182 @@
+from datetime import datetime
+from io import BytesIO
+
+import openpyxl
+import pytest
+from openpyxl.comments import Comment
+from openpyxl.styles import PatternFill
+from openpyxl.utils import get_column_letter
+
+from gemeinsam import telematik
+
+import app
+import synth
+
+
+# Stand vor dem Einzeldurchlauf (867640a, process_excel/build_clipboard_preview): Zelle für Zelle über das aktive
+# Blatt, die Clipboard-Preview aus der wieder geladenen Ergebnisdatei
+def _alt_process_tours_table(workbook):
+    if "touren" not in workbook.sheetnames:
+        workbook.create_sheet("touren")
+    tours_sheet = workbook["touren"]
+    if "ag-grid" not in workbook.sheetnames:
+        return
+    ag_grid_sheet = workbook["ag-grid"]
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    tours_sheet.cell(1, 1, "Tour")
+    tours_sheet.cell(1, 2, f"TG ({current_date})")
+    tour_values = []
+    for row in range(2, ag_grid_sheet.max_row + 1):
+        tour_value = ag_grid_sheet.cell(row, 1).value
+        if tour_value:
+            tour_values.append(tour_value)
+    unique_tours = sorted(list(set(tour_values)))
+    if tours_sheet.max_row >= 2:
+        tours_sheet.delete_rows(2, tours_sheet.max_row - 1)
+    for i, tour in enumerate(unique_tours, 2):
+        tours_sheet.cell(i, 1, tour)
+    tour_customer_count = {}
+    for row in range(2, ag_grid_sheet.max_row + 1):
+        tour = ag_grid_sheet.cell(row, 1).value
+        customer = ag_grid_sheet.cell(row, 8).value
+        if tour and customer:
+            tour_customer_count[tour] = tour_customer_count.get(tour, 0) + 1
+    for row_idx in range(2, len(unique_tours) + 2):
+        tour = tours_sheet.cell(row_idx, 1).value
+        if tour:
+            tours_sheet.cell(row_idx, 2, tour_customer_count.get(tour, 0))
+
+
+def _alt_process_excel(daten):
+    workbook = openpyxl.load_workbook(BytesIO(daten))
+    sheet = workbook.active
+    _alt_process_tours_table(workbook)
+    blue_fill = PatternFill(start_color="87CEFA", end_color="87CEFA", fill_type="solid")
+    green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
+    light_gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+    for row in range(1, sheet.max_row + 1):
+        sheet.cell(row, 29).fill = blue_fill
+    sheet.cell(1, 30).fill = blue_fill
+    sheet.cell(1, 31).fill = green_fill
+    sheet.cell(1, 32).fill = green_fill
+    sheet.cell(1, 33).fill = light_gray_fill
+    sheet.cell(1, 34).fill = light_gray_fill
+    values_to_filter = ["D009", "D090", "D091", "D092", "D093", "D094", "D096", "D095", "D208", "D251", "D270", "D271", "D291", "D292", "SCD12", "SCD13"]
+    sheet.auto_filter.add_filter_column(0, values_to_filter)
+    sheet.auto_filter.ref = f"A1:{get_column_letter(28)}{sheet.max_row}"
+    current_max_row = sheet.max_row if sheet.max_row >= 2 else 2
+    sheet.cell(1, 30).value = f'=SUBTOTAL(9,AC2:AC{max(current_max_row, 2000)})'
+    sheet.cell(1, 31).value = 'Adressen'
+    sheet.cell(1, 33).value = 'Touren'
+    for spalte, breite in zip("ABCDEFGHIJKL", [6.5, 25, 20, 6, 10, 8, 15, 15, 8, 8, 15, 10]):
+        sheet.column_dimensions[spalte].width = breite
+    sheet.cell(row=1, column=9).value = "Ablage"
+    sheet.cell(row=1, column=10).value = "Schlüssel"
+    for row_num in range(2, sheet.max_row + 1):
+        comment_text = ""
+        for col_idx in range(13, 23):
+            cell_value = sheet.cell(row_num, col_idx).value
+            if cell_value is not None:
+                comment_text += f"{get_column_letter(col_idx)}{row_num}: {cell_value}\n"
+        if comment_text:
+            comment = Comment(comment_text.strip(), "System")
+            comment.width = 200
+            comment.height = 400
+            sheet.cell(row_num, 12).comment = comment
+    for cell in sheet["G"]:
+        cell.number_format = '0'
+    for col_idx_hide in range(13, 29):
+        sheet.column_dimensions[get_column_letter(col_idx_hide)].hidden = True
+    sheet.cell(1, 29).value = "Menü"
+    starts_with_list = ["1 4", "2 4", "3 4", "4 4", "5 4", "6 4"]
+    for row_num in range(2, sheet.max_row + 1):
+        cell_value_j = sheet.cell(row_num, 12).value
+        count = 0
+        if cell_value_j and isinstance(cell_value_j, str):
+            for line in cell_value_j.splitlines():
+                for start_pattern in starts_with_list:
+                    if line.strip().startswith(start_pattern):
+                        count += int(start_pattern.split()[0])
+        sheet.cell(row_num, 29).value = count if count > 0 else None
+
+    puffer = BytesIO()
+    workbook.save(puffer)
+    ergebnis = openpyxl.load_workbook(puffer)
+    sheet = ergebnis.active
+    clipboard_data_lines = []
+    for row_num in range(2, sheet.max_row + 1):
+        if sheet.cell(row_num, 6).value in [1, 2]:
+            row_data = []
+            for col_idx in range(1, 12):
+                cell_val = sheet.cell(row_num, col_idx).value
+                if col_idx == 11:
+                    row_data.append("LHK" if cell_val and "LHK" in str(cell_val) else "MS")
+                else:
+                    row_data.append(str(cell_val) if cell_val is not None else "")
+            clipboard_data_lines.append("\t".join(row_data))
+    return workbook, ergebnis, "\n".join(clipboard_data_lines)
+
+
+# Neu berechnet statt als volatile Formel (user-014): AF1/AH1 und das Blatt kennzahlen vergleicht der Test nicht
+_KENNZAHL_ZELLEN = {(1, 32), (1, 34)}
+
+
+def _zellen(sheet, ohne=()):
+    ergebnis = {}
+    for zeile in sheet.iter_rows():
+        for cell in zeile:
+            if (cell.row, cell.column) in ohne:
+                continue
+            fill = cell.fill
+            kommentar = cell.comment
+            ergebnis[cell.coordinate] = (
+                cell.value, cell.number_format, fill.fill_type, fill.fgColor.rgb,
+                None if kommentar is None else (kommentar.text, kommentar.author),
+            )
+    # Leere Zellen ohne Format legt openpyxl je nach Zugriff an oder nicht
+    leer = (None, "General", None, "00000000", None)
+    return {k: v for k, v in ergebnis.items() if v != leer}
+
+
+def _spalten(sheet):
+    return {k: (d.width, d.hidden) for k, d in sheet.column_dimensions.items() if d.width or d.hidden}
+
+
+@pytest.mark.parametrize("patchen", [True, False])
+@pytest.mark.parametrize("n, seed", [(0, 1), (1, 2), (300, 3), (1500, 12)])
+def test_process_excel_wie_vorher(monkeypatch, patchen, n, seed):
+    monkeypatch.setattr(app, "XLSX_PATCHEN", patchen)
+    daten = synth.telematik_export(n, seed)
+    alt_wb, alt, alt_preview = _alt_process_excel(daten)
+    wb, preview = app.process_excel(BytesIO(daten), kommentar_modus="kommentar")
+    assert preview == alt_preview
+
+    # Notizgröße liest openpyxl beim Laden nicht zurück: im Speicher vergleichen
+    groessen = lambda ws: {c.coordinate: (c.comment.width, c.comment.height) for c in ws["L"] if c.comment}
+    assert groessen(wb.active) == groessen(alt_wb.active)
+
+    neu = openpyxl.load_workbook(BytesIO(app.als_bytes(wb)))
+    assert neu.sheetnames == alt.sheetnames + [telematik.KENNZAHLEN_BLATT]
+    assert neu.active.title == alt.active.title
+    for name in alt.sheetnames:
+        ohne = _KENNZAHL_ZELLEN if name == alt.active.title else ()
+        assert _zellen(neu[name], ohne) == _zellen(alt[name], ohne), name
+        assert _spalten(neu[name]) == _spalten(alt[name]), name
+    filter_neu, filter_alt = neu.active.auto_filter, alt.active.auto_filter
+    assert filter_neu.ref == filter_alt.ref
+    assert [(f.colId, f.filters.filter) for f in filter_neu.filterColumn] == \
+           [(f.colId, f.filters.filter) for f in filter_alt.filterColumn]
+
+
+def test_kennzahl_formeln(monkeypatch):
+    monkeypatch.setattr(app, "KENNZAHLEN_FORMELN", True)
+    wb, _ = app.process_excel(BytesIO(synth.telematik_export(40, 5)))
+    sheet = wb.active
+    for ziel, quelle, hilfs in (("AF1", "H", "AI"), ("AH1", "A", "AJ")):
+        werte, sichtbar = f"{quelle}2:{quelle}41", f"{hilfs}2:{hilfs}41"
+        kriterium = f'"="&SUBSTITUTE(SUBSTITUTE(SUBSTITUTE({werte},"~","~~"),"*","~*"),"?","~?")'
+        assert sheet[ziel].value == (
+            f"=ROUND(SUMPRODUCT({sichtbar}/(COUNTIFS({werte},{kriterium},{sichtbar},1)+({sichtbar}=0))),0)")
+        assert [sheet[f"{hilfs}{r}"].value for r in range(2, 42)] == [f"=SUBTOTAL(3,{quelle}{r})" for r in range(2, 42)]
+        assert sheet[f"{hilfs}42"].value is None
+        assert sheet.column_dimensions[hilfs].hidden